@@ -1,25 +1,52 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from datetime import datetime, timedelta
 import uuid
 import os
-from flask import Flask, request, jsonify, send_from_directory
+import time
+from flask import Blueprint, Flask, Response, current_app, has_request_context, request, jsonify, send_from_directory, stream_with_context
+from flask import json
 from flask_cors import CORS
 from dotenv import load_dotenv
 import logging
 from flask import abort
 from typing import List, Optional
-from models.availability import AvailabilityManager
-
-app = Flask(__name__, static_folder='frontend/build', static_url_path='/')
-CORS(app, resources={
-    r"/api/*": {
-        "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
-        "methods": ["GET", "POST", "OPTIONS", "DELETE"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
-app.debug = True
+from handlers import (
+    EXPORT_CONTENT_TYPES,
+    ApiError,
+    SlotSubmission,
+    availability_etag,
+    batch_params,
+    export_params,
+    free_slot_params,
+    free_slots_payload,
+    grouped_body,
+    grouped_payload,
+    match_params,
+    match_payload,
+    new_rule_params,
+    property_params,
+    replace_params,
+    require,
+    result_status,
+    rule_deleted_status,
+    rule_params,
+    rules_payload,
+    rules_query_params,
+    search_params,
+    window_params,
+)
+from models.availability import AVAILABILITY_COLUMNS
+from models.metrics import RequestMetrics, render_gauge_family, render_gauges
+from models.partitions import PartitionManager
+from models.pool import all_pool_stats, close_pools, describe_dsn
+from models.resilience import DatabaseUnavailable
+from models.resources import AvailabilityResources
+from models.schema import reset_tables
+from models.serialization import RowEncoder
+from models.settings import load_settings
+
+# Every route lives on this blueprint; create_app builds the Flask app
+routes = Blueprint('routes', __name__)
 
 # Configure logging
 logging.basicConfig(
@@ -37,56 +64,83 @@ try:
 except Exception as e:
     logger.warning(f"Could not load .env: {e}")
 
-# Database configuration
-db_params = {
-    "dbname": os.getenv('DB_NAME', 'postgres'),
-    "user": os.getenv('DB_USER', 'postgres'),
-    "password": os.getenv('DB_PASSWORD', 'postgres'),
-    "host": os.getenv('DB_HOST', 'localhost'),
-    "port": os.getenv('DB_PORT', '5432')
-}
+# Cookie holding the epoch until which a client that wrote reads the primary,
+# bypassing the availability cache, whichever worker serves it
+READ_PRIMARY_COOKIE = 'availability_read_primary_until'
 
-# Log database configuration (excluding password)
-logger.info("Database configuration:")
-logger.info(f"Host: {db_params['host']}")
-logger.info(f"Port: {db_params['port']}")
-logger.info(f"Database: {db_params['dbname']}")
-logger.info(f"User: {db_params['user']}")
-
-def get_connection_string(db_params):
-    """Create database connection string with appropriate SSL settings"""
-    # Get SSL mode from environment or default to require
-    ssl_mode = os.getenv('PGSSLMODE', 'require')
-    # Format the connection string exactly like the working psql command
-    return f"postgresql://{db_params['user']}@{db_params['host']}:{db_params['port']}/{db_params['dbname']}?sslmode={ssl_mode}"
-
-# Create connection string
-connection_string = get_connection_string(db_params)
-logger.info(f"Connection string (without password): {connection_string}")
-
-# Add password to connection params separately
-connection_params = {
-    "dsn": connection_string,
-    "password": db_params['password'],
-    "connect_timeout": 10,
-    "sslmode": os.getenv('PGSSLMODE', 'require'),
-    "ssl": True
-}
+def availability_resources() -> AvailabilityResources:
+    """The current app's pools, caches, guard and write queue, built by create_app"""
+    return current_app.extensions['availability']
+
+def reads_own_writes():
+    """Whether the current request comes from a client that wrote recently"""
+    if not has_request_context() or not availability_resources().tracks_own_writes:
+        return False
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def get_availability_manager():
+    """
+    The configured availability backend: the in-memory store, or an
+    AvailabilityManager backed by this worker's connection pool
+    """
+    return availability_resources().manager(read_from_primary=reads_own_writes())
+
+availability_encoder = RowEncoder(AVAILABILITY_COLUMNS)
+
+def json_is_compact():
+    """Whether jsonify currently renders compact, key-sorted, ASCII output"""
+    app = current_app
+    provider = getattr(app, 'json', None)
+    if not getattr(provider, 'sort_keys', app.config.get('JSON_SORT_KEYS', True)):
+        return False
+    if not getattr(provider, 'ensure_ascii', app.config.get('JSON_AS_ASCII', True)):
+        return False
+    compact = getattr(provider, 'compact', None)
+    if compact is not None:
+        return compact
+    return not (app.debug or app.config.get('JSONIFY_PRETTYPRINT_REGULAR'))
+
+def availability_json_response(rows):
+    """Render availability tuples exactly as jsonify would render them as dicts"""
+    if json_is_compact():
+        try:
+            return Response(availability_encoder.encode_rows(rows) + '\n', mimetype='application/json')
+        except TypeError:
+            pass
+    return jsonify([dict(zip(AVAILABILITY_COLUMNS, row)) for row in rows])
+
+@routes.errorhandler(ApiError)
+def api_error(e):
+    """A request handlers.py rejected, or a query the manager reported failed"""
+    return jsonify(e.payload), e.status
+
+@routes.errorhandler(DatabaseUnavailable)
+def database_unavailable(e):
+    """Shed or failed-fast database work: tell the client when to retry"""
+    logger.warning(f"Refusing {request.method} {request.path}: {e}")
+    response = jsonify({"error": str(e)})
+    response.headers['Retry-After'] = e.retry_after_header
+    return response, 503
 
-@app.before_request
-def log_request_info():
-    logger.info('=' * 50)
-    logger.info(f'Request Method: {request.method}')
-    logger.info(f'Request Path: {request.path}')
-    logger.info(f'Request Headers: {dict(request.headers)}')
-    logger.info('=' * 50)
+@routes.after_request
+def pin_writer_to_primary(response):
+    """After a successful write, read this client's requests from the primary for a while"""
+    resources = availability_resources()
+    if resources.tracks_own_writes and request.method in ('POST', 'PUT', 'DELETE') \
+            and request.path.startswith('/api/availability') and response.status_code < 400:
+        pin_seconds = resources.read_your_writes_seconds
+        response.set_cookie(READ_PRIMARY_COOKIE, str(int(time.time() + pin_seconds) + 1),
+                            max_age=int(pin_seconds) + 1, httponly=True, samesite='Lax')
+    return response
 
 # Keep the current working test endpoint
-@app.route('/api/test-create', methods=['GET', 'POST', 'OPTIONS'])
+@routes.route('/api/test-create', methods=['GET', 'POST', 'OPTIONS'])
 def create_test_data():
     logger.info(f"Received {request.method} request to /api/test-create")
-    logger.info(f"Headers: {dict(request.headers)}")
-    
+
     try:
         property_id = str(uuid.uuid4())
         seller_id = str(uuid.uuid4())
@@ -114,11 +168,11 @@ def create_test_data():
         return jsonify({"error": str(e)}), 500
 
 # New endpoints using AvailabilityManager
-@app.route('/api/availability/test', methods=['POST'])
+@routes.route('/api/availability/test', methods=['POST'])
 def create_availability_test_data():
     """Create test data in the database"""
     try:
-        availability_manager = AvailabilityManager(connection_string)
+        availability_manager = get_availability_manager()
         result = availability_manager.create_test_data()
         
         # Log the created test data
@@ -129,86 +183,289 @@ def create_availability_test_data():
             logger.info(f"Test property ID: {result['property']['id']}")
             logger.info(f"Test seller ID: {result['seller']['id']}")
         
-        return jsonify(result), 200 if 'error' not in result else 500
+        return jsonify(result), result_status(result)
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Error creating test data: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/availability/property/<string:property_id>', methods=['GET', 'DELETE'])
+@routes.route('/api/availability/property/<string:property_id>', methods=['GET', 'DELETE', 'PUT'])
 def handle_property_availability(property_id):
-    """Get or delete availability for a property"""
+    """Get, delete or replace availability for a property"""
     try:
-        availability_manager = AvailabilityManager(connection_string)
-        seller_id = request.args.get('sellerId')
-        
+        availability_manager = get_availability_manager()
+        property_id, seller_id = property_params(property_id, request.args)
+
         if request.method == 'GET':
-            slots = availability_manager.get_property_availability(property_id, seller_id)
-            return jsonify(slots), 200
+            window_start, window_end = window_params(request.args)
+
+            # Answer polls for an unchanged calendar from the version alone,
+            # without fetching or serialising the slots
+            if request.if_none_match:
+                version = availability_manager.get_property_version(property_id, seller_id)
+                etag = availability_etag(version, seller_id, request.args) if version is not None else None
+                if etag is not None and request.if_none_match.contains(etag):
+                    response = Response(status=304)
+                    response.set_etag(etag)
+                    response.headers['Cache-Control'] = 'no-cache'
+                    return response
+
+            # The version and rows come from one snapshot, so the ETag always
+            # describes the body it is sent with
+            version, rows = require(availability_manager.get_property_snapshot(
+                property_id, seller_id, start_time=window_start, end_time=window_end
+            ), "Failed to fetch availability")
+            response = availability_json_response(rows)
+            response.set_etag(availability_etag(version, seller_id, request.args))
+            response.headers['Cache-Control'] = 'no-cache'
+            return response, 200
             
         elif request.method == 'DELETE':
             result = availability_manager.delete_property_availability(property_id, seller_id)
             return jsonify(result), 200
+
+        elif request.method == 'PUT':
+            seller_id, slots = replace_params(request.args, request.json)
+            result = availability_manager.replace_availability(property_id, seller_id, slots)
+            return jsonify(result), result_status(result)
             
+    except (ApiError, DatabaseUnavailable):
+        raise
     except Exception as e:
         logger.error(f"Error handling availability: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/availability', methods=['POST'])
-def create_availability():
-    """Create new availability slots"""
+def batch_availability_response(property_ids, seller_id):
+    """Fetch availability for many properties and render it grouped by property"""
+    window_start, window_end = window_params(request.args)
+    grouped = require(get_availability_manager().get_availability_batch(
+        property_ids=property_ids, seller_id=seller_id,
+        start_time=window_start, end_time=window_end
+    ), "Failed to fetch availability")
+
+    if json_is_compact():
+        try:
+            return Response(grouped_body(grouped, availability_encoder), mimetype='application/json'), 200
+        except TypeError:
+            pass
+    return jsonify(grouped_payload(grouped)), 200
+
+@routes.route('/api/availability/batch', methods=['GET'])
+def get_availability_batch():
+    """Get availability for a list of properties and/or a seller"""
     try:
-        data = request.json
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
+        return batch_availability_response(*batch_params(request.args))
+    except (ApiError, DatabaseUnavailable):
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching availability batch: {e}")
+        return jsonify({"error": str(e)}), 500
 
-        property_id = data.get('propertyId')
-        # Get seller_id from request or from auth token
-        seller_id = data.get('sellerId')
-        availability_slots = data.get('availabilitySlots', [])
+@routes.route('/api/availability/seller/<string:seller_id>', methods=['GET'])
+def get_seller_availability(seller_id):
+    """Get availability for every property of a seller"""
+    try:
+        return batch_availability_response(None, seller_id)
+    except (ApiError, DatabaseUnavailable):
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching seller availability: {e}")
+        return jsonify({"error": str(e)}), 500
 
-        if not property_id or not availability_slots:
-            return jsonify({"error": "Missing required fields: propertyId or availabilitySlots"}), 400
+@routes.route('/api/availability/export', methods=['GET'])
+def export_availability():
+    """Stream availability as a JSON array or NDJSON, filtered by property, seller or window"""
+    try:
+        export_format, export_filter = export_params(request.args)
+        rows = get_availability_manager().iter_availability(**export_filter)
 
-        availability_manager = AvailabilityManager(connection_string)
-        
-        # Process each availability slot
-        results = []
-        for slot in availability_slots:
+        # Pull the first row here so connection and query errors still
+        # produce a proper error response instead of a truncated stream
+        first = next(rows, None)
+
+        def generate():
             try:
-                start_time = datetime.fromisoformat(slot.get('start_time').replace('Z', '+00:00'))
-                end_time = datetime.fromisoformat(slot.get('end_time').replace('Z', '+00:00'))
-                
-                success = availability_manager.save_availability(
-                    property_id=property_id,
-                    seller_id=seller_id,
-                    start_time=start_time,
-                    end_time=end_time
-                )
-                
-                results.append({
-                    "success": success,
-                    "start_time": start_time.isoformat(),
-                    "end_time": end_time.isoformat()
-                })
+                if export_format == 'ndjson':
+                    if first is not None:
+                        yield json.dumps(first) + '\n'
+                    for row in rows:
+                        yield json.dumps(row) + '\n'
+                else:
+                    yield '['
+                    if first is not None:
+                        yield json.dumps(first)
+                    for row in rows:
+                        yield ',' + json.dumps(row)
+                    yield ']\n'
             except Exception as e:
-                logger.error(f"Error processing slot {slot}: {e}")
-                results.append({
-                    "success": False,
-                    "error": str(e),
-                    "slot": slot
-                })
+                logger.error(f"Error streaming availability export: {e}")
+                raise
+            finally:
+                rows.close()
 
-        return jsonify({
-            "message": "Availability slots processed",
-            "results": results,
-            "success_count": sum(1 for r in results if r.get("success", False))
-        }), 200
+        return Response(stream_with_context(generate()), mimetype=EXPORT_CONTENT_TYPES[export_format]), 200
+
+    except (ApiError, DatabaseUnavailable):
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting availability: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@routes.route('/api/availability/search', methods=['GET'])
+def search_availability():
+    """Find properties with availability in a time window"""
+    try:
+        result = require(get_availability_manager().search_availability(**search_params(request.args)),
+                         "Failed to search availability")
+        return jsonify(result), 200
+
+    except (ApiError, DatabaseUnavailable):
+        raise
+    except Exception as e:
+        logger.error(f"Error searching availability: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@routes.route('/api/availability/free', methods=['GET'])
+def find_free_slots():
+    """Earliest run of free 30-minute slots per property, from the slot bitmaps"""
+    try:
+        # The in-memory store builds its grids from the slots on every read
+        resources = availability_resources()
+        if not resources.bitmaps and resources.memory is None:
+            raise ApiError("Slot bitmaps are disabled; set AVAILABILITY_BITMAPS to enable them", 501)
+
+        grid_params, slots = free_slot_params(request.args)
+        grid = require(get_availability_manager().get_bitmap_grid(**grid_params),
+                       "Failed to load availability bitmaps")
+        return jsonify(free_slots_payload(grid, slots)), 200
+
+    except (ApiError, DatabaseUnavailable):
+        raise
+    except Exception as e:
+        logger.error(f"Error finding free slots: {e}")
+        return jsonify({"error": str(e)}), 500
 
+@routes.route('/api/availability/rules', methods=['GET', 'POST'])
+def handle_availability_rules():
+    """List or create recurring availability rules"""
+    try:
+        availability_manager = get_availability_manager()
+
+        if request.method == 'GET':
+            rules = require(availability_manager.get_availability_rules(*rules_query_params(request.args)),
+                            "Failed to fetch availability rules")
+            return jsonify(rules_payload(rules)), 200
+
+        property_id, seller_id, rule = new_rule_params(request.json)
+        created = require(availability_manager.create_availability_rule(property_id, seller_id, **rule),
+                          "Failed to create availability rule")
+        return jsonify(created), 201
+
+    except (ApiError, DatabaseUnavailable):
+        raise
+    except Exception as e:
+        logger.error(f"Error handling availability rules: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@routes.route('/api/availability/rules/<string:rule_id>', methods=['PUT', 'DELETE'])
+def handle_availability_rule(rule_id):
+    """Replace or delete a recurring availability rule"""
+    try:
+        availability_manager = get_availability_manager()
+
+        if request.method == 'DELETE':
+            result = availability_manager.delete_availability_rule(rule_id)
+            return jsonify(result), rule_deleted_status(result)
+
+        updated = availability_manager.update_availability_rule(rule_id, **rule_params(request.json))
+        if updated is None:
+            raise ApiError(f"Availability rule {rule_id} not found", 404)
+        return jsonify(updated), 200
+
+    except (ApiError, DatabaseUnavailable):
+        raise
+    except Exception as e:
+        logger.error(f"Error handling availability rule: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@routes.route('/api/viewings/match', methods=['POST'])
+def match_viewings():
+    """Slots when a buyer and each property's sellers are both free"""
+    try:
+        windows, property_ids, min_duration = match_params(request.json)
+        matches = require(get_availability_manager().match_viewings(windows, property_ids, min_duration),
+                          "Failed to match availability")
+        return jsonify(match_payload(matches, property_ids)), 200
+
+    except (ApiError, DatabaseUnavailable):
+        raise
+    except Exception as e:
+        logger.error(f"Error matching viewings: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@routes.route('/api/availability', methods=['POST'])
+def create_availability():
+    """Create new availability slots"""
+    try:
+        # Parse every slot first, then write all valid ones in one transaction
+        submission = SlotSubmission(request.json)
+        write_queue = availability_resources().write_queue
+        if write_queue is not None:
+            saved = write_queue.save(submission.property_id, submission.seller_id, submission.slots())
+        else:
+            saved = get_availability_manager().save_availability_batch(
+                property_id=submission.property_id,
+                seller_id=submission.seller_id,
+                slots=submission.slots()
+            )
+        return jsonify(submission.payload(saved)), 200
+
+    except (ApiError, DatabaseUnavailable):
+        raise
     except Exception as e:
         logger.error(f"Error creating availability: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api', methods=['GET'])
+@routes.route('/api/pool/stats', methods=['GET'])
+def pool_stats():
+    """Report connection pool usage for this worker"""
+    return jsonify({"pid": os.getpid(), "pools": all_pool_stats()}), 200
+
+@routes.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report availability and known-entity cache counters for this worker"""
+    resources = availability_resources()
+    stats = resources.cache.stats() if resources.cache is not None else None
+    entity_stats = resources.known_entities.stats() if resources.known_entities is not None else None
+    return jsonify({"pid": os.getpid(), "cache": stats, "known_entities": entity_stats}), 200
+
+@routes.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose request, pool and cache metrics in Prometheus text format"""
+    resources = availability_resources()
+    body = current_app.extensions['request_metrics'].render()
+    body += render_gauge_family('db_pool', 'Connection pool counters',
+                                [(f'pool="{dsn}"', stats) for dsn, stats in all_pool_stats().items()])
+    if resources.cache is not None:
+        body += render_gauges('availability_cache', 'Availability cache counters', resources.cache.stats())
+    if resources.known_entities is not None:
+        body += render_gauges('known_entity_cache', 'Known seller/property ID cache counters',
+                              resources.known_entities.stats())
+    if resources.write_queue is not None:
+        body += render_gauges('availability_write_queue', 'Group commit queue counters',
+                              resources.write_queue.stats())
+    body += render_gauges('db_resilience', 'Database limiter, circuit breaker and timeout counters',
+                          resources.guard.stats())
+    body += render_gauges('app_startup', 'Cold-start timings of this process in seconds', startup_timings)
+    if resources.replica_router is not None:
+        replica_stats = resources.replica_router.stats()
+        body += render_gauges('db_replica_routing', 'Read routing counters', replica_stats)
+        body += render_gauge_family('db_replica', 'Read replica health and reads',
+                                    [(f'replica="{dsn}"', stats) for dsn, stats in replica_stats['replicas'].items()])
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@routes.route('/api', methods=['GET'])
 def api_root():
     return jsonify({
         'message': 'API is online',
@@ -216,75 +473,43 @@ def api_root():
             'test': '/api/test-create',
             'availability': {
                 'test': '/api/availability/test',
-                'property': '/api/availability/property/<property_id>',
+                'property': '/api/availability/property/<property_id>?from=<iso>&to=<iso>',
+                'replace': 'PUT /api/availability/property/<property_id>',
+                'search': '/api/availability/search?from=<iso>&to=<iso>&minDuration=<minutes>',
+                'batch': '/api/availability/batch?propertyIds=<id,id,...>&sellerId=<id>',
+                'seller': '/api/availability/seller/<seller_id>',
+                'export': '/api/availability/export?format=<json|ndjson>&propertyId=<id>&sellerId=<id>',
+                'rules': '/api/availability/rules?propertyId=<id>&sellerId=<id>',
+                'rule': 'PUT|DELETE /api/availability/rules/<rule_id>',
+                'free': '/api/availability/free?propertyIds=<id,id,...>&date=<yyyy-mm-dd>&days=<n>&minDuration=<minutes>',
                 'create': '/api/availability'
-            }
+            },
+            'viewings': {
+                'match': 'POST /api/viewings/match'
+            },
+            'pool_stats': '/api/pool/stats',
+            'cache_stats': '/api/cache/stats',
+            'metrics': '/metrics'
         }
     }), 200
 
-@app.route('/setup-test-schema', methods=['GET'])
+@routes.route('/setup-test-schema', methods=['GET'])
 def setup_test_schema():
     """Initialize the database schema"""
     logger.info("Starting schema setup...")
     try:
         logger.info("Attempting database connection...")
-        conn = psycopg2.connect(connection_string, connect_timeout=10)
+        resources = availability_resources()
+        conn = psycopg2.connect(resources.connection_string, connect_timeout=10)
         logger.info("Database connection successful")
         
-        with conn:
-            with conn.cursor() as cur:
-                logger.info("Executing schema creation...")
-                
-                # Drop tables
-                logger.info("Dropping existing tables...")
-                cur.execute("""
-                    DROP TABLE IF EXISTS availability CASCADE;
-                    DROP TABLE IF EXISTS properties CASCADE;
-                    DROP TABLE IF EXISTS sellers CASCADE;
-                """)
-                logger.info("Dropped existing tables")
-
-                # Create tables one by one for better error tracking
-                logger.info("Creating sellers table...")
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS sellers (
-                        id UUID PRIMARY KEY,
-                        name VARCHAR(255) NOT NULL
-                    );
-                """)
-
-                logger.info("Creating properties table...")
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS properties (
-                        id UUID PRIMARY KEY,
-                        name VARCHAR(255) NOT NULL,
-                        seller_id UUID REFERENCES sellers(id)
-                    );
-                """)
-
-                logger.info("Creating availability table...")
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS availability (
-                        id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
-                        property_id UUID REFERENCES properties(id),
-                        seller_id UUID REFERENCES sellers(id),
-                        start_time TIMESTAMP NOT NULL,
-                        end_time TIMESTAMP NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        UNIQUE(property_id, seller_id, start_time, end_time)
-                    );
-                """)
-
-                logger.info("Creating indexes...")
-                cur.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_availability_property ON availability(property_id);
-                    CREATE INDEX IF NOT EXISTS idx_availability_seller ON availability(seller_id);
-                """)
-
-                conn.commit()
-                logger.info("Schema setup completed successfully")
-                return jsonify({"message": "Schema created successfully"}), 200
+        logger.info("Recreating the tables of schema.sql...")
+        reset_tables(conn)
+
+        logger.info("Creating availability partitions...")
+        PartitionManager(resources.connection_string, pool=resources.pool()).ensure_partitions()
+        logger.info("Schema setup completed successfully")
+        return jsonify({"message": "Schema created successfully"}), 200
     except psycopg2.Error as e:
         logger.error(f"Database error setting up schema: {str(e)}")
         return jsonify({"error": f"Database error: {str(e)}"}), 500
@@ -296,19 +521,20 @@ def setup_test_schema():
             conn.close()
             logger.info("Database connection closed")
 
-@app.route('/test-db', methods=['GET'])
+@routes.route('/test-db', methods=['GET'])
 def test_db_connection():
     """Simple endpoint to test database connectivity"""
     logger.info("Testing database connection...")
     try:
         # Connect directly with parameters
+        db_params = current_app.config['DATABASE']
         conn = psycopg2.connect(
             dbname=db_params['dbname'],
             user=db_params['user'],
             password=db_params['password'],
             host=db_params['host'],
             port=db_params['port'],
-            sslmode=os.getenv('PGSSLMODE', 'require'),
+            sslmode=current_app.config['PGSSLMODE'],
             connect_timeout=10
         )
         
@@ -332,7 +558,81 @@ def test_db_connection():
         if 'conn' in locals():
             conn.close()
 
+# Flask settings per APP_ENV profile. Debug mode pretty-prints every JSON
+# response and runs the reloader, so it is for local development only
+CONFIG_PROFILES = {
+    "development": {"DEBUG": True},
+    "production": {"DEBUG": False, "JSONIFY_PRETTYPRINT_REGULAR": False},
+}
+app_env = os.getenv('APP_ENV', 'production')
+
+# Cold-start cost of this process in seconds, reported on /metrics
+startup_timings = {}
+
+def create_app(config: Optional[dict] = None, profile: Optional[str] = None):
+    """
+    Build the Flask app with the settings of a CONFIG_PROFILES profile
+    (APP_ENV by default), then load_settings() from the environment, then
+    config on top of them
+    Its per-worker resources are built from the result and kept in
+    app.extensions['availability']
+    """
+    started = time.perf_counter()
+    profile = profile or app_env
+    if profile not in CONFIG_PROFILES:
+        raise ValueError(f"Unknown profile {profile!r}, expected one of {', '.join(CONFIG_PROFILES)}")
+
+    app = Flask(__name__, static_folder='frontend/build', static_url_path='/')
+    app.config.update(CONFIG_PROFILES[profile])
+    app.config.update(load_settings())
+    app.config.update(config or {})
+    logger.info(f"Database: {describe_dsn(app.config['DATABASE_URL'])}")
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
+            "methods": ["GET", "POST", "PUT", "OPTIONS", "DELETE"],
+            "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
+            "expose_headers": ["ETag"]
+        }
+    })
+    app.extensions['availability'] = AvailabilityResources(app.config)
+    # One structured log line per sampled request plus per-route latency
+    # histograms; 5xx responses are always logged whatever the sample rate
+    request_metrics = RequestMetrics(sample_rate=app.config['REQUEST_LOG_SAMPLE_RATE'],
+                                     logger=logging.getLogger('requests'))
+    request_metrics.init_app(app)
+    app.extensions['request_metrics'] = request_metrics
+    app.register_blueprint(routes)
+
+    startup_timings['create_app_seconds'] = time.perf_counter() - started
+    logger.info(f"Created app ({profile}, debug={app.debug}) in {startup_timings['create_app_seconds'] * 1000:.1f}ms")
+    return app
+
+def init_worker(flask_app: Optional[Flask] = None):
+    """
+    Per-worker setup of flask_app (the module's app by default), run by
+    gunicorn after each fork (see gunicorn.conf.py)
+    Opens the pool's min_size connections before the first request arrives;
+    if the database isn't reachable yet, the first requests connect instead
+    """
+    started = time.perf_counter()
+    try:
+        (flask_app or app).extensions['availability'].warm()
+    except Exception as e:
+        logger.warning(f"Could not warm the connection pool: {e}")
+    startup_timings['worker_init_seconds'] = time.perf_counter() - started
+    logger.info(f"Worker {os.getpid()} initialised in {startup_timings['worker_init_seconds'] * 1000:.1f}ms")
+
+def shutdown_worker(flask_app: Optional[Flask] = None):
+    """
+    Per-worker teardown: commit queued writes, then close the pools
+    """
+    (flask_app or app).extensions['availability'].close()
+    close_pools()
+
+app = create_app()
+
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 8000))
     logger.info(f"Starting application on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,420 @@
+"""
+ASGI entry point serving the /api/availability* and /api/viewings routes on asyncio
+
+Same paths, parameters and JSON bodies as the Flask app, backed by
+AsyncAvailabilityManager, so a single process can keep hundreds of
+calendar reads waiting on Postgres at once. Parameter validation and
+response payloads come from handlers, shared with the Flask routes; this
+module only does the routing and the asyncio I/O:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import json
+import logging
+import random
+import re
+import time
+from urllib.parse import parse_qsl
+
+from handlers import (
+    EXPORT_CONTENT_TYPES,
+    ApiError,
+    SlotSubmission,
+    availability_etag,
+    batch_params,
+    export_params,
+    free_slot_params,
+    free_slots_payload,
+    grouped_body,
+    match_params,
+    match_payload,
+    new_rule_params,
+    property_params,
+    replace_params,
+    require,
+    result_status,
+    rule_deleted_status,
+    rule_params,
+    rules_payload,
+    rules_query_params,
+    search_params,
+    window_params,
+)
+from models.async_availability import AsyncAvailabilityManager
+from models.availability import AVAILABILITY_COLUMNS
+from models.resources import build_availability_cache, build_known_entities
+from models.metrics import RequestMetrics, render_gauges
+from models.serialization import RowEncoder, dumps
+from models.settings import load_settings
+from models.write_queue import AsyncWriteQueue
+
+logger = logging.getLogger(__name__)
+
+CORS_ORIGINS = {"http://localhost:3000", "http://127.0.0.1:3000"}
+CORS_METHODS = "GET, POST, PUT, OPTIONS, DELETE"
+CORS_HEADERS = "Content-Type, Authorization, If-None-Match"
+
+availability_encoder = RowEncoder(AVAILABILITY_COLUMNS)
+
+settings = load_settings()
+availability_bitmaps = settings['AVAILABILITY_BITMAPS']
+
+availability_manager = AsyncAvailabilityManager(
+    settings['DATABASE_URL'],
+    merge_tolerance=settings['AVAILABILITY_MERGE_TOLERANCE'],
+    cache=build_availability_cache(settings),
+    known_entities=build_known_entities(settings),
+    bitmaps=availability_bitmaps,
+    min_size=settings['DB_POOL']['min_size'],
+    max_size=settings['DB_POOL']['max_size'],
+    password=settings['DATABASE']['password'],
+    timeout=10
+)
+
+write_queue = AsyncWriteQueue(
+    availability_manager.save_availability_groups,
+    max_latency=settings['AVAILABILITY_GROUP_COMMIT_MS'] / 1000,
+    max_batch=settings['AVAILABILITY_GROUP_COMMIT_BATCH']
+) if settings['AVAILABILITY_GROUP_COMMIT_MS'] is not None else None
+
+request_metrics = RequestMetrics(sample_rate=settings['REQUEST_LOG_SAMPLE_RATE'],
+                                 logger=logging.getLogger('requests'))
+
+
+class Request:
+    def __init__(self, scope, body: bytes):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = {}
+        for key, value in parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True):
+            self.args.setdefault(key, value)
+        self.headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in scope['headers']}
+        self.body = body
+        self.route = '<unmatched>'
+
+    def json(self):
+        if not self.body:
+            return None
+        return json.loads(self.body)
+
+
+class Response:
+    def __init__(self, body='', status=200, content_type='application/json', headers=None, stream=None):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.status = status
+        self.headers = dict(headers or {})
+        self.stream = stream
+        if content_type:
+            self.headers['Content-Type'] = content_type
+
+
+def json_response(payload, status=200):
+    """Render a payload like jsonify does in production"""
+    return Response(dumps(payload) + '\n', status)
+
+
+def if_none_match_contains(header, etag):
+    """Strong If-None-Match comparison, as werkzeug's ETags.contains does"""
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if not tag.startswith('W/') and tag.strip('"') == etag:
+            return True
+    return False
+
+
+async def create_availability_test_data(request):
+    """Create test data in the database"""
+    result = await availability_manager.create_test_data()
+    return json_response(result, result_status(result))
+
+
+async def handle_property_availability(request, property_id):
+    """Get, delete or replace availability for a property"""
+    property_id, seller_id = property_params(property_id, request.args)
+
+    if request.method == 'GET':
+        window_start, window_end = window_params(request.args)
+
+        # Polls for an unchanged calendar are answered from the version alone
+        if_none_match = request.headers.get('if-none-match', '')
+        if if_none_match:
+            version = await availability_manager.get_property_version(property_id, seller_id)
+            if version is not None:
+                etag = availability_etag(version, seller_id, request.args)
+                if if_none_match_contains(if_none_match, etag):
+                    return Response(b'', 304, content_type=None,
+                                    headers={'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'})
+
+        version, rows = require(await availability_manager.get_property_snapshot(
+            property_id, seller_id, start_time=window_start, end_time=window_end
+        ), "Failed to fetch availability")
+        headers = {'ETag': f'"{availability_etag(version, seller_id, request.args)}"', 'Cache-Control': 'no-cache'}
+        return Response(availability_encoder.encode_rows(rows) + '\n', headers=headers)
+
+    if request.method == 'DELETE':
+        result = await availability_manager.delete_property_availability(property_id, seller_id)
+        return json_response(result)
+
+    seller_id, slots = replace_params(request.args, request.json())
+    result = await availability_manager.replace_availability(property_id, seller_id, slots)
+    return json_response(result, result_status(result))
+
+
+async def batch_availability_response(request, property_ids, seller_id):
+    """Fetch availability for many properties and render it grouped by property"""
+    window_start, window_end = window_params(request.args)
+    grouped = require(await availability_manager.get_availability_batch(
+        property_ids=property_ids, seller_id=seller_id,
+        start_time=window_start, end_time=window_end
+    ), "Failed to fetch availability")
+    return Response(grouped_body(grouped, availability_encoder))
+
+
+async def get_availability_batch(request):
+    """Get availability for a list of properties and/or a seller"""
+    return await batch_availability_response(request, *batch_params(request.args))
+
+
+async def get_seller_availability(request, seller_id):
+    """Get availability for every property of a seller"""
+    return await batch_availability_response(request, None, seller_id)
+
+
+async def export_availability(request):
+    """Stream availability as a JSON array or NDJSON, filtered by property, seller or window"""
+    export_format, export_filter = export_params(request.args)
+    rows = availability_manager.iter_availability(**export_filter)
+    # Pull the first row before committing to a 200, as the Flask route does
+    try:
+        first = await rows.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def generate():
+        try:
+            if export_format == 'ndjson':
+                if first is not None:
+                    yield dumps(first, compact=False) + '\n'
+                async for row in rows:
+                    yield dumps(row, compact=False) + '\n'
+            else:
+                yield '['
+                if first is not None:
+                    yield dumps(first, compact=False)
+                async for row in rows:
+                    yield ',' + dumps(row, compact=False)
+                yield ']\n'
+        finally:
+            await rows.aclose()
+
+    return Response(content_type=EXPORT_CONTENT_TYPES[export_format], stream=generate())
+
+
+async def search_availability(request):
+    """Find properties with availability in a time window"""
+    result = require(await availability_manager.search_availability(**search_params(request.args)),
+                     "Failed to search availability")
+    return json_response(result)
+
+
+async def create_availability(request):
+    """Create new availability slots"""
+    submission = SlotSubmission(request.json())
+    if write_queue is not None:
+        saved = await write_queue.save(submission.property_id, submission.seller_id, submission.slots())
+    else:
+        saved = await availability_manager.save_availability_batch(
+            property_id=submission.property_id,
+            seller_id=submission.seller_id,
+            slots=submission.slots()
+        )
+    return json_response(submission.payload(saved))
+
+
+async def find_free_slots(request):
+    """Earliest run of free 30-minute slots per property, from the slot bitmaps"""
+    if not availability_bitmaps:
+        raise ApiError("Slot bitmaps are disabled; set AVAILABILITY_BITMAPS to enable them", 501)
+    grid_params, slots = free_slot_params(request.args)
+    grid = require(await availability_manager.get_bitmap_grid(**grid_params), "Failed to load availability bitmaps")
+    return json_response(free_slots_payload(grid, slots))
+
+
+async def match_viewings(request):
+    """Slots when a buyer and each property's sellers are both free"""
+    windows, property_ids, min_duration = match_params(request.json())
+    matches = require(await availability_manager.match_viewings(windows, property_ids, min_duration),
+                      "Failed to match availability")
+    return json_response(match_payload(matches, property_ids))
+
+
+async def handle_availability_rules(request):
+    """List or create recurring availability rules"""
+    if request.method == 'GET':
+        rules = require(await availability_manager.get_availability_rules(*rules_query_params(request.args)),
+                        "Failed to fetch availability rules")
+        return json_response(rules_payload(rules))
+
+    property_id, seller_id, rule = new_rule_params(request.json())
+    created = require(await availability_manager.create_availability_rule(property_id, seller_id, **rule),
+                      "Failed to create availability rule")
+    return json_response(created, 201)
+
+
+async def handle_availability_rule(request, rule_id):
+    """Replace or delete a recurring availability rule"""
+    if request.method == 'DELETE':
+        result = await availability_manager.delete_availability_rule(rule_id)
+        return json_response(result, rule_deleted_status(result))
+
+    updated = await availability_manager.update_availability_rule(rule_id, **rule_params(request.json()))
+    if updated is None:
+        raise ApiError(f"Availability rule {rule_id} not found", 404)
+    return json_response(updated)
+
+
+async def metrics(request):
+    """Expose request and cache metrics in Prometheus text format"""
+    body = request_metrics.render()
+    if availability_manager.cache is not None:
+        body += render_gauges('availability_cache', 'Availability cache counters', availability_manager.cache.stats())
+    if availability_manager.known_entities is not None:
+        body += render_gauges('known_entity_cache', 'Known seller/property ID cache counters',
+                              availability_manager.known_entities.stats())
+    if write_queue is not None:
+        body += render_gauges('availability_write_queue', 'Group commit queue counters', write_queue.stats())
+    return Response(body, content_type='text/plain; version=0.0.4')
+
+
+ROUTES = [
+    (re.compile(r'^/api/availability/test$'), {'POST'}, create_availability_test_data),
+    (re.compile(r'^/api/availability/property/(?P<property_id>[^/]+)$'), {'GET', 'DELETE', 'PUT'},
+     handle_property_availability),
+    (re.compile(r'^/api/availability/batch$'), {'GET'}, get_availability_batch),
+    (re.compile(r'^/api/availability/seller/(?P<seller_id>[^/]+)$'), {'GET'}, get_seller_availability),
+    (re.compile(r'^/api/availability/export$'), {'GET'}, export_availability),
+    (re.compile(r'^/api/availability/search$'), {'GET'}, search_availability),
+    (re.compile(r'^/api/availability/free$'), {'GET'}, find_free_slots),
+    (re.compile(r'^/api/availability/rules$'), {'GET', 'POST'}, handle_availability_rules),
+    (re.compile(r'^/api/availability/rules/(?P<rule_id>[^/]+)$'), {'PUT', 'DELETE'}, handle_availability_rule),
+    (re.compile(r'^/api/availability$'), {'POST'}, create_availability),
+    (re.compile(r'^/api/viewings/match$'), {'POST'}, match_viewings),
+    (re.compile(r'^/metrics$'), {'GET'}, metrics),
+]
+
+
+def route_rule(pattern):
+    """The Flask-style rule of a route pattern, e.g. /api/availability/property/<property_id>"""
+    return re.sub(r'\(\?P<(\w+)>[^)]*\)', r'<\1>', pattern.pattern.strip('^$'))
+
+
+async def dispatch(request):
+    for pattern, methods, handler in ROUTES:
+        match = pattern.match(request.path)
+        if match is None:
+            continue
+        request.route = route_rule(pattern)
+        if request.method == 'OPTIONS':
+            return Response(b'', 200, content_type=None, headers={'Allow': ', '.join(sorted(methods | {'OPTIONS'}))})
+        if request.method not in methods:
+            return json_response({"error": "Method not allowed"}, 405)
+        try:
+            return await handler(request, **match.groupdict())
+        except ApiError as e:
+            return json_response(e.payload, e.status)
+        except Exception as e:
+            logger.error(f"Error handling {request.method} {request.path}: {e}")
+            return json_response({"error": str(e)}, 500)
+    return json_response({"error": "Not found"}, 404)
+
+
+def add_cors_headers(request, response):
+    """Same policy as the Flask app's CORS set-up for /api/*"""
+    origin = request.headers.get('origin')
+    if origin not in CORS_ORIGINS or not request.path.startswith('/api/'):
+        return
+    response.headers['Access-Control-Allow-Origin'] = origin
+    response.headers['Vary'] = 'Origin'
+    if request.method == 'OPTIONS':
+        response.headers['Access-Control-Allow-Methods'] = CORS_METHODS
+        response.headers['Access-Control-Allow-Headers'] = CORS_HEADERS
+    else:
+        response.headers['Access-Control-Expose-Headers'] = 'ETag'
+
+
+def log_request(request, response, duration):
+    """Record a request as RequestMetrics does for the Flask app; streamed bodies count until their headers"""
+    request_metrics.observe(request.method, request.route, response.status, duration)
+    if response.status >= 500 or random.random() < request_metrics.sample_rate:
+        request_metrics.logger.info(json.dumps({
+            "event": "request",
+            "method": request.method,
+            "route": request.route,
+            "path": request.path,
+            "status": response.status,
+            "duration_ms": round(duration * 1000, 2)
+        }))
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await availability_manager.open()
+            except Exception as e:
+                logger.error(f"Error opening async connection pool: {e}")
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Commit whatever is still queued before the pool goes away
+            if write_queue is not None:
+                await write_queue.close()
+            await availability_manager.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    request = Request(scope, await read_body(receive))
+    if availability_manager.pool is None:
+        # Servers that skip the lifespan protocol open the pool on first use
+        await availability_manager.open()
+    started = time.perf_counter()
+    response = await dispatch(request)
+    add_cors_headers(request, response)
+    log_request(request, response, time.perf_counter() - started)
+
+    headers = [(key.encode('latin-1'), value.encode('latin-1')) for key, value in response.headers.items()]
+    if response.stream is None:
+        headers.append((b'content-length', str(len(response.body)).encode()))
+        await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': response.body})
+        return
+
+    await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+    try:
+        async for chunk in response.stream:
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+    except Exception as e:
+        # Headers are already sent, so the best we can do is cut the body short
+        logger.error(f"Error streaming availability export: {e}")
+    await send({'type': 'http.response.body', 'body': b''})
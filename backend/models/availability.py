@@ -1,9 +1,11 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import List
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
 
+from models.intervals import plan_merge
+
 class AvailabilityManager:
     def __init__(self, connection_string=None):
         # If no connection string is provided, construct from environment variables
@@ -84,26 +86,38 @@ class AvailabilityManager:
             print(f"Error fetching availability: {e}")
             return []
 
-    def create_availability(self, seller_id, property_id, availability_slots):
+    def create_availability(self, seller_id, property_id, availability_slots, merge_tolerance=timedelta(0)):
+        # Handle various date formats for better compatibility
+        def parse_time(time_str):
+            # Handle 'Z' timezone marker
+            if time_str.endswith('Z'):
+                time_str = time_str[:-1] + '+00:00'
+            # Handle missing timezone (assume UTC)
+            elif 'T' in time_str and not ('+' in time_str or '-' in time_str):
+                time_str = time_str + '+00:00'
+            parsed = datetime.fromisoformat(time_str)
+            # Stored timestamps are naive UTC
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed
+
         try:
+            incoming = [(parse_time(slot['start_time']), parse_time(slot['end_time']))
+                        for slot in availability_slots]
             successes = 0
             with self._get_connection() as conn:
                 with conn.cursor() as cur:
-                    for slot in availability_slots:
-                        # Handle various date formats for better compatibility
-                        def parse_time(time_str):
-                            # Handle 'Z' timezone marker
-                            if time_str.endswith('Z'):
-                                time_str = time_str[:-1] + '+00:00'
-                            # Handle missing timezone (assume UTC)
-                            elif 'T' in time_str and not ('+' in time_str or '-' in time_str):
-                                time_str = time_str + '+00:00'
-                            return datetime.fromisoformat(time_str)
-                        
-                        start_time = parse_time(slot['start_time'])
-                        end_time = parse_time(slot['end_time'])
-                        
-                        # Insert each availability slot
+                    cur.execute("""
+                        SELECT id, start_time, end_time FROM availability
+                        WHERE property_id = %s AND seller_id = %s
+                    """, (property_id, seller_id))
+
+                    # Coalesce the new slots with the stored ones before writing
+                    plan = plan_merge(cur.fetchall(), incoming, merge_tolerance)
+                    if plan.delete_ids:
+                        cur.execute("DELETE FROM availability WHERE id = ANY(%s::uuid[])", (plan.delete_ids,))
+
+                    for start_time, end_time in plan.inserts:
                         cur.execute("""
                             INSERT INTO availability (property_id, seller_id, start_time, end_time)
                             VALUES (%s, %s, %s, %s)
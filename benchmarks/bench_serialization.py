@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for the availability read-path serialisation
+
+Compares the original path (RealDictCursor-style dict rows rendered by
+Flask's jsonify) with the fixed-layout RowEncoder over tuple rows, checks
+both produce identical bytes, and prints rows/sec for each.
+
+    python benchmarks/bench_serialization.py --rows 5000 --repeat 20
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+from models.availability import AVAILABILITY_COLUMNS
+from models.serialization import RowEncoder, encode_datetime, encode_string
+
+
+def make_rows(count):
+    """Tuple rows shaped like a long-lived property's calendar"""
+    property_id = str(uuid.uuid4())
+    seller_id = str(uuid.uuid4())
+    start = datetime(2025, 1, 6, 8, 0)
+    created = datetime(2025, 1, 1, 12, 0, 0, 250000)
+    rows = []
+    for i in range(count):
+        day, slot = divmod(i, 26)
+        slot_start = start + timedelta(days=day, minutes=30 * slot)
+        rows.append((str(uuid.uuid4()), property_id, seller_id,
+                     slot_start, slot_start + timedelta(minutes=30), created, created))
+    return rows
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    encoder = RowEncoder(AVAILABILITY_COLUMNS)
+    app = Flask(__name__)
+
+    with app.app_context():
+        def before():
+            # What the endpoint did: dict per row, then jsonify
+            return jsonify([dict(zip(AVAILABILITY_COLUMNS, row)) for row in rows]).get_data()
+
+        def after_cold():
+            encode_datetime.cache_clear()
+            encode_string.cache_clear()
+            return (encoder.encode_rows(rows) + '\n').encode()
+
+        def after():
+            return (encoder.encode_rows(rows) + '\n').encode()
+
+        if before() != after_cold():
+            print("ERROR: fast encoder output differs from jsonify", file=sys.stderr)
+            return 1
+
+        results = [
+            ("jsonify(dict rows)", best_of(args.repeat, before)),
+            ("RowEncoder, cold caches", best_of(args.repeat, after_cold)),
+            ("RowEncoder, warm caches", best_of(args.repeat, after)),
+        ]
+
+    baseline = results[0][1]
+    print(f"{args.rows} rows, best of {args.repeat} runs; outputs are byte-identical")
+    for name, seconds in results:
+        print(f"  {name:<26} {args.rows / seconds:>12,.0f} rows/sec  ({baseline / seconds:.1f}x)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Gunicorn settings for production
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (preload_app) and forked, so workers
+start without re-importing it; each worker then opens its own database
+connections in post_fork. Threaded workers let one process serve several
+requests while others wait on Postgres, and keep client connections alive
+between requests. Every setting can be overridden from the environment.
+"""
+
+import multiprocessing
+import os
+import time
+
+# Cold-start measurement: from gunicorn loading this file to the master
+# being ready, which includes importing the app
+_started = time.perf_counter()
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', str(multiprocessing.cpu_count() * 2 + 1)))
+# Each thread can hold a pooled connection; keep threads * workers within
+# what Postgres allows, given DB_POOL_MAX_SIZE per worker
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+
+raw_env = [f"APP_ENV={os.getenv('APP_ENV', 'production')}"]
+
+
+def when_ready(server):
+    server.log.info(f"Master ready in {time.perf_counter() - _started:.3f}s "
+                    f"({workers} {worker_class} workers x {threads} threads)")
+
+
+def post_fork(server, worker):
+    worker.booted_at = time.perf_counter()
+    from app import init_worker
+    init_worker()
+
+
+def post_worker_init(worker):
+    worker.log.info(f"Worker {worker.pid} booted in {time.perf_counter() - worker.booted_at:.3f}s")
+
+
+def worker_exit(server, worker):
+    from app import shutdown_worker
+    shutdown_worker()
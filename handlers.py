@@ -0,0 +1,356 @@
+"""
+Request validation and response building shared by app.py and asgi.py
+
+Both apps split each availability route the same way: a *_params function
+turns the query arguments or JSON body into the manager call's arguments,
+the app calls (or awaits) its manager, and a *_payload function turns the
+result into the JSON body. A bad request raises ApiError, which both apps
+answer with {"error": message} and its status, so the two can only differ
+in how they talk to the database and the client.
+"""
+
+import hashlib
+import logging
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from models.partitions import MAX_SLOT_LENGTH
+from models.recurrence import parse_rule
+from models.serialization import RowEncoder, encode_string
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on properties returned or filtered by one search request
+MAX_SEARCH_LIMIT = 500
+# Upper bound on property IDs one batch read may ask for
+MAX_BATCH_PROPERTY_IDS = 100
+# Upper bound on days one free-slot query may scan
+MAX_FREE_SLOT_DAYS = 62
+# Upper bounds on the properties and buyer windows of one viewing match
+MAX_MATCH_PROPERTY_IDS = 5000
+MAX_MATCH_WINDOWS = 500
+
+EXPORT_CONTENT_TYPES = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+
+
+class ApiError(Exception):
+    """A request answered with {"error": message} and status"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def payload(self) -> dict:
+        return {"error": str(self)}
+
+
+def require(result, message: str):
+    """result, unless the manager returned None for a failed query"""
+    if result is None:
+        raise ApiError(message, 500)
+    return result
+
+
+def result_status(result: dict) -> int:
+    """Status of a manager result that reports failure as an 'error' key"""
+    return 200 if 'error' not in result else 500
+
+
+def uuid_param(value: str, name: str) -> str:
+    """A UUID path or query parameter; a malformed one is the client's error, not a failed query"""
+    try:
+        uuid.UUID(value)
+    except (TypeError, ValueError):
+        raise ApiError(f"Invalid {name}: {value!r} is not a UUID")
+    return value
+
+
+def property_params(property_id: str, args) -> Tuple[str, Optional[str]]:
+    """The property ID and optional sellerId of a single-property route"""
+    seller_id = args.get('sellerId')
+    return uuid_param(property_id, 'property ID'), uuid_param(seller_id, 'sellerId') if seller_id else None
+
+
+def availability_etag(version, seller_id, args):
+    """Strong ETag of a property read: the version plus what shaped the body"""
+    return hashlib.sha1(f"{version}|{seller_id}|{args.get('from')}|{args.get('to')}".encode()).hexdigest()
+
+
+def parse_slot_times(slot):
+    """Parse the ISO start_time/end_time of a submitted slot"""
+    start_time = datetime.fromisoformat(slot.get('start_time').replace('Z', '+00:00'))
+    end_time = datetime.fromisoformat(slot.get('end_time').replace('Z', '+00:00'))
+    if end_time <= start_time:
+        raise ValueError("end_time must be after start_time")
+    if end_time - start_time > MAX_SLOT_LENGTH:
+        raise ValueError(f"A slot may last at most {MAX_SLOT_LENGTH.days} days")
+    return start_time, end_time
+
+
+def parse_time_window(args):
+    """Parse the optional ISO from/to query parameters of a window query"""
+    window = []
+    for name in ('from', 'to'):
+        value = args.get(name)
+        try:
+            window.append(datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None)
+        except ValueError:
+            raise ValueError(f"Invalid '{name}' parameter: {value}")
+    if window[0] and window[1] and window[1] <= window[0]:
+        raise ValueError("'to' must be after 'from'")
+    return window[0], window[1]
+
+
+def int_arg(args: Mapping[str, str], name: str, default: Optional[int] = None) -> Optional[int]:
+    """An integer query parameter, or default if missing or not a number, as
+    werkzeug's args.get(name, default, type=int)"""
+    try:
+        return int(args[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def id_list(args: Mapping[str, str], name: str) -> List[str]:
+    """A comma-separated list of IDs from the query string"""
+    return [value for value in args.get(name, '').split(',') if value]
+
+
+def window_params(args) -> Tuple[Optional[datetime], Optional[datetime]]:
+    try:
+        return parse_time_window(args)
+    except ValueError as e:
+        raise ApiError(str(e))
+
+
+def replace_params(args, data: Optional[dict]) -> Tuple[str, list]:
+    """seller_id and parsed slots of a PUT to a property's calendar"""
+    data = data or {}
+    seller_id = data.get('sellerId') or args.get('sellerId')
+    availability_slots = data.get('availabilitySlots')
+    if not seller_id or availability_slots is None:
+        raise ApiError("Missing required fields: sellerId or availabilitySlots")
+    # A replace is all-or-nothing, so reject the request on any bad slot
+    try:
+        return seller_id, [parse_slot_times(slot) for slot in availability_slots]
+    except Exception as e:
+        raise ApiError(f"Invalid availability slot: {e}")
+
+
+def batch_params(args) -> Tuple[List[str], Optional[str]]:
+    """property_ids and seller_id of a batch read"""
+    property_ids = id_list(args, 'propertyIds')
+    seller_id = args.get('sellerId')
+    if not property_ids and not seller_id:
+        raise ApiError("Missing required parameters: propertyIds or sellerId")
+    if len(property_ids) > MAX_BATCH_PROPERTY_IDS:
+        raise ApiError(f"At most {MAX_BATCH_PROPERTY_IDS} propertyIds may be requested")
+    return property_ids, seller_id
+
+
+def grouped_payload(grouped: Dict[str, list]) -> dict:
+    return {
+        "properties": grouped,
+        "property_count": len(grouped),
+        "slot_count": sum(len(slots) for slots in grouped.values())
+    }
+
+
+def grouped_body(grouped: Dict[str, list], encoder: RowEncoder) -> str:
+    """grouped_payload() rendered as compact jsonify would, without the dicts"""
+    return '{"properties":{%s},"property_count":%d,"slot_count":%d}\n' % (
+        ','.join(encode_string(property_id) + ':' + encoder.encode_dict_rows(grouped[property_id])
+                 for property_id in sorted(grouped)),
+        len(grouped), sum(len(slots) for slots in grouped.values())
+    )
+
+
+def export_params(args) -> Tuple[str, dict]:
+    """Format and iter_availability() arguments of an export"""
+    export_format = args.get('format', 'json')
+    if export_format not in EXPORT_CONTENT_TYPES:
+        raise ApiError("format must be 'json' or 'ndjson'")
+    start_time, end_time = window_params(args)
+    return export_format, {
+        "property_id": args.get('propertyId'),
+        "seller_id": args.get('sellerId'),
+        "start_time": start_time,
+        "end_time": end_time
+    }
+
+
+def search_params(args) -> dict:
+    """search_availability() arguments of a search"""
+    start_time, end_time = window_params(args)
+    if not start_time or not end_time:
+        raise ApiError("Missing required parameters: from and to")
+    min_duration = int_arg(args, 'minDuration')
+    limit = min(int_arg(args, 'limit', 50), MAX_SEARCH_LIMIT)
+    offset = max(int_arg(args, 'offset', 0), 0)
+    property_ids = id_list(args, 'propertyIds')
+    if len(property_ids) > MAX_SEARCH_LIMIT:
+        raise ApiError(f"At most {MAX_SEARCH_LIMIT} propertyIds may be given")
+    return {
+        "start_time": start_time,
+        "end_time": end_time,
+        "min_duration": timedelta(minutes=min_duration) if min_duration else None,
+        "seller_id": args.get('sellerId'),
+        "property_ids": property_ids,
+        "limit": max(limit, 1),
+        "offset": offset
+    }
+
+
+def free_slot_params(args) -> Tuple[dict, int]:
+    """get_bitmap_grid() arguments of a free-slot query, and the run of
+    30-minute slots to look for"""
+    property_ids = id_list(args, 'propertyIds')
+    if not property_ids:
+        raise ApiError("Missing required parameter: propertyIds")
+    if len(property_ids) > MAX_SEARCH_LIMIT:
+        raise ApiError(f"At most {MAX_SEARCH_LIMIT} propertyIds may be given")
+    try:
+        start_date = date.fromisoformat(args['date']) if args.get('date') else datetime.now(timezone.utc).date()
+    except ValueError as e:
+        raise ApiError(str(e))
+    days = int_arg(args, 'days', 7)
+    min_duration = int_arg(args, 'minDuration', 30)
+    if not 1 <= days <= MAX_FREE_SLOT_DAYS:
+        raise ApiError(f"days must be between 1 and {MAX_FREE_SLOT_DAYS}")
+    slots = -(-min_duration // 30)
+    if not 1 <= slots <= 48:
+        raise ApiError("minDuration must be between 1 and 1440 minutes")
+    return {
+        "property_ids": property_ids,
+        "start_date": start_date,
+        "days": days,
+        "seller_id": args.get('sellerId')
+    }, slots
+
+
+def free_slots_payload(grid, slots: int) -> dict:
+    found = [
+        {"property_id": property_id, "start_time": start_time, "end_time": end_time}
+        for property_id, start_time, end_time in grid.first_free(slots)
+    ]
+    return {"properties": found, "property_count": len(found)}
+
+
+def rules_query_params(args) -> Tuple[Optional[str], Optional[str]]:
+    property_id = args.get('propertyId')
+    seller_id = args.get('sellerId')
+    if not property_id and not seller_id:
+        raise ApiError("Missing required parameters: propertyId or sellerId")
+    return property_id, seller_id
+
+
+def rules_payload(rules: list) -> dict:
+    return {"rules": rules, "rule_count": len(rules)}
+
+
+def rule_params(data: Optional[dict]) -> dict:
+    """create/update_availability_rule() arguments describing a rule"""
+    try:
+        return parse_rule(data or {})
+    except ValueError as e:
+        raise ApiError(str(e))
+
+
+def new_rule_params(data: Optional[dict]) -> Tuple[str, str, dict]:
+    data = data or {}
+    property_id = data.get('propertyId')
+    seller_id = data.get('sellerId')
+    if not property_id or not seller_id:
+        raise ApiError("Missing required fields: propertyId or sellerId")
+    return property_id, seller_id, rule_params(data)
+
+
+def rule_deleted_status(result: dict) -> int:
+    if 'error' in result:
+        return 500
+    return 200 if result['deleted_count'] else 404
+
+
+def match_params(data: Optional[dict]) -> Tuple[list, List[str], timedelta]:
+    """match_viewings() arguments of a viewing match"""
+    if not data:
+        raise ApiError("No data provided")
+    property_ids = data.get('propertyIds') or []
+    buyer_availability = data.get('buyerAvailability') or []
+    if not property_ids or not buyer_availability:
+        raise ApiError("Missing required fields: propertyIds or buyerAvailability")
+    if len(property_ids) > MAX_MATCH_PROPERTY_IDS:
+        raise ApiError(f"At most {MAX_MATCH_PROPERTY_IDS} propertyIds may be given")
+    if len(buyer_availability) > MAX_MATCH_WINDOWS:
+        raise ApiError(f"At most {MAX_MATCH_WINDOWS} buyerAvailability windows may be given")
+    try:
+        windows = [parse_slot_times(window) for window in buyer_availability]
+        min_duration = int(data.get('minDuration', 30))
+    except Exception as e:
+        raise ApiError(f"Invalid buyer availability: {e}")
+    if min_duration <= 0:
+        raise ApiError("minDuration must be a positive number of minutes")
+    return windows, property_ids, timedelta(minutes=min_duration)
+
+
+def match_payload(matches: list, property_ids: List[str]) -> dict:
+    return {
+        "matches": matches,
+        "match_count": len(matches),
+        "property_count": len(set(property_ids))
+    }
+
+
+class SlotSubmission:
+    """
+    The slots of a POST to /api/availability
+
+    Slots are parsed up front; the valid ones are saved together, as
+    slots(), and payload() reports every submitted slot in order, bad ones
+    with the reason they were skipped.
+    """
+
+    def __init__(self, data: Optional[dict]):
+        if not data:
+            raise ApiError("No data provided")
+        self.property_id = data.get('propertyId')
+        # Get seller_id from request or from auth token
+        self.seller_id = data.get('sellerId')
+        self.availability_slots = data.get('availabilitySlots', [])
+        if not self.property_id or not self.availability_slots:
+            raise ApiError("Missing required fields: propertyId or availabilitySlots")
+
+        self.results: List[Optional[dict]] = [None] * len(self.availability_slots)
+        self.parsed = []
+        for index, slot in enumerate(self.availability_slots):
+            try:
+                start_time, end_time = parse_slot_times(slot)
+                self.parsed.append((index, start_time, end_time))
+            except Exception as e:
+                logger.error(f"Error processing slot {slot}: {e}")
+                self.results[index] = {"success": False, "error": str(e), "slot": slot}
+
+    def slots(self) -> List[Tuple[datetime, datetime]]:
+        return [(start_time, end_time) for _, start_time, end_time in self.parsed]
+
+    def payload(self, saved: Optional[list]) -> Dict[str, Any]:
+        """Response body given the save's per-slot results, None if it failed"""
+        results = list(self.results)
+        for position, (index, start_time, end_time) in enumerate(self.parsed):
+            slot = self.availability_slots[index]
+            if saved is None:
+                results[index] = {"success": False, "error": "Failed to save availability slots", "slot": slot}
+            elif saved[position] is None:
+                results[index] = {"success": False, "error": "Availability slot already exists", "slot": slot}
+            else:
+                results[index] = {
+                    "success": saved[position],
+                    "start_time": start_time.isoformat(),
+                    "end_time": end_time.isoformat()
+                }
+        return {
+            "message": "Availability slots processed",
+            "results": results,
+            "success_count": sum(1 for r in results if r.get("success", False))
+        }
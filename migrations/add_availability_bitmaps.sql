@@ -0,0 +1,15 @@
+-- Compact per-day occupancy bitmaps on the frontend's 30-minute grid.
+-- Bit i of slots is set when the seller is free for the whole of
+-- 00:00 + i * 30 minutes on that day (48 bits per day). The rows in
+-- availability stay the source of truth; this table is derived from them
+-- and kept current by writes when AVAILABILITY_BITMAPS is enabled.
+--
+-- After applying, backfill once with AvailabilityManager.rebuild_bitmaps().
+
+CREATE TABLE IF NOT EXISTS availability_bitmaps (
+    property_id UUID NOT NULL REFERENCES properties(id),
+    seller_id UUID NOT NULL REFERENCES sellers(id),
+    day DATE NOT NULL,
+    slots BIGINT NOT NULL,
+    PRIMARY KEY (property_id, seller_id, day)
+);
@@ -0,0 +1,7 @@
+-- IANA time zone of a recurring rule's wall-clock times.
+-- Rules are expanded day by day in this zone and each occurrence converted
+-- to UTC, so "weekdays 17:00-19:00" in Europe/London stays at 17:00 local
+-- across DST changes. Existing rules keep expanding as UTC.
+
+ALTER TABLE availability_rules
+    ADD COLUMN IF NOT EXISTS timezone TEXT NOT NULL DEFAULT 'UTC';
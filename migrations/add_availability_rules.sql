@@ -0,0 +1,28 @@
+-- Weekly recurring availability rules.
+-- A rule such as "every weekday 17:00-19:00 from 2025-01-06" is stored once
+-- and expanded into occurrences at read time, for the requested window only,
+-- instead of being materialised as one availability row per day.
+--
+-- weekdays holds ISO day numbers (1 = Monday ... 7 = Sunday); end_date is
+-- inclusive and NULL for open-ended rules; exceptions lists skipped dates.
+
+CREATE TABLE IF NOT EXISTS availability_rules (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    property_id UUID NOT NULL REFERENCES properties(id),
+    seller_id UUID NOT NULL REFERENCES sellers(id),
+    weekdays SMALLINT[] NOT NULL,
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE,
+    exceptions DATE[] NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CHECK (end_time > start_time),
+    CHECK (end_date IS NULL OR end_date >= start_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_availability_rules_property
+    ON availability_rules(property_id, seller_id);
+CREATE INDEX IF NOT EXISTS idx_availability_rules_seller
+    ON availability_rules(seller_id);
@@ -0,0 +1,12 @@
+-- GiST index for cross-property availability search.
+-- GET /api/availability/search filters every property's slots with
+-- tsrange(start_time, end_time) && tsrange($from, $to); range types have
+-- built-in GiST support, so no extension is needed.
+--
+-- CONCURRENTLY avoids blocking writes while the index builds, so run this
+-- file outside a transaction block (plain psql -f is fine).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_availability_range
+    ON availability USING gist (tsrange(start_time, end_time));
+
+ANALYZE availability;
@@ -0,0 +1,13 @@
+-- Covering index for availability version lookups.
+-- GET /api/availability/property/<id> derives its ETag from
+-- count(*), max(updated_at) and a checksum of the slot ids, filtered on
+-- property_id and optionally seller_id. With id and updated_at included,
+-- that aggregate is an index-only scan and never touches the heap.
+--
+-- CONCURRENTLY avoids blocking writes while the index builds, so run this
+-- file outside a transaction block (plain psql -f is fine).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_availability_property_version
+    ON availability(property_id, seller_id) INCLUDE (id, updated_at);
+
+VACUUM ANALYZE availability;
@@ -0,0 +1,16 @@
+-- Composite index for time-window queries on a property's availability.
+-- GET /api/availability/property/<id>?from=...&to=... filters on
+-- property_id = $1 AND end_time > $from AND start_time < $to.
+--
+-- end_time leads start_time on purpose: calendars ask for windows around
+-- now, so the range scan on end_time > $from skips a listing's whole past
+-- and start_time < $to is checked from the index without touching the heap.
+-- A plain btree also avoids depending on the btree_gist extension.
+--
+-- CONCURRENTLY avoids blocking writes while the index builds, so run this
+-- file outside a transaction block (plain psql -f is fine).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_availability_property_window
+    ON availability(property_id, end_time, start_time);
+
+ANALYZE availability;
@@ -0,0 +1,15 @@
+-- Planner check for add_availability_window_index.sql.
+-- The plan printed below should contain an Index Scan or Bitmap Index Scan
+-- on idx_availability_property_window. A Seq Scan, or a scan on
+-- idx_availability_property, means the index is missing or the table is
+-- still too small for the planner to bother with it.
+
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT id, property_id, seller_id,
+       start_time, end_time,
+       created_at, updated_at
+FROM availability
+WHERE property_id = (SELECT property_id FROM availability LIMIT 1)
+  AND end_time > now()::timestamp
+  AND start_time < (now() + interval '7 days')::timestamp
+ORDER BY start_time;
@@ -0,0 +1,85 @@
+-- Convert availability into a table range-partitioned by month on start_time.
+-- Calendars only grow, but reads look at windows around now; with one
+-- partition per month, window queries skip the months they can't touch and
+-- old months can be detached, archived or dropped without a bulk DELETE.
+--
+-- Partition keys must be part of every unique constraint, so the primary key
+-- becomes (id, start_time). Slots are capped at 31 days (the
+-- availability_slot_length CHECK, MAX_SLOT_LENGTH in models/partitions.py),
+-- which gives window reads a lower bound on start_time to prune with. Check
+-- for longer slots before running this; the copy fails if there are any:
+--
+--     SELECT count(*) FROM availability WHERE end_time - start_time > interval '31 days';
+--
+-- Runs as one transaction and holds an exclusive lock on availability while
+-- the rows are copied, so schedule it in a quiet window. Partitions are
+-- created for every month with data and three months ahead; afterwards run
+-- python -m models.partitions ensure from cron to keep that lead.
+
+BEGIN;
+
+ALTER TABLE availability RENAME TO availability_unpartitioned;
+ALTER TABLE availability_unpartitioned RENAME CONSTRAINT availability_pkey TO availability_unpartitioned_pkey;
+ALTER TABLE availability_unpartitioned
+    RENAME CONSTRAINT availability_property_id_seller_id_start_time_end_time_key
+    TO availability_unpartitioned_slot_key;
+DROP INDEX IF EXISTS idx_availability_property;
+DROP INDEX IF EXISTS idx_availability_seller;
+DROP INDEX IF EXISTS idx_availability_property_window;
+DROP INDEX IF EXISTS idx_availability_range;
+DROP INDEX IF EXISTS idx_availability_property_version;
+
+CREATE TABLE availability (
+    id UUID DEFAULT gen_random_uuid(),
+    property_id UUID REFERENCES properties(id),
+    seller_id UUID REFERENCES sellers(id),
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, start_time),
+    UNIQUE(property_id, seller_id, start_time, end_time),
+    CONSTRAINT availability_slot_length CHECK (end_time - start_time <= interval '31 days')
+) PARTITION BY RANGE (start_time);
+
+CREATE TABLE availability_default PARTITION OF availability DEFAULT;
+
+DO $$
+DECLARE
+    month DATE;
+    last_month DATE;
+BEGIN
+    SELECT date_trunc('month', LEAST(min(start_time), now()::timestamp))::date,
+           date_trunc('month', GREATEST(max(start_time), now()::timestamp + interval '3 months'))::date
+    INTO month, last_month
+    FROM availability_unpartitioned;
+
+    WHILE month <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF availability FOR VALUES FROM (%L) TO (%L)',
+            'availability_' || to_char(month, 'YYYY_MM'), month, (month + interval '1 month')::date
+        );
+        month := (month + interval '1 month')::date;
+    END LOOP;
+END
+$$;
+
+INSERT INTO availability (id, property_id, seller_id, start_time, end_time, created_at, updated_at)
+SELECT id, property_id, seller_id, start_time, end_time, created_at, updated_at
+FROM availability_unpartitioned;
+
+-- Created on the parent, so every partition (and future ones) gets them
+CREATE INDEX idx_availability_property ON availability(property_id);
+CREATE INDEX idx_availability_seller ON availability(seller_id);
+CREATE INDEX idx_availability_property_window
+    ON availability(property_id, end_time, start_time);
+CREATE INDEX idx_availability_range
+    ON availability USING gist (tsrange(start_time, end_time));
+CREATE INDEX idx_availability_property_version
+    ON availability(property_id, seller_id) INCLUDE (id, updated_at);
+
+DROP TABLE availability_unpartitioned;
+
+COMMIT;
+
+ANALYZE availability;
@@ -0,0 +1,893 @@
+from datetime import date, datetime, time, timedelta
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import uuid
+
+import asyncpg
+
+from models.availability import AVAILABILITY_COLUMNS
+from models.bitmap import BitmapGrid, seller_bitmaps
+from models.cache import IntervalCache, KnownEntityCache
+from models.intervals import merge_results, naive_utc, naive_utc_intervals, normalize_intervals, plan_merge, split_intervals
+from models.matching import buyer_windows, match_availability
+from models.partitions import MAX_SLOT_LENGTH, min_slot_start
+from models.recurrence import (DEFAULT_RULE_HORIZON, DEFAULT_RULE_TIMEZONE, RULE_COLUMNS, expand_rules,
+                               merge_occurrences, occurrences_query, rule_date_range, rule_record,
+                               rule_timezone, rule_window)
+
+logger = logging.getLogger(__name__)
+
+
+def _row_count(status: str) -> int:
+    # asyncpg returns the command tag, e.g. "DELETE 3"
+    return int(status.split()[-1])
+
+
+async def _init_connection(conn):
+    # Hand UUIDs back as strings, matching psycopg2 and the JSON contracts
+    await conn.set_type_codec('uuid', encoder=str, decoder=str, schema='pg_catalog')
+
+
+class AsyncAvailabilityManager:
+    """
+    asyncio counterpart of AvailabilityManager on asyncpg
+
+    Method names, arguments and return shapes match AvailabilityManager, so
+    the ASGI app can serve the same contracts as the Flask routes. Call
+    open() before use and close() on shutdown.
+    """
+
+    def __init__(self, db_connection_string: str, pool: Optional[asyncpg.Pool] = None,
+                 merge_tolerance: Optional[timedelta] = None,
+                 cache: Optional[IntervalCache] = None,
+                 known_entities: Optional[KnownEntityCache] = None,
+                 rule_horizon: timedelta = DEFAULT_RULE_HORIZON,
+                 bitmaps: bool = False,
+                 min_size: int = 1, max_size: int = 10, **connect_kwargs):
+        self.conn_string = db_connection_string
+        self.pool = pool
+        self.merge_tolerance = merge_tolerance
+        self.cache = cache
+        self.known_entities = known_entities
+        self.rule_horizon = rule_horizon
+        self.bitmaps = bitmaps
+        self.min_size = min_size
+        self.max_size = max_size
+        self.connect_kwargs = connect_kwargs
+        self._open_lock = asyncio.Lock()
+
+    async def open(self):
+        async with self._open_lock:
+            if self.pool is None:
+                self.pool = await asyncpg.create_pool(
+                    self.conn_string, min_size=self.min_size, max_size=self.max_size,
+                    init=_init_connection, **self.connect_kwargs
+                )
+                logger.info(f"Created async connection pool (min_size={self.min_size}, max_size={self.max_size})")
+        return self
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def _after_write(self, property_id: str, seller_id: Optional[str] = None):
+        if self.cache is not None:
+            self.cache.invalidate(property_id)
+        if seller_id is not None and self.known_entities is not None:
+            self.known_entities.add(('seller', seller_id), ('property', property_id))
+
+    def _write_failed(self, error: Exception, property_id: str, seller_id: str):
+        # A remembered seller or property was deleted behind our back
+        if isinstance(error, asyncpg.ForeignKeyViolationError) and self.known_entities is not None:
+            self.known_entities.discard(('seller', seller_id), ('property', property_id))
+
+    async def _ensure_entities(self, conn, property_id: str, seller_id: str):
+        """
+        Create the seller and property rows if they don't exist yet
+        Same single upsert as AvailabilityManager._ensure_entities
+        """
+        if self.known_entities is not None and \
+                self.known_entities.contains(('seller', seller_id), ('property', property_id)):
+            return
+
+        created_seller, created_property = await conn.fetchrow("""
+            WITH new_seller AS (
+                INSERT INTO sellers (id, name)
+                VALUES ($1, $2)
+                ON CONFLICT (id) DO NOTHING
+                RETURNING id
+            ), new_property AS (
+                INSERT INTO properties (id, name, seller_id)
+                VALUES ($3, $4, $1)
+                ON CONFLICT (id) DO NOTHING
+                RETURNING id
+            )
+            SELECT (SELECT count(*) FROM new_seller), (SELECT count(*) FROM new_property)
+        """, seller_id, f"Seller {seller_id[:8]}", property_id, f"Property {property_id[:8]}")
+
+        if created_seller:
+            logger.info(f"Created seller with ID {seller_id}")
+        if created_property:
+            logger.info(f"Created property with ID {property_id}")
+
+    async def _refresh_bitmaps(self, conn, property_id: str, seller_id: Optional[str] = None):
+        """
+        Recompute a property's stored slot bitmaps inside the write's transaction
+        Same as AvailabilityManager._refresh_bitmaps
+        """
+        filters = " AND seller_id = $2" if seller_id else ""
+        params = [property_id, seller_id] if seller_id else [property_id]
+        rows = await conn.fetch(f"""
+            SELECT seller_id, start_time, end_time
+            FROM availability
+            WHERE property_id = $1 {filters}
+        """, *params)
+        records = seller_bitmaps((row['seller_id'], row['start_time'], row['end_time']) for row in rows)
+        await conn.execute(f"DELETE FROM availability_bitmaps WHERE property_id = $1 {filters}", *params)
+        if records:
+            await conn.executemany("""
+                INSERT INTO availability_bitmaps (property_id, seller_id, day, slots)
+                VALUES ($1, $2, $3, $4)
+            """, [(property_id, record_seller, day, mask) for record_seller, day, mask in records])
+
+    async def save_availability(self, property_id: str, seller_id: str,
+                                start_time: datetime, end_time: datetime) -> Optional[dict]:
+        """
+        Save a new availability slot for a property
+        Returns the created availability record
+        """
+        results = await self.save_availability_batch(property_id, seller_id, [(start_time, end_time)])
+        return results[0] if results else None
+
+    async def _merge_slots(self, conn, property_id: str, seller_id: str,
+                           slots: Sequence[Tuple[datetime, datetime]]) -> List[Optional[dict]]:
+        """
+        Coalesce slots with the seller's stored intervals for a property
+        Same contract as AvailabilityManager._merge_slots
+        """
+        tolerance = self.merge_tolerance
+        await conn.execute("SELECT pg_advisory_xact_lock(hashtext($1))", f"{property_id}:{seller_id}")
+        incoming = naive_utc_intervals(slots)
+
+        span_start = min(start_time for start_time, _ in incoming) - tolerance
+        span_end = max(end_time for _, end_time in incoming) + tolerance
+        existing = [dict(row) for row in await conn.fetch("""
+            SELECT id, property_id, seller_id, start_time, end_time, created_at, updated_at
+            FROM availability
+            WHERE property_id = $1 AND seller_id = $2
+              AND start_time <= $3 AND end_time >= $4 AND start_time >= $5
+        """, property_id, seller_id, span_end, span_start, min_slot_start(span_start))]
+
+        plan = plan_merge([(row['id'], row['start_time'], row['end_time']) for row in existing],
+                          incoming, tolerance, MAX_SLOT_LENGTH)
+        if plan.delete_ids:
+            await conn.execute("""
+                DELETE FROM availability
+                WHERE id = ANY($1::uuid[]) AND start_time >= $2 AND start_time <= $3
+            """, plan.delete_ids, min_slot_start(span_start), span_end)
+
+        keep_ids = set(plan.keep_ids)
+        records = {(row['start_time'], row['end_time']): row for row in existing if row['id'] in keep_ids}
+        if plan.inserts:
+            for row in await conn.fetch("""
+                INSERT INTO availability (property_id, seller_id, start_time, end_time)
+                SELECT $1, $2, input.start_time, input.end_time
+                FROM unnest($3::timestamp[], $4::timestamp[]) AS input (start_time, end_time)
+                RETURNING id, property_id, seller_id, start_time, end_time, created_at, updated_at
+            """, property_id, seller_id,
+                [start_time for start_time, _ in plan.inserts],
+                [end_time for _, end_time in plan.inserts]):
+                records[(row['start_time'], row['end_time'])] = dict(row)
+
+        previous = normalize_intervals((row['start_time'], row['end_time']) for row in existing)
+        return [records[interval] if interval is not None else None
+                for interval in merge_results(previous, plan.merged, incoming)]
+
+    async def _insert_slots(self, conn, rows: Sequence[Tuple[str, str, datetime, datetime]]) -> List[Optional[dict]]:
+        """
+        Insert (property_id, seller_id, start_time, end_time) rows in one statement
+        Same contract as AvailabilityManager._insert_slots
+        """
+        inserted = await conn.fetch("""
+            WITH input AS (
+                SELECT * FROM unnest($1::uuid[], $2::uuid[], $3::timestamp[], $4::timestamp[])
+                    WITH ORDINALITY AS input (property_id, seller_id, start_time, end_time, ord)
+            ), inserted AS (
+                INSERT INTO availability
+                (property_id, seller_id, start_time, end_time)
+                SELECT property_id, seller_id, start_time, end_time
+                FROM input ORDER BY property_id, seller_id, start_time, end_time
+                ON CONFLICT (property_id, seller_id, start_time, end_time) DO NOTHING
+                RETURNING id, property_id, seller_id, start_time, end_time, created_at, updated_at
+            )
+            SELECT inserted.id, inserted.property_id, inserted.seller_id,
+                   inserted.start_time, inserted.end_time,
+                   inserted.created_at, inserted.updated_at
+            FROM input
+            LEFT JOIN inserted
+              ON inserted.property_id = input.property_id
+             AND inserted.seller_id = input.seller_id
+             AND inserted.start_time = input.start_time
+             AND inserted.end_time = input.end_time
+            ORDER BY input.ord
+        """, [row[0] for row in rows], [row[1] for row in rows],
+            [naive_utc(row[2]) for row in rows], [naive_utc(row[3]) for row in rows])
+
+        results = []
+        claimed = set()
+        for row in inserted:
+            # A slot repeated within the batch joins to the same new row;
+            # only its first occurrence counts as created
+            if row['id'] is None or row['id'] in claimed:
+                results.append(None)
+            else:
+                claimed.add(row['id'])
+                results.append(dict(row))
+        return results
+
+    async def save_availability_batch(self, property_id: str, seller_id: str,
+                                      slots: Sequence[Tuple[datetime, datetime]]) -> Optional[List[Optional[dict]]]:
+        """
+        Save many availability slots for a property in a single transaction
+        Returns one entry per slot in input order: the created record, or None
+        if the slot already exists. Returns None if the batch failed.
+        """
+        if not slots:
+            return []
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await self._ensure_entities(conn, property_id, seller_id)
+
+                    if self.merge_tolerance is not None:
+                        results = await self._merge_slots(conn, property_id, seller_id, slots)
+                    else:
+                        results = await self._insert_slots(conn, [(property_id, seller_id, start_time, end_time)
+                                                                  for start_time, end_time in slots])
+
+                    if self.bitmaps:
+                        await self._refresh_bitmaps(conn, property_id, seller_id)
+            self._after_write(property_id, seller_id)
+            return results
+        except Exception as e:
+            self._write_failed(e, property_id, seller_id)
+            logger.error(f"Error saving availability batch: {e}")
+            return None
+
+    async def save_availability_groups(self, writes: Sequence[Tuple[str, str, Sequence[Tuple[datetime, datetime]]]]
+                                       ) -> List[Optional[List[Optional[dict]]]]:
+        """
+        Save several (property_id, seller_id, slots) writes in one transaction
+        Same contract as AvailabilityManager.save_availability_groups
+        """
+        if not writes:
+            return []
+        order = sorted(range(len(writes)), key=lambda index: writes[index][:2])
+        calendars = sorted({(property_id, seller_id) for property_id, seller_id, _ in writes})
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    for property_id, seller_id in calendars:
+                        await self._ensure_entities(conn, property_id, seller_id)
+
+                    results = [[] for _ in writes]
+                    if self.merge_tolerance is not None:
+                        for index in order:
+                            property_id, seller_id, slots = writes[index]
+                            if slots:
+                                results[index] = await self._merge_slots(conn, property_id, seller_id, slots)
+                    else:
+                        rows = [(writes[index][0], writes[index][1], start_time, end_time)
+                                for index in order for start_time, end_time in writes[index][2]]
+                        inserted = iter(await self._insert_slots(conn, rows)) if rows else iter(())
+                        for index in order:
+                            results[index] = [next(inserted) for _ in writes[index][2]]
+
+                    if self.bitmaps:
+                        for property_id, seller_id in calendars:
+                            await self._refresh_bitmaps(conn, property_id, seller_id)
+        except Exception as e:
+            for property_id, seller_id in calendars:
+                self._write_failed(e, property_id, seller_id)
+            logger.warning(f"Group commit of {len(writes)} writes failed, saving them one by one: {e}")
+            return [await self.save_availability_batch(property_id, seller_id, slots)
+                    for property_id, seller_id, slots in writes]
+
+        for property_id, seller_id in calendars:
+            self._after_write(property_id, seller_id)
+        return results
+
+    async def get_property_availability(self, property_id: str, seller_id: Optional[str] = None,
+                                        start_time: Optional[datetime] = None,
+                                        end_time: Optional[datetime] = None) -> List[dict]:
+        """
+        Get all availability slots for a property, optionally within a window
+        """
+        rows = await self.get_property_availability_rows(property_id, seller_id, start_time, end_time)
+        return [dict(zip(AVAILABILITY_COLUMNS, row)) for row in rows]
+
+    async def get_property_availability_rows(self, property_id: str, seller_id: Optional[str] = None,
+                                             start_time: Optional[datetime] = None,
+                                             end_time: Optional[datetime] = None) -> List[tuple]:
+        """
+        Same as get_property_availability, as tuples in AVAILABILITY_COLUMNS order
+        """
+        use_cache = self.cache is not None and not start_time and not end_time
+        if use_cache:
+            cached = self.cache.get(property_id, seller_id)
+            if cached is not None:
+                return list(cached)
+            generation = self.cache.generation(property_id)
+
+        try:
+            async with self.pool.acquire() as conn:
+                results = await self._property_rows(conn, property_id, seller_id, start_time, end_time)
+
+            if use_cache:
+                self.cache.put(property_id, seller_id, results, generation)
+                return list(results)
+            return results
+        except Exception as e:
+            logger.error(f"Error getting availability: {e}")
+            return []
+
+    async def get_property_snapshot(self, property_id: str, seller_id: Optional[str] = None,
+                                    start_time: Optional[datetime] = None,
+                                    end_time: Optional[datetime] = None) -> Optional[Tuple[str, List[tuple]]]:
+        """
+        A property's version and rows from one REPEATABLE READ transaction
+        Same contract as AvailabilityManager.get_property_snapshot
+        """
+        use_cache = self.cache is not None and not start_time and not end_time
+        if use_cache:
+            generation = self.cache.generation(property_id)
+
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction(isolation='repeatable_read', readonly=True):
+                    version = await self._property_version(conn, property_id, seller_id)
+                    cached = self.cache.get(property_id, seller_id, version) if use_cache else None
+                    if cached is not None:
+                        return version, list(cached)
+                    rows = await self._property_rows(conn, property_id, seller_id, start_time, end_time)
+
+            if use_cache:
+                self.cache.put(property_id, seller_id, rows, generation, version)
+                return version, list(rows)
+            return version, rows
+        except Exception as e:
+            logger.error(f"Error getting availability snapshot: {e}")
+            return None
+
+    async def _property_rows(self, conn, property_id: str, seller_id: Optional[str],
+                             start_time: Optional[datetime], end_time: Optional[datetime]) -> List[tuple]:
+        query = """
+            SELECT id, property_id, seller_id,
+                   start_time, end_time,
+                   created_at, updated_at
+            FROM availability
+            WHERE property_id = $1
+        """
+        params = [property_id]
+
+        if seller_id:
+            params.append(seller_id)
+            query += f" AND seller_id = ${len(params)}"
+        if start_time:
+            params.extend([naive_utc(start_time), min_slot_start(naive_utc(start_time))])
+            query += f" AND end_time > ${len(params) - 1}::timestamp AND start_time > ${len(params)}::timestamp"
+        if end_time:
+            params.append(naive_utc(end_time))
+            query += f" AND start_time < ${len(params)}::timestamp"
+
+        query += " ORDER BY start_time"
+
+        results = [tuple(row) for row in await conn.fetch(query, *params)]
+        occurrences = await self._rule_occurrences(conn, start_time, end_time, [property_id], seller_id)
+        return merge_occurrences(results, occurrences) if occurrences else results
+
+    async def get_availability_batch(self, property_ids: Optional[List[str]] = None,
+                                     seller_id: Optional[str] = None,
+                                     start_time: Optional[datetime] = None,
+                                     end_time: Optional[datetime] = None) -> Optional[dict]:
+        """
+        Get availability for several properties, or all of a seller's, at once
+        Returns slots grouped by property ID, with every requested property present
+        """
+        if not property_ids and not seller_id:
+            return {}
+        try:
+            query = """
+                SELECT id, property_id, seller_id,
+                       start_time, end_time,
+                       created_at, updated_at
+                FROM availability
+                WHERE TRUE
+            """
+            params = []
+
+            if property_ids:
+                params.append(list(property_ids))
+                query += f" AND property_id = ANY(${len(params)}::uuid[])"
+            if seller_id:
+                params.append(seller_id)
+                query += f" AND seller_id = ${len(params)}"
+            if start_time:
+                params.extend([naive_utc(start_time), min_slot_start(naive_utc(start_time))])
+                query += f" AND end_time > ${len(params) - 1}::timestamp AND start_time > ${len(params)}::timestamp"
+            if end_time:
+                params.append(naive_utc(end_time))
+                query += f" AND start_time < ${len(params)}::timestamp"
+
+            query += " ORDER BY property_id, start_time"
+
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(query, *params)
+                occurrences = await self._rule_occurrences(conn, start_time, end_time, property_ids, seller_id)
+            grouped = {property_id: [] for property_id in property_ids or []}
+            for row in rows:
+                grouped.setdefault(row['property_id'], []).append(dict(row))
+
+            by_property = {}
+            for occurrence in occurrences:
+                by_property.setdefault(occurrence[1], []).append(occurrence)
+            for property_id, property_occurrences in by_property.items():
+                rows = [tuple(row[column] for column in AVAILABILITY_COLUMNS)
+                        for row in grouped.get(property_id, [])]
+                grouped[property_id] = [dict(zip(AVAILABILITY_COLUMNS, row))
+                                        for row in merge_occurrences(rows, property_occurrences)]
+            return grouped
+        except Exception as e:
+            logger.error(f"Error getting availability batch: {e}")
+            return None
+
+    async def _rule_occurrences(self, conn, start_time: Optional[datetime], end_time: Optional[datetime],
+                                property_ids: Optional[List[str]] = None,
+                                seller_id: Optional[str] = None) -> List[tuple]:
+        """
+        Occurrences of the matching rules inside a read window, as tuples
+        Same lookup and expansion as AvailabilityManager._rule_occurrences
+        """
+        window_start, window_end = rule_window(start_time, end_time, self.rule_horizon)
+        query = f"""
+            SELECT {', '.join(RULE_COLUMNS)}
+            FROM availability_rules
+            WHERE start_date <= $1 AND (end_date IS NULL OR end_date >= $2)
+        """
+        first_date, last_date = rule_date_range(window_start, window_end)
+        params = [last_date, first_date]
+
+        if property_ids:
+            params.append(list(property_ids))
+            query += f" AND property_id = ANY(${len(params)}::uuid[])"
+        if seller_id:
+            params.append(seller_id)
+            query += f" AND seller_id = ${len(params)}"
+
+        rules = await conn.fetch(query, *params)
+        return expand_rules(rules, window_start, window_end) if rules else []
+
+    async def match_viewings(self, buyer_availability: Sequence[Tuple[datetime, datetime]],
+                             property_ids: List[str],
+                             min_duration: timedelta = timedelta(minutes=30)) -> Optional[List[dict]]:
+        """
+        Slots when a buyer and each property's sellers are both free
+        Same as AvailabilityManager.match_viewings
+        """
+        windows = buyer_windows(buyer_availability)
+        if not windows or not property_ids:
+            return []
+        window_start, window_end = windows[0][0], windows[-1][1]
+        try:
+            async with self.pool.acquire() as conn:
+                rows = [tuple(row) for row in await conn.fetch("""
+                    SELECT property_id, seller_id, start_time, end_time
+                    FROM availability
+                    WHERE property_id = ANY($1::uuid[])
+                      AND end_time > $2::timestamp AND start_time < $3::timestamp
+                      AND start_time > $6::timestamp
+                      AND tsrange(start_time, end_time) && (
+                          SELECT range_agg(tsrange(window_start, window_end))
+                          FROM unnest($4::timestamp[], $5::timestamp[]) AS windows (window_start, window_end)
+                      )
+                    ORDER BY property_id, seller_id, start_time
+                """, list(property_ids), window_start, window_end,
+                    [start for start, _ in windows], [end for _, end in windows],
+                    min_slot_start(window_start))]
+                occurrences = await self._rule_occurrences(conn, window_start, window_end, property_ids)
+            if occurrences:
+                rows = sorted(rows + [occurrence[1:5] for occurrence in occurrences])
+            return match_availability(windows, rows, min_duration)
+        except Exception as e:
+            logger.error(f"Error matching viewings: {e}")
+            return None
+
+    async def iter_availability(self, property_id: Optional[str] = None,
+                                seller_id: Optional[str] = None,
+                                start_time: Optional[datetime] = None,
+                                end_time: Optional[datetime] = None,
+                                chunk_size: int = 2000) -> AsyncIterator[dict]:
+        """
+        Stream availability rows through a server-side cursor, chunk_size at a time
+        The pooled connection is held until the iterator is exhausted or closed
+        """
+        query = """
+            SELECT id, property_id, seller_id,
+                   start_time, end_time,
+                   created_at, updated_at
+            FROM availability
+            WHERE TRUE
+        """
+        params = []
+
+        if property_id:
+            params.append(property_id)
+            query += f" AND property_id = ${len(params)}"
+        if seller_id:
+            params.append(seller_id)
+            query += f" AND seller_id = ${len(params)}"
+        if start_time:
+            params.extend([naive_utc(start_time), min_slot_start(naive_utc(start_time))])
+            query += f" AND end_time > ${len(params) - 1}::timestamp AND start_time > ${len(params)}::timestamp"
+        if end_time:
+            params.append(naive_utc(end_time))
+            query += f" AND start_time < ${len(params)}::timestamp"
+
+        if property_id or seller_id:
+            query += " ORDER BY property_id, start_time"
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(query, *params, prefetch=chunk_size):
+                    yield dict(row)
+
+    async def get_property_version(self, property_id: str, seller_id: Optional[str] = None) -> Optional[str]:
+        """
+        Cheap version string for a property's availability, slots and rules
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                return await self._property_version(conn, property_id, seller_id)
+        except Exception as e:
+            logger.error(f"Error getting availability version: {e}")
+            return None
+
+    async def _property_version(self, conn, property_id: str, seller_id: Optional[str]) -> str:
+        filters = " AND seller_id = $2" if seller_id else ""
+        params = [property_id, seller_id] if seller_id else [property_id]
+        (count, last_updated, id_checksum), (rule_count, rules_updated, rule_checksum) = await conn.fetch(f"""
+            SELECT count(*), max(updated_at), sum(hashtext(id::text)::bigint)
+            FROM availability
+            WHERE property_id = $1 {filters}
+            UNION ALL
+            SELECT count(*), max(updated_at), sum(hashtext(id::text)::bigint)
+            FROM availability_rules
+            WHERE property_id = $1 {filters}
+        """, *params)
+        version = f"{count}:{last_updated.isoformat() if last_updated else ''}:{id_checksum or 0}"
+        if rule_count:
+            version += f":{rule_count}:{rules_updated.isoformat()}:{rule_checksum}:{rule_window(None, None)[0].date()}"
+        return version
+
+    async def search_availability(self, start_time: datetime, end_time: datetime,
+                                  min_duration: Optional[timedelta] = None,
+                                  seller_id: Optional[str] = None,
+                                  property_ids: Optional[List[str]] = None,
+                                  limit: int = 50, offset: int = 0) -> Optional[dict]:
+        """
+        Find properties with availability in a time window
+        Same semantics and result shape as AvailabilityManager.search_availability
+        """
+        required = min_duration if min_duration is not None else end_time - start_time
+        try:
+            params = [naive_utc(start_time), naive_utc(end_time), required, limit + 1, offset,
+                      min_slot_start(naive_utc(start_time))]
+            filters = ""
+            if seller_id:
+                params.append(seller_id)
+                filters += f" AND {{alias}}seller_id = ${len(params)}"
+            if property_ids:
+                params.append(list(property_ids))
+                filters += f" AND {{alias}}property_id = ANY(${len(params)}::uuid[])"
+            occurrences = occurrences_query('$1', '$2', filters.format(alias='r.'))
+
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(f"""
+                    WITH slots AS (
+                        SELECT id, property_id, seller_id, start_time, end_time
+                        FROM availability
+                        WHERE tsrange(start_time, end_time) && tsrange($1::timestamp, $2::timestamp)
+                          AND start_time > $6::timestamp AND start_time < $2::timestamp
+                        {filters.format(alias='')}
+                    ), qualifying AS (
+                        SELECT id, property_id, seller_id,
+                               GREATEST(start_time, $1::timestamp) AS start_time,
+                               LEAST(end_time, $2::timestamp) AS end_time
+                        FROM (
+                            SELECT * FROM slots
+                            UNION ALL
+                            SELECT id, property_id, seller_id, start_time, end_time
+                            FROM ({occurrences}) occurrences
+                        ) windowed
+                    ), page AS (
+                        SELECT DISTINCT property_id
+                        FROM qualifying
+                        WHERE end_time - start_time >= $3
+                        ORDER BY property_id
+                        LIMIT $4 OFFSET $5
+                    )
+                    SELECT q.id, q.property_id, q.seller_id, q.start_time, q.end_time
+                    FROM qualifying q
+                    JOIN page USING (property_id)
+                    WHERE q.end_time - q.start_time >= $3
+                    ORDER BY q.property_id, q.start_time
+                """, *params)
+
+            properties = []
+            by_property = {}
+            for row in rows:
+                entry = by_property.get(row['property_id'])
+                if entry is None:
+                    entry = {"property_id": row['property_id'], "intervals": []}
+                    by_property[row['property_id']] = entry
+                    properties.append(entry)
+                entry["intervals"].append({
+                    "id": row['id'],
+                    "seller_id": row['seller_id'],
+                    "start_time": row['start_time'],
+                    "end_time": row['end_time']
+                })
+
+            return {
+                "properties": properties[:limit],
+                "limit": limit,
+                "offset": offset,
+                "has_more": len(properties) > limit
+            }
+        except Exception as e:
+            logger.error(f"Error searching availability: {e}")
+            return None
+
+    async def delete_property_availability(self, property_id: str, seller_id: Optional[str] = None) -> dict:
+        """
+        Delete availability slots for a property
+        """
+        try:
+            query = "DELETE FROM availability WHERE property_id = $1"
+            params = [property_id]
+
+            if seller_id:
+                params.append(seller_id)
+                query += " AND seller_id = $2"
+
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    deleted_count = _row_count(await conn.execute(query, *params))
+                    if self.bitmaps:
+                        await self._refresh_bitmaps(conn, property_id, seller_id)
+            self._after_write(property_id)
+            return {
+                "message": f"Deleted {deleted_count} availability slots",
+                "deleted_count": deleted_count
+            }
+        except Exception as e:
+            logger.error(f"Error deleting availability: {e}")
+            return {"error": str(e), "deleted_count": 0}
+
+    async def replace_availability(self, property_id: str, seller_id: str,
+                                   slots: Sequence[Tuple[datetime, datetime]]) -> dict:
+        """
+        Replace a seller's availability for a property with the given slots
+        Only the difference is written, atomically
+        """
+        try:
+            slots = naive_utc_intervals(slots)
+            if self.merge_tolerance is not None:
+                slots = split_intervals(normalize_intervals(slots, self.merge_tolerance), MAX_SLOT_LENGTH)
+            start_times = [start_time for start_time, _ in slots]
+            end_times = [end_time for _, end_time in slots]
+
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await self._ensure_entities(conn, property_id, seller_id)
+                    await conn.execute("SELECT pg_advisory_xact_lock(hashtext($1))",
+                                       f"{property_id}:{seller_id}")
+
+                    deleted_count = _row_count(await conn.execute("""
+                        DELETE FROM availability a
+                        WHERE a.property_id = $1 AND a.seller_id = $2
+                          AND NOT EXISTS (
+                              SELECT 1
+                              FROM unnest($3::timestamp[], $4::timestamp[]) AS input (start_time, end_time)
+                              WHERE input.start_time = a.start_time
+                                AND input.end_time = a.end_time
+                          )
+                    """, property_id, seller_id, start_times, end_times))
+
+                    inserted_count = _row_count(await conn.execute("""
+                        INSERT INTO availability (property_id, seller_id, start_time, end_time)
+                        SELECT DISTINCT $1::uuid, $2::uuid, input.start_time, input.end_time
+                        FROM unnest($3::timestamp[], $4::timestamp[]) AS input (start_time, end_time)
+                        ON CONFLICT (property_id, seller_id, start_time, end_time) DO NOTHING
+                    """, property_id, seller_id, start_times, end_times))
+
+                    if self.bitmaps:
+                        await self._refresh_bitmaps(conn, property_id, seller_id)
+            self._after_write(property_id, seller_id)
+
+            unchanged_count = len(set(slots)) - inserted_count
+            return {
+                "message": f"Added {inserted_count} and removed {deleted_count} availability slots",
+                "inserted_count": inserted_count,
+                "deleted_count": deleted_count,
+                "unchanged_count": unchanged_count
+            }
+        except Exception as e:
+            self._write_failed(e, property_id, seller_id)
+            logger.error(f"Error replacing availability: {e}")
+            return {"error": str(e), "inserted_count": 0, "deleted_count": 0, "unchanged_count": 0}
+
+    async def create_availability_rule(self, property_id: str, seller_id: str, weekdays: List[int],
+                                       start_time: time, end_time: time, start_date: date,
+                                       end_date: Optional[date] = None,
+                                       exceptions: Sequence[date] = (),
+                                       timezone: str = DEFAULT_RULE_TIMEZONE) -> Optional[dict]:
+        """
+        Create a weekly recurring availability rule for a property
+        """
+        try:
+            rule_timezone(timezone)
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await self._ensure_entities(conn, property_id, seller_id)
+                    rule = await conn.fetchrow(f"""
+                        INSERT INTO availability_rules
+                        (property_id, seller_id, weekdays, start_time, end_time, timezone,
+                         start_date, end_date, exceptions)
+                        VALUES ($1, $2, $3::smallint[], $4, $5, $6, $7, $8, $9::date[])
+                        RETURNING {', '.join(RULE_COLUMNS)}
+                    """, property_id, seller_id, list(weekdays), start_time, end_time, timezone,
+                        start_date, end_date, list(exceptions))
+            self._after_write(property_id, seller_id)
+            return rule_record(rule)
+        except Exception as e:
+            self._write_failed(e, property_id, seller_id)
+            logger.error(f"Error creating availability rule: {e}")
+            return None
+
+    async def get_availability_rules(self, property_id: Optional[str] = None,
+                                     seller_id: Optional[str] = None) -> Optional[List[dict]]:
+        """
+        List the recurring rules of a property and/or a seller
+        """
+        try:
+            query = f"SELECT {', '.join(RULE_COLUMNS)} FROM availability_rules WHERE TRUE"
+            params = []
+
+            if property_id:
+                params.append(property_id)
+                query += f" AND property_id = ${len(params)}"
+            if seller_id:
+                params.append(seller_id)
+                query += f" AND seller_id = ${len(params)}"
+
+            query += " ORDER BY property_id, start_date, start_time"
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(query, *params)
+            return [rule_record(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting availability rules: {e}")
+            return None
+
+    async def update_availability_rule(self, rule_id: str, weekdays: List[int],
+                                       start_time: time, end_time: time, start_date: date,
+                                       end_date: Optional[date] = None,
+                                       exceptions: Sequence[date] = (),
+                                       timezone: str = DEFAULT_RULE_TIMEZONE) -> Optional[dict]:
+        """
+        Replace the pattern, dates and exceptions of a rule
+        Returns None if the rule doesn't exist or the update failed
+        """
+        try:
+            rule_timezone(timezone)
+            async with self.pool.acquire() as conn:
+                rule = await conn.fetchrow(f"""
+                    UPDATE availability_rules
+                    SET weekdays = $1::smallint[], start_time = $2, end_time = $3, timezone = $4,
+                        start_date = $5, end_date = $6, exceptions = $7::date[],
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = $8
+                    RETURNING {', '.join(RULE_COLUMNS)}
+                """, list(weekdays), start_time, end_time, timezone, start_date, end_date,
+                    list(exceptions), rule_id)
+            if rule is None:
+                return None
+            self._after_write(rule['property_id'])
+            return rule_record(rule)
+        except Exception as e:
+            logger.error(f"Error updating availability rule: {e}")
+            return None
+
+    async def delete_availability_rule(self, rule_id: str) -> dict:
+        """
+        Delete a recurring rule, and with it every occurrence it produced
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                property_id = await conn.fetchval(
+                    "DELETE FROM availability_rules WHERE id = $1 RETURNING property_id", rule_id
+                )
+            if property_id is not None:
+                self._after_write(property_id)
+            return {
+                "message": f"Deleted {1 if property_id else 0} availability rules",
+                "deleted_count": 1 if property_id else 0
+            }
+        except Exception as e:
+            logger.error(f"Error deleting availability rule: {e}")
+            return {"error": str(e), "deleted_count": 0}
+
+    async def get_bitmap_grid(self, property_ids: List[str], start_date: date, days: int,
+                              seller_id: Optional[str] = None) -> Optional[BitmapGrid]:
+        """
+        Slot bitmaps of properties over days starting at start_date, rules included
+        Same as AvailabilityManager.get_bitmap_grid
+        """
+        try:
+            window_start = datetime.combine(start_date, time())
+            window_end = window_start + timedelta(days=days)
+            query = """
+                SELECT property_id, day, bit_or(slots)
+                FROM availability_bitmaps
+                WHERE property_id = ANY($1::uuid[]) AND day >= $2 AND day < $3
+            """
+            params = [list(property_ids), start_date, window_end.date()]
+            if seller_id:
+                params.append(seller_id)
+                query += " AND seller_id = $4"
+            query += " GROUP BY property_id, day"
+
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(query, *params)
+                occurrences = await self._rule_occurrences(conn, window_start, window_end, property_ids, seller_id)
+
+            grid = BitmapGrid.from_rows(property_ids, start_date, days, (tuple(row) for row in rows))
+            by_property = {}
+            for occurrence in occurrences:
+                by_property.setdefault(occurrence[1], []).append((occurrence[3], occurrence[4]))
+            for property_id, intervals in by_property.items():
+                grid.add_intervals(property_id, intervals)
+            return grid
+        except Exception as e:
+            logger.error(f"Error loading availability bitmaps: {e}")
+            return None
+
+    async def create_test_data(self) -> dict:
+        """
+        Create test property and seller
+        """
+        try:
+            seller_id = str(uuid.uuid4())
+            property_id = str(uuid.uuid4())
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    seller = await conn.fetchrow("""
+                        INSERT INTO sellers (id, name)
+                        VALUES ($1, $2)
+                        RETURNING id, name
+                    """, seller_id, f"Test Seller {seller_id[:8]}")
+                    property = await conn.fetchrow("""
+                        INSERT INTO properties (id, name, seller_id)
+                        VALUES ($1, $2, $3)
+                        RETURNING id, name
+                    """, property_id, f"Test Property {property_id[:8]}", seller_id)
+            return {
+                "message": "Test data created successfully",
+                "property": dict(property) if property else None,
+                "seller": dict(seller) if seller else None
+            }
+        except Exception as e:
+            logger.error(f"Error creating test data: {e}")
+            return {"error": str(e)}
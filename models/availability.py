@@ -1,18 +1,152 @@
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime, time, timedelta
+from itertools import chain, islice
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import errors
+from psycopg2.extras import RealDictCursor, execute_values
 import logging
 import uuid
+from contextlib import contextmanager
+
+from models.backend import AVAILABILITY_COLUMNS, AvailabilityBackend
+from models.bitmap import BitmapGrid, seller_bitmaps
+from models.bulk import CopySource
+from models.cache import IntervalCache, KnownEntityCache
+from models.intervals import (merge_results, naive_utc, naive_utc_intervals, normalize_intervals, plan_merge,
+                              split_intervals)
+from models.matching import buyer_windows, match_availability
+from models.partitions import MAX_SLOT_LENGTH, min_slot_start
+from models.pool import ConnectionPool, get_pool
+from models.recurrence import (DEFAULT_RULE_HORIZON, DEFAULT_RULE_TIMEZONE, RULE_COLUMNS, expand_rules,
+                               merge_occurrences, occurrences_query, rule_date_range, rule_record,
+                               rule_timezone, rule_window)
+from models.replicas import ReplicaRouter
+from models.resilience import DatabaseGuard, DatabaseUnavailable
 
 logger = logging.getLogger(__name__)
 
-class AvailabilityManager:
-    def __init__(self, db_connection_string):
+class AvailabilityManager(AvailabilityBackend):
+    def __init__(self, db_connection_string, pool: Optional[ConnectionPool] = None,
+                 merge_tolerance: Optional[timedelta] = None,
+                 cache: Optional[IntervalCache] = None,
+                 known_entities: Optional[KnownEntityCache] = None,
+                 rule_horizon: timedelta = DEFAULT_RULE_HORIZON,
+                 bitmaps: bool = False,
+                 replicas: Optional[ReplicaRouter] = None,
+                 read_from_primary: bool = False,
+                 guard: Optional[DatabaseGuard] = None):
         self.conn_string = db_connection_string
+        # Borrow from the process-wide pool rather than reconnecting per call
+        self.pool = pool or get_pool(db_connection_string)
+        # When set, writes coalesce slots with the stored intervals, treating
+        # gaps up to this long as contiguous; None stores slots as sent
+        self.merge_tolerance = merge_tolerance
+        self.cache = cache
+        # Seller and property IDs this worker has seen committed, so repeat
+        # writes skip the entity upsert
+        self.known_entities = known_entities
+        # How far ahead recurring rules are expanded for reads without an end
+        self.rule_horizon = rule_horizon
+        # Keep availability_bitmaps, the per-day 30-minute slot masks, in
+        # step with every slot write
+        self.bitmaps = bitmaps
+        # Reads go to the router's replicas unless they touch a property or
+        # seller this worker just wrote, or read_from_primary is set, e.g.
+        # for a client that has just written through another worker; such
+        # reads skip the cache as well
+        self.replicas = replicas
+        self.read_from_primary = read_from_primary
+        # Concurrency limit, circuit breaker and per-operation statement
+        # timeouts; operations it refuses raise DatabaseUnavailable
+        self.guard = guard
+
+    def _get_connection(self, operation: Optional[str] = None):
+        if self.guard is not None:
+            return self.guard.connection(self.pool.connection, operation)
+        return self.pool.connection()
+
+    def _read_connection(self, property_ids: Optional[Iterable[str]] = None, seller_id: Optional[str] = None,
+                         operation: Optional[str] = None):
+        """
+        Connection for a read-only query about the given properties or seller
+        A replica's when replicas are configured and none of them was written
+        through this worker within the router's pin window, else the primary's
+        """
+        if self.replicas is None or self.read_from_primary:
+            return self._get_connection(operation)
+        keys = self._read_keys(property_ids, seller_id)
+        if self.guard is not None:
+            return self.guard.connection(lambda: self.replicas.connection(keys), operation)
+        return self.replicas.connection(keys)
+
+    @staticmethod
+    def _read_keys(property_ids: Optional[Iterable[str]], seller_id: Optional[str]) -> List[str]:
+        # The keys _after_write pins
+        keys = [f"property:{property_id}" for property_id in property_ids or ()]
+        if seller_id:
+            keys.append(f"seller:{seller_id}")
+        return keys
 
-    def _get_connection(self):
-        return psycopg2.connect(self.conn_string)
+    def _use_cache(self, property_id: str, seller_id: Optional[str],
+                   start_time: Optional[datetime], end_time: Optional[datetime]) -> bool:
+        """
+        Whether a read may go through the per-worker cache
+        Only whole-calendar reads are cached, and reads that must see the
+        client's own writes skip it: those may have gone through another
+        worker, whose writes don't invalidate this worker's entries
+        """
+        if self.cache is None or start_time or end_time or self.read_from_primary:
+            return False
+        return self.replicas is None or not self.replicas.is_pinned(*self._read_keys([property_id], seller_id))
+
+    @contextmanager
+    def _write_connection(self, property_id: str, seller_id: Optional[str] = None,
+                          operation: Optional[str] = None):
+        """
+        Connection for a write to one property's availability
+        Write hooks run only once the transaction has committed. Pass seller_id
+        when the write ensured the seller and property rows exist
+        """
+        try:
+            with self._get_connection(operation) as conn:
+                yield conn
+                if self.bitmaps:
+                    self._refresh_bitmaps(conn, property_id, seller_id)
+        except errors.ForeignKeyViolation:
+            # A remembered seller or property was deleted behind our back
+            if seller_id is not None and self.known_entities is not None:
+                self.known_entities.discard(('seller', seller_id), ('property', property_id))
+            raise
+        self._after_write(property_id, seller_id)
+
+    def _after_write(self, property_id: str, seller_id: Optional[str] = None):
+        if self.replicas is not None:
+            self.replicas.pin(f"property:{property_id}", f"seller:{seller_id}" if seller_id else None)
+        if self.cache is not None:
+            self.cache.invalidate(property_id)
+        if seller_id is not None and self.known_entities is not None:
+            self.known_entities.add(('seller', seller_id), ('property', property_id))
+
+    def _refresh_bitmaps(self, conn, property_id: str, seller_id: Optional[str] = None):
+        """
+        Recompute a property's stored slot bitmaps from its availability rows
+        Runs in the write's transaction, so the bitmaps commit with the slots
+        """
+        filters = " AND seller_id = %s" if seller_id else ""
+        params = [property_id, seller_id] if seller_id else [property_id]
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT seller_id, start_time, end_time
+                FROM availability
+                WHERE property_id = %s {filters}
+            """, params)
+            records = seller_bitmaps(cur.fetchall())
+            cur.execute(f"DELETE FROM availability_bitmaps WHERE property_id = %s {filters}", params)
+            if records:
+                execute_values(cur, """
+                    INSERT INTO availability_bitmaps (property_id, seller_id, day, slots)
+                    VALUES %s
+                """, [(property_id, record_seller, day, mask) for record_seller, day, mask in records])
 
     def save_availability(self, property_id: str, seller_id: str, 
                         start_time: datetime, end_time: datetime) -> dict:
@@ -20,87 +154,751 @@ class AvailabilityManager:
         Save a new availability slot for a property
         Returns the created availability record
         """
+        if self.merge_tolerance is not None:
+            results = self.save_availability_batch(property_id, seller_id, [(start_time, end_time)])
+            return results[0] if results else None
+
         try:
-            with self._get_connection() as conn:
+            with self._write_connection(property_id, seller_id, operation='save_availability') as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    # Check if property exists
-                    cur.execute("SELECT id FROM properties WHERE id = %s", (property_id,))
-                    property_exists = cur.fetchone()
-                    
-                    # Check if seller exists
-                    cur.execute("SELECT id FROM sellers WHERE id = %s", (seller_id,))
-                    seller_exists = cur.fetchone()
-                    
-                    # Create seller if it doesn't exist
-                    if not seller_exists:
-                        logger.info(f"Creating seller with ID {seller_id}")
-                        cur.execute("""
-                            INSERT INTO sellers (id, name)
-                            VALUES (%s, %s)
-                            RETURNING id
-                        """, (seller_id, f"Seller {seller_id[:8]}"))
-                        conn.commit()
-                    
-                    # Create property if it doesn't exist
-                    if not property_exists:
-                        logger.info(f"Creating property with ID {property_id}")
-                        cur.execute("""
-                            INSERT INTO properties (id, name, seller_id)
-                            VALUES (%s, %s, %s)
-                            RETURNING id
-                        """, (property_id, f"Property {property_id[:8]}", seller_id))
-                        conn.commit()
-                    
+                    # Create seller and property if needed, in this transaction
+                    self._ensure_entities(cur, property_id, seller_id)
+
                     # Insert availability with UUID generation
                     cur.execute("""
                         INSERT INTO availability 
                         (property_id, seller_id, start_time, end_time)
                         VALUES (%s, %s, %s, %s)
                         RETURNING id, property_id, seller_id, start_time, end_time, created_at, updated_at
-                    """, (property_id, seller_id, start_time, end_time))
+                    """, (property_id, seller_id, naive_utc(start_time), naive_utc(end_time)))
                     
                     result = cur.fetchone()
-                    conn.commit()
                     return dict(result) if result else None
+        except DatabaseUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error saving availability: {e}")
             return None
 
-    def get_property_availability(self, property_id: str, seller_id: Optional[str] = None) -> List[dict]:
+    def _ensure_entities(self, cur, property_id: str, seller_id: str):
+        """
+        Create the seller and property rows if they don't exist yet
+        One upsert in the caller's transaction, so concurrent writers creating
+        the same entity both succeed; skipped for IDs already known to exist
         """
-        Get all availability slots for a property
+        if self.known_entities is not None and \
+                self.known_entities.contains(('seller', seller_id), ('property', property_id)):
+            return
+
+        with cur.connection.cursor() as entity_cur:
+            entity_cur.execute("""
+                WITH new_seller AS (
+                    INSERT INTO sellers (id, name)
+                    VALUES (%s, %s)
+                    ON CONFLICT (id) DO NOTHING
+                    RETURNING id
+                ), new_property AS (
+                    INSERT INTO properties (id, name, seller_id)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (id) DO NOTHING
+                    RETURNING id
+                )
+                SELECT (SELECT count(*) FROM new_seller), (SELECT count(*) FROM new_property)
+            """, (seller_id, f"Seller {seller_id[:8]}",
+                  property_id, f"Property {property_id[:8]}", seller_id))
+            created_seller, created_property = entity_cur.fetchone()
+
+        if created_seller:
+            logger.info(f"Created seller with ID {seller_id}")
+        if created_property:
+            logger.info(f"Created property with ID {property_id}")
+
+    def _merge_slots(self, cur, property_id: str, seller_id: str,
+                     slots: Sequence[Tuple[datetime, datetime]]) -> List[Optional[dict]]:
         """
+        Coalesce slots with the seller's stored intervals for a property
+        Returns one entry per slot: the record of the interval now covering it,
+        or None if it was already covered before this write
+        """
+        tolerance = self.merge_tolerance
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{property_id}:{seller_id}",))
+        incoming = naive_utc_intervals(slots)
+
+        # Stored intervals are already disjoint, so only rows within tolerance
+        # of the incoming span can take part in the merge
+        span_start = min(start_time for start_time, _ in incoming) - tolerance
+        span_end = max(end_time for _, end_time in incoming) + tolerance
+        cur.execute("""
+            SELECT id, property_id, seller_id, start_time, end_time, created_at, updated_at
+            FROM availability
+            WHERE property_id = %s AND seller_id = %s
+              AND start_time <= %s AND end_time >= %s AND start_time >= %s
+        """, (property_id, seller_id, span_end, span_start, min_slot_start(span_start)))
+        existing = [dict(row) for row in cur.fetchall()]
+
+        # Runs longer than a slot may last are stored in pieces
+        plan = plan_merge([(row['id'], row['start_time'], row['end_time']) for row in existing],
+                          incoming, tolerance, MAX_SLOT_LENGTH)
+        if plan.delete_ids:
+            cur.execute("""
+                DELETE FROM availability
+                WHERE id = ANY(%s::uuid[]) AND start_time >= %s AND start_time <= %s
+            """, (plan.delete_ids, min_slot_start(span_start), span_end))
+
+        keep_ids = set(plan.keep_ids)
+        records = {(row['start_time'], row['end_time']): row for row in existing if row['id'] in keep_ids}
+        if plan.inserts:
+            cur.execute("""
+                INSERT INTO availability (property_id, seller_id, start_time, end_time)
+                SELECT %s, %s, input.start_time, input.end_time
+                FROM unnest(%s::timestamp[], %s::timestamp[]) AS input (start_time, end_time)
+                RETURNING id, property_id, seller_id, start_time, end_time, created_at, updated_at
+            """, (property_id, seller_id,
+                  [start_time for start_time, _ in plan.inserts],
+                  [end_time for _, end_time in plan.inserts]))
+            for row in cur.fetchall():
+                records[(row['start_time'], row['end_time'])] = dict(row)
+
+        previous = normalize_intervals((row['start_time'], row['end_time']) for row in existing)
+        return [records[interval] if interval is not None else None
+                for interval in merge_results(previous, plan.merged, incoming)]
+
+    def _insert_slots(self, cur, rows: Sequence[Tuple[str, str, datetime, datetime]]) -> List[Optional[dict]]:
+        """
+        Insert (property_id, seller_id, start_time, end_time) rows in one statement
+        Returns one entry per row in input order: the created record, or None
+        if the slot already exists
+        """
+        # ON CONFLICT skips slots that hit the unique constraint and the join
+        # maps results back to inputs. Rows go in key order, so concurrent
+        # multi-calendar inserts take their index locks in the same order
+        inserted = execute_values(cur, """
+            WITH input (ord, property_id, seller_id, start_time, end_time) AS (
+                VALUES %s
+            ), inserted AS (
+                INSERT INTO availability
+                (property_id, seller_id, start_time, end_time)
+                SELECT property_id, seller_id, start_time, end_time
+                FROM input ORDER BY property_id, seller_id, start_time, end_time
+                ON CONFLICT (property_id, seller_id, start_time, end_time) DO NOTHING
+                RETURNING id, property_id, seller_id, start_time, end_time, created_at, updated_at
+            )
+            SELECT input.ord, inserted.id, inserted.property_id, inserted.seller_id,
+                   inserted.start_time, inserted.end_time,
+                   inserted.created_at, inserted.updated_at
+            FROM input
+            LEFT JOIN inserted
+              ON inserted.property_id = input.property_id
+             AND inserted.seller_id = input.seller_id
+             AND inserted.start_time = input.start_time
+             AND inserted.end_time = input.end_time
+            ORDER BY input.ord
+        """, [(ord, property_id, seller_id, naive_utc(start_time), naive_utc(end_time))
+              for ord, (property_id, seller_id, start_time, end_time) in enumerate(rows)],
+            template="(%s, %s::uuid, %s::uuid, %s::timestamp, %s::timestamp)",
+            page_size=len(rows), fetch=True)
+
+        results = []
+        claimed = set()
+        for row in inserted:
+            record = dict(row)
+            record.pop('ord')
+            # A slot repeated within the batch joins to the same new row;
+            # only its first occurrence counts as created
+            if record['id'] is None or record['id'] in claimed:
+                results.append(None)
+            else:
+                claimed.add(record['id'])
+                results.append(record)
+        return results
+
+    def save_availability_batch(self, property_id: str, seller_id: str,
+                                slots: Sequence[Tuple[datetime, datetime]]) -> Optional[List[Optional[dict]]]:
+        """
+        Save many availability slots for a property in a single transaction
+        Returns one entry per slot in input order: the created record, or None
+        if the slot already exists. Returns None if the batch failed.
+        """
+        if not slots:
+            return []
+        try:
+            with self._write_connection(property_id, seller_id, operation='save_availability_batch') as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    self._ensure_entities(cur, property_id, seller_id)
+
+                    if self.merge_tolerance is not None:
+                        return self._merge_slots(cur, property_id, seller_id, slots)
+                    return self._insert_slots(cur, [(property_id, seller_id, start_time, end_time)
+                                                    for start_time, end_time in slots])
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error saving availability batch: {e}")
+            return None
+
+    def save_availability_groups(self, writes: Sequence[Tuple[str, str, Sequence[Tuple[datetime, datetime]]]]
+                                 ) -> List[Optional[List[Optional[dict]]]]:
+        """
+        Save several (property_id, seller_id, slots) writes in one transaction
+        Returns one save_availability_batch result per write, in order, so the
+        writes behave as if committed one after another. If the shared
+        transaction fails, each write is retried on its own and only the bad
+        ones fail
+        """
+        if not writes:
+            return []
+        # Calendars are locked in sorted order, so concurrent group commits
+        # can't deadlock; writes to one calendar keep their relative order
+        order = sorted(range(len(writes)), key=lambda index: writes[index][:2])
+        calendars = sorted({(property_id, seller_id) for property_id, seller_id, _ in writes})
         try:
-            with self._get_connection() as conn:
+            with self._get_connection('save_availability_groups') as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    for property_id, seller_id in calendars:
+                        self._ensure_entities(cur, property_id, seller_id)
+
+                    results = [[] for _ in writes]
+                    if self.merge_tolerance is not None:
+                        for index in order:
+                            property_id, seller_id, slots = writes[index]
+                            if slots:
+                                results[index] = self._merge_slots(cur, property_id, seller_id, slots)
+                    else:
+                        rows = [(writes[index][0], writes[index][1], start_time, end_time)
+                                for index in order for start_time, end_time in writes[index][2]]
+                        inserted = iter(self._insert_slots(cur, rows)) if rows else iter(())
+                        for index in order:
+                            results[index] = [next(inserted) for _ in writes[index][2]]
+
+                    if self.bitmaps:
+                        for property_id, seller_id in calendars:
+                            self._refresh_bitmaps(conn, property_id, seller_id)
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            if isinstance(e, errors.ForeignKeyViolation) and self.known_entities is not None:
+                for property_id, seller_id in calendars:
+                    self.known_entities.discard(('seller', seller_id), ('property', property_id))
+            logger.warning(f"Group commit of {len(writes)} writes failed, saving them one by one: {e}")
+            return [self.save_availability_batch(property_id, seller_id, slots)
+                    for property_id, seller_id, slots in writes]
+
+        for property_id, seller_id in calendars:
+            self._after_write(property_id, seller_id)
+        return results
+
+    def get_property_availability_rows(self, property_id: str, seller_id: Optional[str] = None,
+                                       start_time: Optional[datetime] = None,
+                                       end_time: Optional[datetime] = None) -> List[tuple]:
+        """
+        Same as get_property_availability, but rows are plain tuples in
+        AVAILABILITY_COLUMNS order, skipping the per-row dict entirely
+        """
+        use_cache = self._use_cache(property_id, seller_id, start_time, end_time)
+        if use_cache:
+            cached = self.cache.get(property_id, seller_id)
+            if cached is not None:
+                return list(cached)
+            generation = self.cache.generation(property_id)
+
+        try:
+            with self._read_connection([property_id], seller_id, operation='get_property_availability_rows') as conn:
+                results = self._property_rows(conn, property_id, seller_id, start_time, end_time)
+
+            if use_cache:
+                self.cache.put(property_id, seller_id, results, generation)
+                return list(results)
+            return results
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting availability: {e}")
+            return []
+
+    def get_property_snapshot(self, property_id: str, seller_id: Optional[str] = None,
+                              start_time: Optional[datetime] = None,
+                              end_time: Optional[datetime] = None) -> Optional[Tuple[str, List[tuple]]]:
+        """
+        A property's version and its get_property_availability_rows, read in
+        one REPEATABLE READ transaction so the version describes exactly the
+        rows returned. Cached rows are reused only while the version they were
+        read at is still current. Returns None if the read failed
+        """
+        use_cache = self._use_cache(property_id, seller_id, start_time, end_time)
+        if use_cache:
+            generation = self.cache.generation(property_id)
+
+        try:
+            with self._read_connection([property_id], seller_id, operation='get_property_snapshot') as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                version = self._property_version(conn, property_id, seller_id)
+                cached = self.cache.get(property_id, seller_id, version) if use_cache else None
+                if cached is not None:
+                    return version, list(cached)
+                rows = self._property_rows(conn, property_id, seller_id, start_time, end_time)
+
+            if use_cache:
+                self.cache.put(property_id, seller_id, rows, generation, version)
+                return version, list(rows)
+            return version, rows
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting availability snapshot: {e}")
+            return None
+
+    def _property_rows(self, conn, property_id: str, seller_id: Optional[str],
+                       start_time: Optional[datetime], end_time: Optional[datetime]) -> List[tuple]:
+        """
+        A property's slots and rule occurrences in a window, as sorted tuples
+        """
+        with conn.cursor() as cur:
+            query = """
+                SELECT id, property_id, seller_id, 
+                       start_time, end_time, 
+                       created_at, updated_at
+                FROM availability 
+                WHERE property_id = %s
+            """
+            params = [property_id]
+            
+            if seller_id:
+                query += " AND seller_id = %s"
+                params.append(seller_id)
+
+            # Overlap test served by idx_availability_property_window;
+            # a missing bound leaves that side of the window open. The
+            # bounds on start_time let Postgres skip whole partitions
+            if start_time:
+                query += " AND end_time > %s::timestamp AND start_time > %s::timestamp"
+                params.extend([naive_utc(start_time), min_slot_start(naive_utc(start_time))])
+            if end_time:
+                query += " AND start_time < %s::timestamp"
+                params.append(naive_utc(end_time))
+
+            query += " ORDER BY start_time"
+            
+            cur.execute(query, params)
+            results = cur.fetchall()
+
+        occurrences = self._rule_occurrences(conn, start_time, end_time, [property_id], seller_id)
+        if occurrences:
+            results = merge_occurrences(results, occurrences)
+        return results
+
+    def get_availability_batch(self, property_ids: Optional[List[str]] = None,
+                               seller_id: Optional[str] = None,
+                               start_time: Optional[datetime] = None,
+                               end_time: Optional[datetime] = None) -> Optional[dict]:
+        """
+        Get availability for several properties, or all of a seller's, at once
+        Returns slots grouped by property ID from a single query. Every
+        requested property appears, with an empty list if it has no slots
+        """
+        if not property_ids and not seller_id:
+            return {}
+        try:
+            with self._read_connection(property_ids, seller_id, operation='get_availability_batch') as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     query = """
-                        SELECT id, property_id, seller_id, 
-                               start_time, end_time, 
+                        SELECT id, property_id, seller_id,
+                               start_time, end_time,
                                created_at, updated_at
-                        FROM availability 
-                        WHERE property_id = %s
+                        FROM availability
+                        WHERE TRUE
                     """
-                    params = [property_id]
-                    
+                    params = []
+
+                    if property_ids:
+                        query += " AND property_id = ANY(%s::uuid[])"
+                        params.append(list(property_ids))
                     if seller_id:
                         query += " AND seller_id = %s"
                         params.append(seller_id)
-                        
-                    query += " ORDER BY start_time"
-                    
+                    if start_time:
+                        query += " AND end_time > %s::timestamp AND start_time > %s::timestamp"
+                        params.extend([naive_utc(start_time), min_slot_start(naive_utc(start_time))])
+                    if end_time:
+                        query += " AND start_time < %s::timestamp"
+                        params.append(naive_utc(end_time))
+
+                    query += " ORDER BY property_id, start_time"
+
                     cur.execute(query, params)
-                    results = cur.fetchall()
-                    return [dict(row) for row in results]
+                    grouped = {property_id: [] for property_id in property_ids or []}
+                    for row in cur.fetchall():
+                        grouped.setdefault(row['property_id'], []).append(dict(row))
+
+                    occurrences = self._rule_occurrences(conn, start_time, end_time, property_ids, seller_id)
+                    by_property = {}
+                    for occurrence in occurrences:
+                        by_property.setdefault(occurrence[1], []).append(occurrence)
+                    for property_id, property_occurrences in by_property.items():
+                        rows = [tuple(row[column] for column in AVAILABILITY_COLUMNS)
+                                for row in grouped.get(property_id, [])]
+                        grouped[property_id] = [dict(zip(AVAILABILITY_COLUMNS, row))
+                                                for row in merge_occurrences(rows, property_occurrences)]
+                    return grouped
+        except DatabaseUnavailable:
+            raise
         except Exception as e:
-            logger.error(f"Error getting availability: {e}")
+            logger.error(f"Error getting availability batch: {e}")
+            return None
+
+    def _rule_occurrences(self, conn, start_time: Optional[datetime], end_time: Optional[datetime],
+                          property_ids: Optional[List[str]] = None,
+                          seller_id: Optional[str] = None) -> List[tuple]:
+        """
+        Occurrences of the matching rules inside a read window, as tuples
+        Rules are fetched with a plain index lookup and expanded here rather
+        than in SQL, which would cost a far bigger plan on every read
+        """
+        window_start, window_end = rule_window(start_time, end_time, self.rule_horizon)
+        query = f"""
+            SELECT {', '.join(RULE_COLUMNS)}
+            FROM availability_rules
+            WHERE start_date <= %s AND (end_date IS NULL OR end_date >= %s)
+        """
+        first_date, last_date = rule_date_range(window_start, window_end)
+        params = [last_date, first_date]
+
+        if property_ids:
+            query += " AND property_id = ANY(%s::uuid[])"
+            params.append(list(property_ids))
+        if seller_id:
+            query += " AND seller_id = %s"
+            params.append(seller_id)
+
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            rules = [dict(zip(RULE_COLUMNS, row)) for row in cur.fetchall()]
+        return expand_rules(rules, window_start, window_end) if rules else []
+
+    def match_viewings(self, buyer_availability: Sequence[Tuple[datetime, datetime]],
+                       property_ids: List[str],
+                       min_duration: timedelta = timedelta(minutes=30)) -> Optional[List[dict]]:
+        """
+        Slots when a buyer and each property's sellers are both free
+        Only slots overlapping a buyer window are read, as sorted tuples of the
+        four columns needed, and intersected per property with a sorted merge.
+        Returns the matching properties ranked by earliest common start
+        """
+        windows = buyer_windows(buyer_availability)
+        if not windows or not property_ids:
             return []
+        window_start, window_end = windows[0][0], windows[-1][1]
+        try:
+            with self._read_connection(property_ids, operation='match_viewings') as conn:
+                with conn.cursor() as cur:
+                    # The span test uses idx_availability_property_window and
+                    # prunes partitions; the multirange (PostgreSQL 14+) drops
+                    # slots between windows
+                    cur.execute("""
+                        SELECT property_id, seller_id, start_time, end_time
+                        FROM availability
+                        WHERE property_id = ANY(%s::uuid[])
+                          AND end_time > %s::timestamp AND start_time < %s::timestamp
+                          AND start_time > %s::timestamp
+                          AND tsrange(start_time, end_time) && (
+                              SELECT range_agg(tsrange(window_start, window_end))
+                              FROM unnest(%s::timestamp[], %s::timestamp[]) AS windows (window_start, window_end)
+                          )
+                        ORDER BY property_id, seller_id, start_time
+                    """, (list(property_ids), window_start, window_end, min_slot_start(window_start),
+                          [start for start, _ in windows], [end for _, end in windows]))
+                    rows = cur.fetchall()
+                occurrences = self._rule_occurrences(conn, window_start, window_end, property_ids)
+            if occurrences:
+                rows = sorted(rows + [occurrence[1:5] for occurrence in occurrences])
+            return match_availability(windows, rows, min_duration)
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error matching viewings: {e}")
+            return None
+
+    def _export_query(self, property_id: Optional[str] = None, seller_id: Optional[str] = None,
+                      start_time: Optional[datetime] = None,
+                      end_time: Optional[datetime] = None) -> Tuple[str, list]:
+        """
+        Query and parameters selecting the availability rows an export covers
+        """
+        query = """
+            SELECT id, property_id, seller_id,
+                   start_time, end_time,
+                   created_at, updated_at
+            FROM availability
+            WHERE TRUE
+        """
+        params = []
+
+        if property_id:
+            query += " AND property_id = %s"
+            params.append(property_id)
+        if seller_id:
+            query += " AND seller_id = %s"
+            params.append(seller_id)
+        if start_time:
+            query += " AND end_time > %s::timestamp AND start_time > %s::timestamp"
+            params.extend([naive_utc(start_time), min_slot_start(naive_utc(start_time))])
+        if end_time:
+            query += " AND start_time < %s::timestamp"
+            params.append(naive_utc(end_time))
+
+        # A full-table dump is streamed in physical order rather than
+        # making Postgres sort every row first
+        if property_id or seller_id:
+            query += " ORDER BY property_id, start_time"
+        return query, params
+
+    def iter_availability(self, property_id: Optional[str] = None,
+                          seller_id: Optional[str] = None,
+                          start_time: Optional[datetime] = None,
+                          end_time: Optional[datetime] = None,
+                          chunk_size: int = 2000) -> Iterator[dict]:
+        """
+        Stream availability rows through a server-side cursor
+        Rows are fetched chunk_size at a time, so memory stays flat however
+        many rows match. With no filters this walks the whole table. The
+        pooled connection is held until the iterator is exhausted or closed
+        """
+        with self._read_connection([property_id] if property_id else None, seller_id, operation='iter_availability') as conn:
+            with conn.cursor(name=f"availability_export_{uuid.uuid4().hex}",
+                             cursor_factory=RealDictCursor) as cur:
+                cur.itersize = chunk_size
+                cur.execute(*self._export_query(property_id, seller_id, start_time, end_time))
+                for row in cur:
+                    yield dict(row)
+
+    def copy_availability_to(self, out, export_format: str = 'csv',
+                             property_id: Optional[str] = None,
+                             seller_id: Optional[str] = None,
+                             start_time: Optional[datetime] = None,
+                             end_time: Optional[datetime] = None):
+        """
+        Write availability rows to a file object with COPY ... TO STDOUT
+        export_format is 'csv' (with a header) or 'jsonl', one JSON object
+        with ISO timestamps per line. Postgres streams the rows straight into
+        out, so memory stays flat however many there are
+        """
+        query, params = self._export_query(property_id, seller_id, start_time, end_time)
+        with self._read_connection([property_id] if property_id else None, seller_id, operation='copy_availability_to') as conn:
+            with conn.cursor() as cur:
+                query = cur.mogrify(query, params).decode()
+                if export_format == 'csv':
+                    copy = f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)"
+                elif export_format == 'jsonl':
+                    # Text COPY escapes backslashes, but UUIDs and timestamps
+                    # never contain any
+                    copy = f"COPY (SELECT row_to_json(export) FROM ({query}) export) TO STDOUT"
+                else:
+                    raise ValueError("export_format must be 'csv' or 'jsonl'")
+                cur.copy_expert(copy, out)
+
+    def copy_availability_from(self, slots: Iterable[Tuple[str, str, datetime, datetime]],
+                               chunk_size: int = 50000,
+                               progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        Bulk-load (property_id, seller_id, start_time, end_time) slots
+        Each chunk of slots is COPYed into a temporary staging table and from
+        there upserted into sellers, properties and availability in one
+        transaction, so memory stays flat and a failed load can simply be
+        rerun: slots already stored are skipped. Slots are stored as given,
+        without merging. progress is called with the running totals after
+        every chunk
+        """
+        slots = iter(slots)
+        totals = {"rows": 0, "inserted": 0, "duplicates": 0, "chunks": 0}
+        while True:
+            first = next(slots, None)
+            if first is None:
+                return totals
+            chunk = CopySource(chain([first], islice(slots, chunk_size - 1)))
+            with self._get_connection('copy_availability_from') as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        CREATE TEMP TABLE availability_import (
+                            property_id UUID NOT NULL,
+                            seller_id UUID NOT NULL,
+                            start_time TIMESTAMP NOT NULL,
+                            end_time TIMESTAMP NOT NULL
+                        ) ON COMMIT DROP
+                    """)
+                    cur.copy_expert("COPY availability_import FROM STDIN", chunk)
+                    cur.execute("""
+                        INSERT INTO sellers (id, name)
+                        SELECT DISTINCT seller_id, 'Seller ' || left(seller_id::text, 8)
+                        FROM availability_import
+                        ON CONFLICT (id) DO NOTHING
+                    """)
+                    cur.execute("""
+                        INSERT INTO properties (id, name, seller_id)
+                        SELECT DISTINCT ON (property_id)
+                               property_id, 'Property ' || left(property_id::text, 8), seller_id
+                        FROM availability_import
+                        ORDER BY property_id
+                        ON CONFLICT (id) DO NOTHING
+                    """)
+                    cur.execute("""
+                        INSERT INTO availability (property_id, seller_id, start_time, end_time)
+                        SELECT DISTINCT property_id, seller_id, start_time, end_time
+                        FROM availability_import
+                        ORDER BY property_id, seller_id, start_time, end_time
+                        ON CONFLICT (property_id, seller_id, start_time, end_time) DO NOTHING
+                    """)
+                    inserted = cur.rowcount
+
+                    property_ids = []
+                    if self.bitmaps or self.cache is not None:
+                        cur.execute("SELECT DISTINCT property_id FROM availability_import")
+                        property_ids = [row[0] for row in cur.fetchall()]
+                    if self.bitmaps:
+                        for property_id in property_ids:
+                            self._refresh_bitmaps(conn, property_id)
+            for property_id in property_ids:
+                self._after_write(property_id)
+
+            totals["rows"] += chunk.rows
+            totals["inserted"] += inserted
+            totals["duplicates"] += chunk.rows - inserted
+            totals["chunks"] += 1
+            if progress is not None:
+                progress(dict(totals))
+
+    def get_property_version(self, property_id: str, seller_id: Optional[str] = None) -> Optional[str]:
+        """
+        Cheap version string for a property's availability
+        Changes whenever a slot or recurring rule is inserted, updated or
+        deleted; slots are answered from the idx_availability_property_version
+        index without reading the rows. With rules present it also changes
+        daily, since open-ended reads expand them from today
+        """
+        try:
+            with self._read_connection([property_id], seller_id, operation='get_property_version') as conn:
+                return self._property_version(conn, property_id, seller_id)
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting availability version: {e}")
+            return None
+
+    def _property_version(self, conn, property_id: str, seller_id: Optional[str]) -> str:
+        with conn.cursor() as cur:
+            filters = " AND seller_id = %s" if seller_id else ""
+            params = [property_id, seller_id] if seller_id else [property_id]
+            cur.execute(f"""
+                SELECT count(*), max(updated_at), sum(hashtext(id::text)::bigint)
+                FROM availability
+                WHERE property_id = %s {filters}
+                UNION ALL
+                SELECT count(*), max(updated_at), sum(hashtext(id::text)::bigint)
+                FROM availability_rules
+                WHERE property_id = %s {filters}
+            """, params + params)
+            (count, last_updated, id_checksum), (rule_count, rules_updated, rule_checksum) = cur.fetchall()
+        version = f"{count}:{last_updated.isoformat() if last_updated else ''}:{id_checksum or 0}"
+        if rule_count:
+            version += f":{rule_count}:{rules_updated.isoformat()}:{rule_checksum}:{rule_window(None, None)[0].date()}"
+        return version
+
+    def search_availability(self, start_time: datetime, end_time: datetime,
+                            min_duration: Optional[timedelta] = None,
+                            seller_id: Optional[str] = None,
+                            property_ids: Optional[List[str]] = None,
+                            limit: int = 50, offset: int = 0) -> Optional[dict]:
+        """
+        Find properties with availability in a time window
+        A slot qualifies when its overlap with the window lasts at least
+        min_duration, or covers the whole window if no min_duration is given.
+        Results are paged by property, ordered by property ID
+        """
+        start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+        required = min_duration if min_duration is not None else end_time - start_time
+        try:
+            with self._read_connection(property_ids, seller_id, operation='search_availability') as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    # The && test is served by the idx_availability_range GiST
+                    # index and the start_time bounds prune partitions; rule
+                    # occurrences are generated for the window only
+                    filters = ""
+                    filter_params = []
+                    if seller_id:
+                        filters += " AND {alias}seller_id = %s"
+                        filter_params.append(seller_id)
+                    if property_ids:
+                        filters += " AND {alias}property_id = ANY(%s::uuid[])"
+                        filter_params.append(list(property_ids))
+                    params = [start_time, end_time, min_slot_start(start_time), end_time] + filter_params
+                    params += [start_time, end_time]
+                    params += [start_time, end_time] + filter_params
+                    params.extend([required, limit + 1, offset])
+
+                    cur.execute(f"""
+                        WITH slots AS (
+                            SELECT id, property_id, seller_id, start_time, end_time
+                            FROM availability
+                            WHERE tsrange(start_time, end_time) && tsrange(%s::timestamp, %s::timestamp)
+                              AND start_time > %s::timestamp AND start_time < %s::timestamp
+                            {filters.format(alias='')}
+                        ), qualifying AS (
+                            SELECT id, property_id, seller_id,
+                                   GREATEST(start_time, %s::timestamp) AS start_time,
+                                   LEAST(end_time, %s::timestamp) AS end_time
+                            FROM (
+                                SELECT * FROM slots
+                                UNION ALL
+                                SELECT id, property_id, seller_id, start_time, end_time
+                                FROM ({occurrences_query(filters=filters.format(alias='r.'))}) occurrences
+                            ) windowed
+                        ), page AS (
+                            SELECT DISTINCT property_id
+                            FROM qualifying
+                            WHERE end_time - start_time >= %s
+                            ORDER BY property_id
+                            LIMIT %s OFFSET %s
+                        )
+                        SELECT q.id, q.property_id, q.seller_id, q.start_time, q.end_time
+                        FROM qualifying q
+                        JOIN page USING (property_id)
+                        WHERE q.end_time - q.start_time >= %s
+                        ORDER BY q.property_id, q.start_time
+                    """, params + [required])
+
+                    properties = []
+                    by_property = {}
+                    for row in cur.fetchall():
+                        entry = by_property.get(row['property_id'])
+                        if entry is None:
+                            entry = {"property_id": row['property_id'], "intervals": []}
+                            by_property[row['property_id']] = entry
+                            properties.append(entry)
+                        entry["intervals"].append({
+                            "id": row['id'],
+                            "seller_id": row['seller_id'],
+                            "start_time": row['start_time'],
+                            "end_time": row['end_time']
+                        })
+
+                    # One extra property was fetched to tell whether more pages exist
+                    return {
+                        "properties": properties[:limit],
+                        "limit": limit,
+                        "offset": offset,
+                        "has_more": len(properties) > limit
+                    }
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error searching availability: {e}")
+            return None
 
     def delete_property_availability(self, property_id: str, seller_id: Optional[str] = None) -> dict:
         """
         Delete availability slots for a property
         """
         try:
-            with self._get_connection() as conn:
+            with self._write_connection(property_id, operation='delete_property_availability') as conn:
                 with conn.cursor() as cur:
                     query = "DELETE FROM availability WHERE property_id = %s"
                     params = [property_id]
@@ -111,21 +909,257 @@ class AvailabilityManager:
                         
                     cur.execute(query, params)
                     deleted_count = cur.rowcount
-                    conn.commit()
                     return {
                         "message": f"Deleted {deleted_count} availability slots",
                         "deleted_count": deleted_count
                     }
+        except DatabaseUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error deleting availability: {e}")
             return {"error": str(e), "deleted_count": 0}
 
+    def replace_availability(self, property_id: str, seller_id: str,
+                             slots: Sequence[Tuple[datetime, datetime]]) -> dict:
+        """
+        Replace a seller's availability for a property with the given slots
+        Only the difference is written, atomically: slots no longer submitted
+        are deleted and new ones inserted, unchanged rows are left alone
+        """
+        try:
+            with self._write_connection(property_id, seller_id, operation='replace_availability') as conn:
+                with conn.cursor() as cur:
+                    self._ensure_entities(cur, property_id, seller_id)
+
+                    # Serialise concurrent replaces of the same calendar
+                    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))",
+                                (f"{property_id}:{seller_id}",))
+
+                    slots = naive_utc_intervals(slots)
+                    if self.merge_tolerance is not None:
+                        slots = split_intervals(normalize_intervals(slots, self.merge_tolerance), MAX_SLOT_LENGTH)
+                    start_times = [start_time for start_time, _ in slots]
+                    end_times = [end_time for _, end_time in slots]
+
+                    cur.execute("""
+                        DELETE FROM availability a
+                        WHERE a.property_id = %s AND a.seller_id = %s
+                          AND NOT EXISTS (
+                              SELECT 1
+                              FROM unnest(%s::timestamp[], %s::timestamp[]) AS input (start_time, end_time)
+                              WHERE input.start_time = a.start_time
+                                AND input.end_time = a.end_time
+                          )
+                    """, (property_id, seller_id, start_times, end_times))
+                    deleted_count = cur.rowcount
+
+                    cur.execute("""
+                        INSERT INTO availability (property_id, seller_id, start_time, end_time)
+                        SELECT DISTINCT %s::uuid, %s::uuid, input.start_time, input.end_time
+                        FROM unnest(%s::timestamp[], %s::timestamp[]) AS input (start_time, end_time)
+                        ON CONFLICT (property_id, seller_id, start_time, end_time) DO NOTHING
+                    """, (property_id, seller_id, start_times, end_times))
+                    inserted_count = cur.rowcount
+
+            unchanged_count = len(set(slots)) - inserted_count
+            return {
+                "message": f"Added {inserted_count} and removed {deleted_count} availability slots",
+                "inserted_count": inserted_count,
+                "deleted_count": deleted_count,
+                "unchanged_count": unchanged_count
+            }
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error replacing availability: {e}")
+            return {"error": str(e), "inserted_count": 0, "deleted_count": 0, "unchanged_count": 0}
+
+    def create_availability_rule(self, property_id: str, seller_id: str, weekdays: List[int],
+                                 start_time: time, end_time: time, start_date: date,
+                                 end_date: Optional[date] = None,
+                                 exceptions: Sequence[date] = (),
+                                 timezone: str = DEFAULT_RULE_TIMEZONE) -> Optional[dict]:
+        """
+        Create a weekly recurring availability rule for a property
+        Occurrences are never stored; reads expand them for the window asked for
+        """
+        try:
+            rule_timezone(timezone)
+            with self._write_connection(property_id, seller_id, operation='create_availability_rule') as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    self._ensure_entities(cur, property_id, seller_id)
+                    cur.execute(f"""
+                        INSERT INTO availability_rules
+                        (property_id, seller_id, weekdays, start_time, end_time, timezone,
+                         start_date, end_date, exceptions)
+                        VALUES (%s, %s, %s::smallint[], %s, %s, %s, %s, %s, %s::date[])
+                        RETURNING {', '.join(RULE_COLUMNS)}
+                    """, (property_id, seller_id, list(weekdays), start_time, end_time, timezone,
+                          start_date, end_date, list(exceptions)))
+                    rule = cur.fetchone()
+            return rule_record(rule)
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error creating availability rule: {e}")
+            return None
+
+    def get_availability_rules(self, property_id: Optional[str] = None,
+                               seller_id: Optional[str] = None) -> Optional[List[dict]]:
+        """
+        List the recurring rules of a property and/or a seller
+        """
+        try:
+            with self._read_connection([property_id] if property_id else None, seller_id, operation='get_availability_rules') as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    query = f"SELECT {', '.join(RULE_COLUMNS)} FROM availability_rules WHERE TRUE"
+                    params = []
+
+                    if property_id:
+                        query += " AND property_id = %s"
+                        params.append(property_id)
+                    if seller_id:
+                        query += " AND seller_id = %s"
+                        params.append(seller_id)
+
+                    query += " ORDER BY property_id, start_date, start_time"
+                    cur.execute(query, params)
+                    return [rule_record(row) for row in cur.fetchall()]
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting availability rules: {e}")
+            return None
+
+    def update_availability_rule(self, rule_id: str, weekdays: List[int],
+                                 start_time: time, end_time: time, start_date: date,
+                                 end_date: Optional[date] = None,
+                                 exceptions: Sequence[date] = (),
+                                 timezone: str = DEFAULT_RULE_TIMEZONE) -> Optional[dict]:
+        """
+        Replace the pattern, dates and exceptions of a rule
+        Returns None if the rule doesn't exist or the update failed
+        """
+        try:
+            rule_timezone(timezone)
+            with self._get_connection('update_availability_rule') as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(f"""
+                        UPDATE availability_rules
+                        SET weekdays = %s::smallint[], start_time = %s, end_time = %s, timezone = %s,
+                            start_date = %s, end_date = %s, exceptions = %s::date[],
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE id = %s
+                        RETURNING {', '.join(RULE_COLUMNS)}
+                    """, (list(weekdays), start_time, end_time, timezone, start_date, end_date,
+                          list(exceptions), rule_id))
+                    rule = cur.fetchone()
+            if rule is None:
+                return None
+            self._after_write(rule['property_id'])
+            return rule_record(rule)
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error updating availability rule: {e}")
+            return None
+
+    def delete_availability_rule(self, rule_id: str) -> dict:
+        """
+        Delete a recurring rule, and with it every occurrence it produced
+        """
+        try:
+            with self._get_connection('delete_availability_rule') as conn:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM availability_rules WHERE id = %s RETURNING property_id", (rule_id,))
+                    deleted = cur.fetchone()
+            if deleted is not None:
+                self._after_write(deleted[0])
+            return {
+                "message": f"Deleted {1 if deleted else 0} availability rules",
+                "deleted_count": 1 if deleted else 0
+            }
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error deleting availability rule: {e}")
+            return {"error": str(e), "deleted_count": 0}
+
+    def rebuild_bitmaps(self, property_ids: Optional[List[str]] = None) -> Optional[int]:
+        """
+        Recompute availability_bitmaps from the availability rows
+        Covers the given properties, or every property with slots or bitmaps;
+        each property is rebuilt in its own short transaction. Returns the
+        number of properties rebuilt
+        """
+        try:
+            if property_ids is None:
+                with self._get_connection('rebuild_bitmaps') as conn:
+                    with conn.cursor() as cur:
+                        cur.execute("""
+                            SELECT property_id FROM availability
+                            UNION
+                            SELECT property_id FROM availability_bitmaps
+                        """)
+                        property_ids = [row[0] for row in cur.fetchall()]
+
+            for property_id in property_ids:
+                with self._get_connection('rebuild_bitmaps') as conn:
+                    self._refresh_bitmaps(conn, property_id)
+            return len(property_ids)
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error rebuilding availability bitmaps: {e}")
+            return None
+
+    def get_bitmap_grid(self, property_ids: List[str], start_date: date, days: int,
+                        seller_id: Optional[str] = None) -> Optional[BitmapGrid]:
+        """
+        Slot bitmaps of properties over days starting at start_date
+        Stored bitmaps of all sellers (or only seller_id) are OR-ed together
+        with the occurrences of recurring rules. Needs bitmaps enabled for
+        the stored part to be current
+        """
+        try:
+            window_start = datetime.combine(start_date, time())
+            window_end = window_start + timedelta(days=days)
+            with self._read_connection(property_ids, seller_id, operation='get_bitmap_grid') as conn:
+                with conn.cursor() as cur:
+                    query = """
+                        SELECT property_id, day, bit_or(slots)
+                        FROM availability_bitmaps
+                        WHERE property_id = ANY(%s::uuid[]) AND day >= %s AND day < %s
+                    """
+                    params = [list(property_ids), start_date, window_end.date()]
+                    if seller_id:
+                        query += " AND seller_id = %s"
+                        params.append(seller_id)
+                    query += " GROUP BY property_id, day"
+
+                    cur.execute(query, params)
+                    grid = BitmapGrid.from_rows(property_ids, start_date, days, cur.fetchall())
+
+                occurrences = self._rule_occurrences(conn, window_start, window_end, property_ids, seller_id)
+
+            by_property = {}
+            for occurrence in occurrences:
+                by_property.setdefault(occurrence[1], []).append((occurrence[3], occurrence[4]))
+            for property_id, intervals in by_property.items():
+                grid.add_intervals(property_id, intervals)
+            return grid
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error loading availability bitmaps: {e}")
+            return None
+
     def create_test_data(self) -> dict:
         """
         Create test property and seller with some availability slots
         """
         try:
-            with self._get_connection() as conn:
+            with self._get_connection('create_test_data') as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     # Create test seller
                     seller_id = str(uuid.uuid4())
@@ -151,6 +1185,8 @@ class AvailabilityManager:
                         "property": dict(property) if property else None,
                         "seller": dict(seller) if seller else None
                     }
+        except DatabaseUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error creating test data: {e}")
             return {"error": str(e)}
@@ -0,0 +1,141 @@
+"""
+Storage backend interface for availability
+
+AvailabilityManager stores availability in Postgres; MemoryAvailabilityManager
+(models/memory.py) keeps it in process, for local development, unit tests
+without a database and as an upper-bound baseline in benchmarks. Both follow
+the contract below, which test_backends.py checks against each of them, and
+return the same shapes: string IDs, naive UTC timestamps, rows as
+AVAILABILITY_COLUMNS tuples or dicts and rules as rule_record dicts.
+Failures are reported as by AvailabilityManager: None, an empty list or a
+dict with an "error" key, never an exception.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from models.recurrence import DEFAULT_RULE_TIMEZONE
+
+# Column order of availability rows returned as tuples
+AVAILABILITY_COLUMNS = ('id', 'property_id', 'seller_id', 'start_time', 'end_time', 'created_at', 'updated_at')
+
+# Values of the AVAILABILITY_BACKEND setting
+BACKENDS = ('postgres', 'memory')
+
+
+class AvailabilityBackend(ABC):
+    @abstractmethod
+    def save_availability(self, property_id: str, seller_id: str,
+                          start_time: datetime, end_time: datetime) -> Optional[dict]:
+        """Save one slot; the created record, or None if it already exists"""
+
+    @abstractmethod
+    def save_availability_batch(self, property_id: str, seller_id: str,
+                                slots: Sequence[Tuple[datetime, datetime]]) -> Optional[List[Optional[dict]]]:
+        """Save slots atomically; per slot the created record or None, or None if the batch failed"""
+
+    @abstractmethod
+    def save_availability_groups(self, writes: Sequence[Tuple[str, str, Sequence[Tuple[datetime, datetime]]]]
+                                 ) -> List[Optional[List[Optional[dict]]]]:
+        """Save several (property_id, seller_id, slots) writes; one batch result per write"""
+
+    def get_property_availability(self, property_id: str, seller_id: Optional[str] = None,
+                                  start_time: Optional[datetime] = None,
+                                  end_time: Optional[datetime] = None) -> List[dict]:
+        """
+        Get all availability slots for a property
+        If start_time or end_time is given, only slots overlapping that window
+        are returned. Occurrences of recurring rules are expanded into the
+        window, or from today up to rule_horizon ahead when it is open
+        """
+        rows = self.get_property_availability_rows(property_id, seller_id, start_time, end_time)
+        return [dict(zip(AVAILABILITY_COLUMNS, row)) for row in rows]
+
+    @abstractmethod
+    def get_property_availability_rows(self, property_id: str, seller_id: Optional[str] = None,
+                                       start_time: Optional[datetime] = None,
+                                       end_time: Optional[datetime] = None) -> List[tuple]:
+        """get_property_availability as AVAILABILITY_COLUMNS tuples sorted by start time"""
+
+    @abstractmethod
+    def get_availability_batch(self, property_ids: Optional[List[str]] = None,
+                               seller_id: Optional[str] = None,
+                               start_time: Optional[datetime] = None,
+                               end_time: Optional[datetime] = None) -> Optional[dict]:
+        """Slots of several properties, or all of a seller's, grouped by property ID"""
+
+    @abstractmethod
+    def get_property_version(self, property_id: str, seller_id: Optional[str] = None) -> Optional[str]:
+        """Version string that changes whenever the property's availability does"""
+
+    @abstractmethod
+    def get_property_snapshot(self, property_id: str, seller_id: Optional[str] = None,
+                              start_time: Optional[datetime] = None,
+                              end_time: Optional[datetime] = None) -> Optional[Tuple[str, List[tuple]]]:
+        """(version, rows) read together, so the version always describes the rows; None if the read failed"""
+
+    @abstractmethod
+    def iter_availability(self, property_id: Optional[str] = None,
+                          seller_id: Optional[str] = None,
+                          start_time: Optional[datetime] = None,
+                          end_time: Optional[datetime] = None,
+                          chunk_size: int = 2000) -> Iterator[dict]:
+        """Stream stored slots as dicts; rule occurrences are not included"""
+
+    @abstractmethod
+    def search_availability(self, start_time: datetime, end_time: datetime,
+                            min_duration: Optional[timedelta] = None,
+                            seller_id: Optional[str] = None,
+                            property_ids: Optional[List[str]] = None,
+                            limit: int = 50, offset: int = 0) -> Optional[dict]:
+        """Properties with a slot in a window, paged by property ID"""
+
+    @abstractmethod
+    def match_viewings(self, buyer_availability: Sequence[Tuple[datetime, datetime]],
+                       property_ids: List[str],
+                       min_duration: timedelta = timedelta(minutes=30)) -> Optional[List[dict]]:
+        """Common slots of a buyer and each property's sellers, as match_availability"""
+
+    @abstractmethod
+    def delete_property_availability(self, property_id: str, seller_id: Optional[str] = None) -> dict:
+        """Delete a property's slots, or one seller's"""
+
+    @abstractmethod
+    def replace_availability(self, property_id: str, seller_id: str,
+                             slots: Sequence[Tuple[datetime, datetime]]) -> dict:
+        """Replace a seller's slots for a property with slots, writing only the difference"""
+
+    @abstractmethod
+    def create_availability_rule(self, property_id: str, seller_id: str, weekdays: List[int],
+                                 start_time: time, end_time: time, start_date: date,
+                                 end_date: Optional[date] = None,
+                                 exceptions: Sequence[date] = (),
+                                 timezone: str = DEFAULT_RULE_TIMEZONE) -> Optional[dict]:
+        """Create a weekly recurring rule, its times the wall clock of timezone"""
+
+    @abstractmethod
+    def get_availability_rules(self, property_id: Optional[str] = None,
+                               seller_id: Optional[str] = None) -> Optional[List[dict]]:
+        """Rules of a property and/or seller"""
+
+    @abstractmethod
+    def update_availability_rule(self, rule_id: str, weekdays: List[int],
+                                 start_time: time, end_time: time, start_date: date,
+                                 end_date: Optional[date] = None,
+                                 exceptions: Sequence[date] = (),
+                                 timezone: str = DEFAULT_RULE_TIMEZONE) -> Optional[dict]:
+        """Replace a rule's pattern; None if it doesn't exist"""
+
+    @abstractmethod
+    def delete_availability_rule(self, rule_id: str) -> dict:
+        """Delete a rule"""
+
+    @abstractmethod
+    def get_bitmap_grid(self, property_ids: List[str], start_date: date, days: int,
+                        seller_id: Optional[str] = None):
+        """BitmapGrid of the properties' slots and rule occurrences over days from start_date"""
+
+    @abstractmethod
+    def create_test_data(self) -> dict:
+        """Create a test seller and property"""
@@ -0,0 +1,224 @@
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+# NumPy is imported by the first BitmapGrid, so workers that never build a
+# grid neither need it nor pay its import time; the conversions are plain Python
+np = None
+
+from models.intervals import Interval, normalize_intervals
+
+# The frontend's grid: 48 half-hour slots per day, slot i starting at
+# 00:00 + i * 30 minutes and stored as bit i of a day's mask
+SLOT_LENGTH = timedelta(minutes=30)
+SLOTS_PER_DAY = 48
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+
+def _slot_index(moment: datetime, round_up: bool) -> int:
+    """
+    Slot boundary at or around a moment, counted from midnight of its day
+    """
+    offset = moment - datetime.combine(moment.date(), time())
+    index, remainder = divmod(offset, SLOT_LENGTH)
+    return index + 1 if round_up and remainder else index
+
+
+def interval_bitmaps(intervals: Iterable[Interval]) -> Dict[date, int]:
+    """
+    Per-day slot masks for naive intervals
+    A slot is set only when an interval covers all of it, so intervals off
+    the grid shrink to the whole slots inside them. Days with no whole slot
+    are left out
+    """
+    bitmaps = {}
+    for start, end in normalize_intervals(intervals):
+        day = start.date()
+        first = _slot_index(start, round_up=True)
+        while True:
+            midnight = datetime.combine(day + timedelta(days=1), time())
+            last = SLOTS_PER_DAY if end >= midnight else _slot_index(end, round_up=False)
+            if last > first:
+                mask = ((1 << (last - first)) - 1) << first
+                bitmaps[day] = bitmaps.get(day, 0) | mask
+            if end <= midnight:
+                break
+            day += timedelta(days=1)
+            first = 0
+    return bitmaps
+
+
+def bitmap_intervals(bitmaps: Mapping[date, int]) -> List[Interval]:
+    """
+    Sorted, disjoint intervals for per-day slot masks; the inverse of
+    interval_bitmaps. A run that reaches midnight joins one that starts
+    the next day
+    """
+    intervals = []
+    for day in sorted(bitmaps):
+        mask = bitmaps[day] & FULL_DAY
+        midnight = datetime.combine(day, time())
+        slot = 0
+        while mask:
+            # Skip to the next set bit, then measure the run of set bits
+            skip = (mask & -mask).bit_length() - 1
+            mask >>= skip
+            slot += skip
+            run = (~mask & (mask + 1)).bit_length() - 1
+            start = midnight + slot * SLOT_LENGTH
+            end = start + run * SLOT_LENGTH
+            if intervals and intervals[-1][1] == start:
+                intervals[-1] = (intervals[-1][0], end)
+            else:
+                intervals.append((start, end))
+            mask >>= run
+            slot += run
+    return intervals
+
+
+def seller_bitmaps(rows: Iterable[Tuple[Any, datetime, datetime]]) -> List[Tuple[Any, date, int]]:
+    """
+    (seller_id, day, mask) records for (seller_id, start, end) rows
+    """
+    by_seller = {}
+    for seller_id, start, end in rows:
+        by_seller.setdefault(seller_id, []).append((start, end))
+    return [
+        (seller_id, day, mask)
+        for seller_id, intervals in by_seller.items()
+        for day, mask in sorted(interval_bitmaps(intervals).items())
+    ]
+
+
+def run_starts(mask: int, slots: int) -> int:
+    """
+    Bits of mask that start a run of at least slots set bits
+    """
+    length = 1
+    while length < slots:
+        step = min(length, slots - length)
+        mask &= mask >> step
+        length += step
+    return mask
+
+
+class BitmapGrid:
+    """
+    Slot masks for many properties over consecutive days, as a NumPy array
+
+    masks[p, d] is the 48-bit mask of property_ids[p] on start_date + d days.
+    Union, intersection and consecutive-free-slot searches run as vectorised
+    bit operations over the whole grid. Runs are found within a day; one
+    that crosses midnight counts as two. Needs NumPy.
+    """
+
+    def __init__(self, property_ids: Sequence[str], start_date: date, days: int, masks=None):
+        global np
+        if np is None:
+            try:
+                import numpy as np
+            except ImportError:
+                raise RuntimeError("BitmapGrid needs NumPy; install it with 'pip install numpy'")
+        self.property_ids = list(property_ids)
+        self.start_date = start_date
+        self.days = days
+        self._index = {property_id: row for row, property_id in enumerate(self.property_ids)}
+        if masks is None:
+            masks = np.zeros((len(self.property_ids), days), dtype=np.uint64)
+        elif masks.shape != (len(self.property_ids), days):
+            raise ValueError(f"masks must have shape {(len(self.property_ids), days)}, got {masks.shape}")
+        self.masks = masks
+
+    @classmethod
+    def from_rows(cls, property_ids: Sequence[str], start_date: date, days: int,
+                  rows: Iterable[Tuple[str, date, int]]) -> "BitmapGrid":
+        """
+        Grid from (property_id, day, mask) rows; rows outside it are ignored
+        and repeated cells are OR-ed together
+        """
+        grid = cls(property_ids, start_date, days)
+        for property_id, day, mask in rows:
+            grid.add(property_id, day, mask)
+        return grid
+
+    def add(self, property_id: str, day: date, mask: int):
+        row = self._index.get(property_id)
+        column = (day - self.start_date).days
+        if row is not None and 0 <= column < self.days:
+            self.masks[row, column] |= np.uint64(mask & FULL_DAY)
+
+    def add_intervals(self, property_id: str, intervals: Iterable[Interval]):
+        for day, mask in interval_bitmaps(intervals).items():
+            self.add(property_id, day, mask)
+
+    def _aligned(self, other: "BitmapGrid"):
+        if (self.property_ids, self.start_date, self.days) != (other.property_ids, other.start_date, other.days):
+            raise ValueError("Grids must cover the same properties and days")
+
+    def union(self, other: "BitmapGrid") -> "BitmapGrid":
+        self._aligned(other)
+        return BitmapGrid(self.property_ids, self.start_date, self.days, self.masks | other.masks)
+
+    def intersection(self, other: "BitmapGrid") -> "BitmapGrid":
+        self._aligned(other)
+        return BitmapGrid(self.property_ids, self.start_date, self.days, self.masks & other.masks)
+
+    def restrict(self, masks) -> "BitmapGrid":
+        """
+        Intersect every property with per-day masks, e.g. a buyer's free slots
+        """
+        masks = np.asarray(masks, dtype=np.uint64)
+        return BitmapGrid(self.property_ids, self.start_date, self.days, self.masks & masks)
+
+    def any_property(self):
+        """Per-day mask of slots free at one property or more"""
+        return np.bitwise_or.reduce(self.masks, axis=0)
+
+    def every_property(self):
+        """Per-day mask of slots free at every property"""
+        return np.bitwise_and.reduce(self.masks, axis=0)
+
+    def run_starts(self, slots: int):
+        """
+        Masks of the slots that start slots consecutive free ones
+        """
+        if not 1 <= slots <= SLOTS_PER_DAY:
+            raise ValueError(f"slots must be between 1 and {SLOTS_PER_DAY}")
+        masks = self.masks.copy()
+        length = 1
+        while length < slots:
+            step = min(length, slots - length)
+            masks &= masks >> np.uint64(step)
+            length += step
+        return masks
+
+    def has_free(self, slots: int):
+        """Boolean (property, day) array: is there a run of slots free slots"""
+        return self.run_starts(slots) != 0
+
+    def first_free(self, slots: int) -> List[Tuple[str, datetime, datetime]]:
+        """
+        Earliest run of slots free slots for every property that has one,
+        as (property_id, start, end), ordered by start time
+        """
+        starts = self.run_starts(slots)
+        nonzero = starts != 0
+        columns = nonzero.argmax(axis=1)
+        found = []
+        for row in np.flatnonzero(nonzero.any(axis=1)):
+            column = int(columns[row])
+            mask = int(starts[row, column])
+            start = datetime.combine(self.start_date + timedelta(days=column), time()) + \
+                ((mask & -mask).bit_length() - 1) * SLOT_LENGTH
+            found.append((self.property_ids[row], start, start + slots * SLOT_LENGTH))
+        return sorted(found, key=lambda entry: (entry[1], entry[0]))
+
+    def intervals(self, property_id: str) -> List[Interval]:
+        """Free intervals of one property, converted back from its masks"""
+        row = self.masks[self._index[property_id]]
+        return bitmap_intervals({
+            self.start_date + timedelta(days=column): int(mask)
+            for column, mask in enumerate(row) if mask
+        })
+
+    def nbytes(self) -> int:
+        return int(self.masks.nbytes)
@@ -0,0 +1,265 @@
+"""
+Bulk import and export of availability through Postgres COPY
+
+    python -m models.bulk import slots.csv --rejects rejects.jsonl
+    python -m models.bulk import - --format jsonl < slots.jsonl
+    python -m models.bulk export --property-id <id> --output calendar.csv
+    python -m models.bulk export --format jsonl --output all.jsonl
+
+Imports take CSV with a header row, or JSON Lines, with property_id,
+seller_id, start_time and end_time (propertyId, sellerId, startTime and
+endTime work too); other columns are ignored, so an export imports back
+as is. Times are ISO 8601, with an offset or as UTC. Invalid records are
+counted and skipped, and written to --rejects if given. Everything is
+streamed, so memory stays flat for any file size.
+"""
+
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import IO, Callable, Iterable, Iterator, Mapping, Optional, Tuple
+
+from models.intervals import naive_utc
+from models.partitions import MAX_SLOT_LENGTH
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+_FIELDS = (
+    ('property_id', 'propertyId'),
+    ('seller_id', 'sellerId'),
+    ('start_time', 'startTime'),
+    ('end_time', 'endTime'),
+)
+
+
+class CopySource:
+    """
+    Read-only file object over (property_id, seller_id, start, end) slots,
+    rendered as COPY text lines on demand so a COPY FROM STDIN never holds
+    more than one read's worth of them
+    """
+
+    def __init__(self, slots: Iterable[Tuple[str, str, datetime, datetime]]):
+        self._slots = iter(slots)
+        self._buffer = ''
+        self.rows = 0
+
+    def read(self, size: int = -1) -> str:
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            slot = next(self._slots, None)
+            if slot is None:
+                break
+            property_id, seller_id, start_time, end_time = slot
+            line = f"{property_id}\t{seller_id}\t{naive_utc(start_time).isoformat(' ')}\t{naive_utc(end_time).isoformat(' ')}\n"
+            parts.append(line)
+            length += len(line)
+            self.rows += 1
+        data = ''.join(parts)
+        if size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+class ProgressWriter(io.TextIOBase):
+    """
+    Text file wrapper counting the lines written through it, calling
+    progress with the count every every lines
+    """
+
+    def __init__(self, out: IO, progress: Optional[Callable[[int], None]] = None, every: int = 100000):
+        self.out = out
+        self.progress = progress
+        self.every = every
+        self.lines = 0
+        self._next_report = every
+
+    def write(self, data):
+        self.lines += data.count('\n')
+        if self.progress is not None and self.lines >= self._next_report:
+            self.progress(self.lines)
+            self._next_report = (self.lines // self.every + 1) * self.every
+        return self.out.write(data)
+
+
+def _field(record: Mapping, names: Tuple[str, str]):
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ''):
+            return value
+    raise ValueError(f"Missing required field: {names[0]}")
+
+
+def _parse_time(value) -> datetime:
+    # Naive UTC, as the TIMESTAMP columns store it
+    return naive_utc(datetime.fromisoformat(str(value).replace('Z', '+00:00')))
+
+
+def parse_slot(record: Mapping) -> Tuple[str, str, datetime, datetime]:
+    """
+    Validate one imported record into a (property_id, seller_id, start, end)
+    slot with naive UTC times. Raises ValueError
+    """
+    property_id, seller_id, start_time, end_time = (_field(record, names) for names in _FIELDS)
+    try:
+        property_id = str(uuid.UUID(str(property_id)))
+        seller_id = str(uuid.UUID(str(seller_id)))
+    except ValueError:
+        raise ValueError("property_id and seller_id must be UUIDs")
+    start_time = _parse_time(start_time)
+    end_time = _parse_time(end_time)
+    if end_time <= start_time:
+        raise ValueError("end_time must be after start_time")
+    if end_time - start_time > MAX_SLOT_LENGTH:
+        raise ValueError(f"A slot may last at most {MAX_SLOT_LENGTH.days} days")
+    return property_id, seller_id, start_time, end_time
+
+
+def read_records(source: IO[str], import_format: str) -> Iterator[Tuple[int, object]]:
+    """
+    (line number, record) pairs from a CSV or JSON Lines stream; a JSON line
+    that doesn't parse is yielded as the ValueError it raised
+    """
+    if import_format == 'csv':
+        reader = csv.DictReader(source)
+        for record in reader:
+            yield reader.line_num, record
+    elif import_format == 'jsonl':
+        for line_number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                record = ValueError(f"Invalid JSON: {e}")
+            yield line_number, record
+    else:
+        raise ValueError(f"import_format must be one of {', '.join(IMPORT_FORMATS)}")
+
+
+class SlotReader:
+    """
+    Iterator of the valid slots in an import stream
+    Invalid records are counted in invalid and, with rejects given, written
+    there as JSON lines holding the line number, error and record
+    """
+
+    def __init__(self, source: IO[str], import_format: str, rejects: Optional[IO[str]] = None):
+        self.records = read_records(source, import_format)
+        self.rejects = rejects
+        self.invalid = 0
+
+    def __iter__(self):
+        for line_number, record in self.records:
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                yield parse_slot(record)
+            except ValueError as e:
+                self.invalid += 1
+                if self.rejects is not None:
+                    self.rejects.write(json.dumps({
+                        "line": line_number,
+                        "error": str(e),
+                        "record": None if isinstance(record, ValueError) else record
+                    }, default=str) + '\n')
+
+
+def _guess_format(path: Optional[str], default: str = 'csv') -> str:
+    if path and path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return default
+
+
+def _parse_cli_time(value: str) -> datetime:
+    try:
+        return _parse_time(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO time: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_URL', ''),
+                        help='database to use (default: $DATABASE_URL, else the libpq PG* variables)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('import', help='load slots from a CSV or JSON Lines file')
+    load.add_argument('file', help="file to import, or - for stdin")
+    load.add_argument('--format', choices=IMPORT_FORMATS, help='default: from the file extension, else csv')
+    load.add_argument('--chunk-size', type=int, default=50000, help='slots per COPY and transaction')
+    load.add_argument('--rejects', help='write invalid records here as JSON lines')
+    load.add_argument('--bitmaps', action='store_true', help='refresh availability_bitmaps for imported properties')
+
+    dump = commands.add_parser('export', help='write slots as CSV or JSON Lines')
+    dump.add_argument('--property-id')
+    dump.add_argument('--seller-id')
+    dump.add_argument('--from', dest='start_time', type=_parse_cli_time)
+    dump.add_argument('--to', dest='end_time', type=_parse_cli_time)
+    dump.add_argument('--format', choices=IMPORT_FORMATS, help='default: from the output extension, else csv')
+    dump.add_argument('--output', help='file to write (default: stdout)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s %(message)s')
+    # Imported here: models.availability uses CopySource from this module
+    from models.availability import AvailabilityManager
+    from models.pool import ConnectionPool
+
+    manager = AvailabilityManager(args.dsn, pool=ConnectionPool(args.dsn, min_size=0, max_size=1),
+                                  bitmaps=getattr(args, 'bitmaps', False))
+    started = time.perf_counter()
+
+    def report(message: str):
+        print(f"\r{message} ({time.perf_counter() - started:.1f}s)", end='', file=sys.stderr, flush=True)
+
+    if args.command == 'import':
+        import_format = args.format or _guess_format(args.file)
+        source = sys.stdin if args.file == '-' else open(args.file, newline='' if import_format == 'csv' else None)
+        rejects = open(args.rejects, 'w') if args.rejects else None
+        try:
+            reader = SlotReader(source, import_format, rejects)
+            totals = manager.copy_availability_from(
+                reader, chunk_size=args.chunk_size,
+                progress=lambda totals: report(f"{totals['rows']} slots loaded, {totals['inserted']} new, "
+                                               f"{reader.invalid} invalid")
+            )
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if rejects is not None:
+                rejects.close()
+        print(file=sys.stderr)
+        print(f"Imported {totals['inserted']} slots: {totals['duplicates']} already stored, "
+              f"{reader.invalid} invalid, in {time.perf_counter() - started:.1f}s")
+        if reader.invalid:
+            sys.exit(1)
+    else:
+        export_format = args.format or _guess_format(args.output)
+        out = open(args.output, 'w', newline='') if args.output else sys.stdout
+        try:
+            writer = ProgressWriter(out, lambda lines: report(f"{lines} lines written"))
+            manager.copy_availability_to(writer, export_format, args.property_id, args.seller_id,
+                                         args.start_time, args.end_time)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        rows = writer.lines - (1 if export_format == 'csv' and writer.lines else 0)
+        print(f"\rExported {rows} slots in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
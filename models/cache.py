@@ -0,0 +1,218 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Rough in-memory footprint of one availability row held as a tuple: the
+# tuple itself plus three UUID strings and four datetimes. Sizing entries
+# this way keeps accounting O(1) instead of walking every object.
+ROW_SIZE_ESTIMATE = 600
+ENTRY_OVERHEAD = 200
+
+
+class IntervalCache:
+    """
+    Bounded LRU cache of per-property availability rows
+
+    Entries are keyed by (property_id, seller_id), expire after ttl seconds
+    and are evicted least-recently-used first once either max_entries or the
+    approximate max_bytes budget is exceeded. Writers call invalidate() so a
+    worker never serves its own stale reads. Writes through other workers
+    are only caught by passing the version the rows were read at to put(),
+    and the current one to get().
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        # key -> (value, size, expires_at, version)
+        self._entries: "OrderedDict[Tuple[str, Optional[str]], Tuple[Any, int, float, Optional[str]]]" = OrderedDict()
+        self._keys_by_property: Dict[str, set] = {}
+        # Bumped on every invalidation so a read that raced a write can't
+        # put pre-write rows back into the cache. The map is reset, and the
+        # epoch bumped, whenever it outgrows the cache several times over.
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._bytes = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def estimate_size(value: Any) -> int:
+        try:
+            return ENTRY_OVERHEAD + len(value) * ROW_SIZE_ESTIMATE
+        except TypeError:
+            return ENTRY_OVERHEAD
+
+    def _remove(self, key):
+        # Called with the lock held
+        _, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._keys_by_property.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_property[key[0]]
+
+    def get(self, property_id: str, seller_id: Optional[str] = None,
+            version: Optional[str] = None) -> Optional[Any]:
+        """
+        Cached rows for a property, or None on a miss
+        With version, only rows put at that version count as a hit
+        """
+        key = (property_id, seller_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (version is not None and entry[3] != version):
+                self._stats["misses"] += 1
+                return None
+            if entry[2] <= time.monotonic():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def generation(self, property_id: str) -> Tuple[int, int]:
+        """
+        Token to take before loading a property, to pass back to put()
+        """
+        with self._lock:
+            return self._epoch, self._generations.get(property_id, 0)
+
+    def put(self, property_id: str, seller_id: Optional[str], value: Any,
+            generation: Optional[Tuple[int, int]] = None, version: Optional[str] = None):
+        """
+        Cache rows for a property, unless it was invalidated since generation
+        version is the property's version the rows were read at, if known
+        """
+        key = (property_id, seller_id)
+        size = self.estimate_size(value)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(property_id, 0)):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl, version)
+            self._keys_by_property.setdefault(property_id, set()).add(key)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, property_id: str):
+        """
+        Drop every cached entry for a property, whatever the seller filter
+        """
+        with self._lock:
+            if len(self._generations) > 4 * max(self.max_entries, 1024):
+                self._generations.clear()
+                self._epoch += 1
+            self._generations[property_id] = self._generations.get(property_id, 0) + 1
+            for key in list(self._keys_by_property.get(property_id, ())):
+                self._remove(key)
+            self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generations.clear()
+            self._epoch += 1
+            self._entries.clear()
+            self._keys_by_property.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Snapshot of cache counters
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            })
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+class KnownEntityCache:
+    """
+    Bounded LRU set of seller and property IDs known to exist
+
+    Lets writers skip the seller/property upsert on repeat writes. Only add
+    IDs after the transaction that created or saw them has committed, and
+    discard them if a write later finds them missing.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+
+    def contains(self, *keys: Tuple[str, str]) -> bool:
+        """
+        Whether every (kind, id) key is known to exist
+        """
+        with self._lock:
+            for key in keys:
+                if key not in self._entries:
+                    self._stats["misses"] += 1
+                    return False
+                self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return True
+
+    def add(self, *keys: Tuple[str, str]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            for key in keys:
+                self._entries[key] = None
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def discard(self, *keys: Tuple[str, str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Snapshot of cache counters
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            })
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
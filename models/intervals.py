@@ -0,0 +1,130 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+Interval = Tuple[datetime, datetime]
+
+
+class MergePlan(NamedTuple):
+    merged: List[Interval]
+    keep_ids: List[Any]
+    delete_ids: List[Any]
+    inserts: List[Interval]
+
+
+def normalize_intervals(intervals: Iterable[Interval],
+                        tolerance: timedelta = timedelta(0)) -> List[Interval]:
+    """
+    Coalesce overlapping intervals, and intervals separated by a gap of at
+    most tolerance, into a sorted list of disjoint intervals in O(n log n)
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if end < start:
+            raise ValueError(f"Interval ends before it starts: {start} - {end}")
+        if merged and start - merged[-1][1] <= tolerance:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """
+    moment as the naive UTC timestamp the TIMESTAMP columns store
+    Naive values are taken to be UTC already. Every backend converts with
+    this, so stored times don't depend on a session's TimeZone setting
+    """
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def naive_utc_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """intervals with both ends converted by naive_utc"""
+    return [(naive_utc(start), naive_utc(end)) for start, end in intervals]
+
+
+def split_intervals(intervals: Iterable[Interval], max_length: Optional[timedelta]) -> List[Interval]:
+    """
+    Cut intervals longer than max_length into touching pieces of max_length,
+    counted from each interval's start, and a shorter last piece. None keeps
+    them whole
+    """
+    if max_length is None:
+        return list(intervals)
+    pieces = []
+    for start, end in intervals:
+        while end - start > max_length:
+            pieces.append((start, start + max_length))
+            start += max_length
+        pieces.append((start, end))
+    return pieces
+
+
+def find_covering(merged: Sequence[Interval], start: datetime, end: datetime,
+                  starts: Optional[Sequence[datetime]] = None) -> Optional[int]:
+    """
+    Index of the interval in sorted, disjoint merged that contains start-end
+    Pass starts (the interval start times) to avoid rebuilding them per lookup
+    """
+    if starts is None:
+        starts = [interval[0] for interval in merged]
+    index = bisect_right(starts, start) - 1
+    if index >= 0 and merged[index][1] >= end:
+        return index
+    return None
+
+
+def plan_merge(existing: Sequence[Tuple[Any, datetime, datetime]],
+               incoming: Iterable[Interval],
+               tolerance: timedelta = timedelta(0),
+               max_length: Optional[timedelta] = None) -> MergePlan:
+    """
+    Work out the row changes that fold incoming intervals into existing rows
+
+    existing holds (id, start, end) rows already stored. Rows that survive
+    normalisation unchanged are kept, every other existing row is deleted and
+    the merged intervals that aren't already stored are inserted. Merged
+    intervals longer than max_length are stored as split_intervals pieces.
+    """
+    merged = split_intervals(normalize_intervals(
+        [(start, end) for _, start, end in existing] + list(incoming), tolerance
+    ), max_length)
+
+    unclaimed = set(merged)
+    keep_ids = []
+    delete_ids = []
+    for row_id, start, end in existing:
+        if (start, end) in unclaimed:
+            unclaimed.discard((start, end))
+            keep_ids.append(row_id)
+        else:
+            delete_ids.append(row_id)
+
+    inserts = [interval for interval in merged if interval in unclaimed]
+    return MergePlan(merged, keep_ids, delete_ids, inserts)
+
+
+def merge_results(previous: Sequence[Interval], merged: Sequence[Interval],
+                  incoming: Iterable[Interval]) -> List[Optional[Interval]]:
+    """
+    The merged interval each incoming one ended up in, per plan_merge
+
+    previous holds the stored intervals before the merge, sorted and
+    disjoint. An incoming interval they already covered, or one repeating an
+    earlier incoming interval, maps to None; any other maps to the piece of
+    merged it starts in.
+    """
+    previous_starts = [start for start, _ in previous]
+    merged_starts = [start for start, _ in merged]
+    results = []
+    seen = set()
+    for start, end in incoming:
+        if (start, end) in seen or find_covering(previous, start, end, previous_starts) is not None:
+            results.append(None)
+        else:
+            results.append(merged[bisect_right(merged_starts, start) - 1])
+        seen.add((start, end))
+    return results
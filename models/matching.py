@@ -0,0 +1,72 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Iterable, List, Sequence, Tuple
+
+from models.intervals import Interval, naive_utc_intervals, normalize_intervals
+
+
+def buyer_windows(windows: Iterable[Interval]) -> List[Interval]:
+    """
+    Buyer windows as sorted, disjoint, naive UTC intervals, the form the
+    availability rows are stored in
+    """
+    return normalize_intervals(naive_utc_intervals(windows))
+
+
+def _clip(windows: Sequence[Interval], window_ends: Sequence[datetime], start: datetime, end: datetime,
+          min_duration: timedelta, seller_id: Any, common: List[tuple]):
+    # Jump to the first window ending after start, then walk the overlapping ones
+    index = bisect_right(window_ends, start)
+    while index < len(windows) and windows[index][0] < end:
+        window_start, window_end = windows[index]
+        overlap_start = start if start > window_start else window_start
+        overlap_end = end if end < window_end else window_end
+        if overlap_end - overlap_start >= min_duration:
+            common.append((overlap_start, overlap_end, seller_id))
+        index += 1
+
+
+def match_availability(windows: Sequence[Interval],
+                       rows: Iterable[Tuple[str, Any, datetime, datetime]],
+                       min_duration: timedelta) -> List[dict]:
+    """
+    Common slots per property for buyer windows (as from buyer_windows)
+
+    rows are (property_id, seller_id, start, end) availability tuples sorted
+    in that column order. One pass merges each seller's touching or
+    overlapping slots into runs, so a viewing may span them, and clips every
+    run against the windows it overlaps: O(n log k + matches) for n rows and
+    k windows. Properties without a common slot of min_duration are left
+    out; the rest are ranked by earliest common start, then property ID.
+    """
+    window_ends = [end for _, end in windows]
+    matches = []
+    for property_id, property_rows in groupby(rows, itemgetter(0)):
+        common = []
+        for seller_id, seller_rows in groupby(property_rows, itemgetter(1)):
+            run_start = run_end = None
+            for _, _, start, end in seller_rows:
+                if run_end is not None and start <= run_end:
+                    if end > run_end:
+                        run_end = end
+                    continue
+                if run_end is not None:
+                    _clip(windows, window_ends, run_start, run_end, min_duration, seller_id, common)
+                run_start, run_end = start, end
+            if run_end is not None:
+                _clip(windows, window_ends, run_start, run_end, min_duration, seller_id, common)
+
+        if common:
+            common.sort(key=lambda slot: (slot[0], slot[1], str(slot[2])))
+            matches.append({
+                "property_id": property_id,
+                "earliest_start": common[0][0],
+                "slots": [
+                    {"seller_id": seller_id, "start_time": start, "end_time": end}
+                    for start, end, seller_id in common
+                ]
+            })
+    matches.sort(key=lambda match: (match["earliest_start"], match["property_id"]))
+    return matches
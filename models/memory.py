@@ -0,0 +1,671 @@
+import logging
+import threading
+import uuid
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta, timezone
+from itertools import chain, islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from models.backend import AVAILABILITY_COLUMNS, AvailabilityBackend
+from models.bitmap import BitmapGrid, seller_bitmaps
+from models.intervals import merge_results, naive_utc, naive_utc_intervals, normalize_intervals, plan_merge, split_intervals
+from models.matching import buyer_windows, match_availability
+from models.partitions import MAX_SLOT_LENGTH, min_slot_start
+from models.recurrence import (DEFAULT_RULE_HORIZON, DEFAULT_RULE_TIMEZONE, RULE_COLUMNS, expand_rules,
+                               merge_occurrences, rule_date_range, rule_record, rule_timezone, rule_window)
+
+logger = logging.getLogger(__name__)
+
+
+def _uuid(value) -> str:
+    # IDs are stored in the form Postgres returns UUIDs in
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        raise ValueError(f"invalid UUID: {value!r}")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class _PropertyIndex:
+    """
+    One property's slots, sorted by (start_time, end_time, seller_id)
+    rows holds the AVAILABILITY_COLUMNS tuple of the slot at the same
+    position in keys. Window reads bisect to the first slot that can overlap
+    the window, the way the Postgres ones bound start_time
+    """
+
+    __slots__ = ('keys', 'rows', 'revision')
+
+    def __init__(self):
+        self.keys = []
+        self.rows = []
+        # Bumped on every change to the property's slots or rules
+        self.revision = 0
+
+    def add(self, row: tuple) -> bool:
+        key = (row[3], row[4], row[2])
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return False
+        self.keys.insert(index, key)
+        self.rows.insert(index, row)
+        return True
+
+    def remove(self, row: tuple):
+        index = bisect_left(self.keys, (row[3], row[4], row[2]))
+        del self.keys[index]
+        del self.rows[index]
+
+    def window(self, start_time: Optional[datetime], end_time: Optional[datetime],
+               seller_id: Optional[str] = None, touching: bool = False) -> List[tuple]:
+        """
+        Slots overlapping start_time-end_time, either side open when None
+        With touching, slots that only touch the window count as well
+        """
+        index = bisect_left(self.keys, (min_slot_start(start_time),)) if start_time else 0
+        rows = []
+        while index < len(self.keys):
+            slot_start, slot_end, slot_seller = self.keys[index]
+            if end_time and (slot_start > end_time or (slot_start == end_time and not touching)):
+                break
+            if (not start_time or slot_end > start_time or (touching and slot_end == start_time)) and \
+                    (seller_id is None or slot_seller == seller_id):
+                rows.append(self.rows[index])
+            index += 1
+        return rows
+
+
+class MemoryAvailabilityManager(AvailabilityBackend):
+    """
+    Availability kept in this process, with the same contract as the
+    Postgres AvailabilityManager
+
+    Each property's slots sit in a sorted index, so a window read costs a
+    bisection plus the slots it returns. Everything is guarded by one lock
+    and lost when the process exits; under gunicorn every worker has its own
+    copy, so run a single worker with it. Constraints Postgres enforces are
+    checked here too: IDs must be UUIDs, a seller can't hold the same slot
+    twice and slots may last at most MAX_SLOT_LENGTH, so a write that would
+    fail there fails here, as a whole.
+    """
+
+    def __init__(self, merge_tolerance: Optional[timedelta] = None,
+                 rule_horizon: timedelta = DEFAULT_RULE_HORIZON):
+        # Same meaning as AvailabilityManager's
+        self.merge_tolerance = merge_tolerance
+        self.rule_horizon = rule_horizon
+        self._lock = threading.RLock()
+        self._properties: Dict[str, _PropertyIndex] = {}
+        self._seller_properties: Dict[str, Set[str]] = {}
+        self._rules: Dict[str, dict] = {}
+        # Versions restart with the process, so they carry its own token
+        # to keep a client's old ETag from matching new data
+        self._instance = uuid.uuid4().hex[:8]
+
+    def _index(self, property_id: str) -> _PropertyIndex:
+        index = self._properties.get(property_id)
+        if index is None:
+            index = self._properties[property_id] = _PropertyIndex()
+        return index
+
+    def _check_slots(self, slots: Iterable[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+        slots = naive_utc_intervals(slots)
+        for start_time, end_time in slots:
+            if end_time - start_time > MAX_SLOT_LENGTH:
+                raise ValueError(f"A slot may last at most {MAX_SLOT_LENGTH.days} days")
+        return slots
+
+    def _insert(self, property_id: str, seller_id: str, start_time: datetime, end_time: datetime,
+                now: datetime) -> Optional[dict]:
+        row = (str(uuid.uuid4()), property_id, seller_id, start_time, end_time, now, now)
+        if not self._index(property_id).add(row):
+            return None
+        self._seller_properties.setdefault(seller_id, set()).add(property_id)
+        return dict(zip(AVAILABILITY_COLUMNS, row))
+
+    def _save_batch(self, property_id: str, seller_id: str,
+                    slots: Sequence[Tuple[datetime, datetime]]) -> List[Optional[dict]]:
+        # Called with the lock held; raises before changing anything
+        property_id, seller_id = _uuid(property_id), _uuid(seller_id)
+        if self.merge_tolerance is not None:
+            return self._merge_slots(property_id, seller_id, naive_utc_intervals(slots))
+        slots = self._check_slots(slots)
+        now = _now()
+        results = [self._insert(property_id, seller_id, start_time, end_time, now)
+                   for start_time, end_time in slots]
+        self._index(property_id).revision += 1
+        return results
+
+    def _merge_slots(self, property_id: str, seller_id: str,
+                     incoming: Sequence[Tuple[datetime, datetime]]) -> List[Optional[dict]]:
+        """
+        Coalesce slots with the seller's stored intervals for a property
+        Same contract as AvailabilityManager._merge_slots
+        """
+        tolerance = self.merge_tolerance
+        index = self._index(property_id)
+        span_start = min(start_time for start_time, _ in incoming) - tolerance
+        span_end = max(end_time for _, end_time in incoming) + tolerance
+        existing = index.window(span_start, span_end, seller_id, touching=True)
+
+        plan = plan_merge([(row[0], row[3], row[4]) for row in existing], incoming, tolerance, MAX_SLOT_LENGTH)
+        delete_ids = set(plan.delete_ids)
+        records = {}
+        for row in existing:
+            if row[0] in delete_ids:
+                index.remove(row)
+            else:
+                records[(row[3], row[4])] = dict(zip(AVAILABILITY_COLUMNS, row))
+        now = _now()
+        for start_time, end_time in plan.inserts:
+            records[(start_time, end_time)] = self._insert(property_id, seller_id, start_time, end_time, now)
+        index.revision += 1
+
+        previous = normalize_intervals((row[3], row[4]) for row in existing)
+        return [records[interval] if interval is not None else None
+                for interval in merge_results(previous, plan.merged, incoming)]
+
+    def save_availability(self, property_id: str, seller_id: str,
+                          start_time: datetime, end_time: datetime) -> Optional[dict]:
+        """
+        Save a new availability slot for a property
+        Returns the created record, or None if the seller already has it
+        """
+        results = self.save_availability_batch(property_id, seller_id, [(start_time, end_time)])
+        return results[0] if results else None
+
+    def save_availability_batch(self, property_id: str, seller_id: str,
+                                slots: Sequence[Tuple[datetime, datetime]]) -> Optional[List[Optional[dict]]]:
+        """
+        Save many availability slots for a property at once
+        Returns one entry per slot in input order: the created record, or None
+        if the slot already exists. Returns None if the batch failed.
+        """
+        if not slots:
+            return []
+        try:
+            with self._lock:
+                return self._save_batch(property_id, seller_id, slots)
+        except Exception as e:
+            logger.error(f"Error saving availability batch: {e}")
+            return None
+
+    def save_availability_groups(self, writes: Sequence[Tuple[str, str, Sequence[Tuple[datetime, datetime]]]]
+                                 ) -> List[Optional[List[Optional[dict]]]]:
+        """
+        Save several (property_id, seller_id, slots) writes in order
+        Returns one save_availability_batch result per write; a bad write
+        fails on its own, as after AvailabilityManager's one-by-one retry
+        """
+        with self._lock:
+            return [self.save_availability_batch(property_id, seller_id, slots)
+                    for property_id, seller_id, slots in writes]
+
+    def get_property_availability_rows(self, property_id: str, seller_id: Optional[str] = None,
+                                       start_time: Optional[datetime] = None,
+                                       end_time: Optional[datetime] = None) -> List[tuple]:
+        """
+        Same as get_property_availability, but rows are plain tuples in
+        AVAILABILITY_COLUMNS order
+        """
+        try:
+            property_id = _uuid(property_id)
+            seller_id = _uuid(seller_id) if seller_id else None
+            start_time = naive_utc(start_time)
+            end_time = naive_utc(end_time)
+            with self._lock:
+                index = self._properties.get(property_id)
+                rows = index.window(start_time, end_time, seller_id) if index is not None else []
+                occurrences = self._rule_occurrences(start_time, end_time, [property_id], seller_id)
+            return merge_occurrences(rows, occurrences) if occurrences else rows
+        except Exception as e:
+            logger.error(f"Error getting availability: {e}")
+            return []
+
+    def get_availability_batch(self, property_ids: Optional[List[str]] = None,
+                               seller_id: Optional[str] = None,
+                               start_time: Optional[datetime] = None,
+                               end_time: Optional[datetime] = None) -> Optional[dict]:
+        """
+        Get availability for several properties, or all of a seller's, at once
+        Returns slots grouped by property ID. Every requested property
+        appears, with an empty list if it has no slots
+        """
+        if not property_ids and not seller_id:
+            return {}
+        try:
+            grouped = {property_id: [] for property_id in property_ids or []}
+            wanted = {_uuid(property_id) for property_id in property_ids} if property_ids else None
+            seller_id = _uuid(seller_id) if seller_id else None
+            start_time = naive_utc(start_time)
+            end_time = naive_utc(end_time)
+            with self._lock:
+                rows = {}
+                for property_id in sorted(wanted or self._seller_properties.get(seller_id, ())):
+                    index = self._properties.get(property_id)
+                    if index is not None:
+                        rows[property_id] = index.window(start_time, end_time, seller_id)
+                occurrences = self._rule_occurrences(start_time, end_time, wanted, seller_id)
+
+            by_property = {}
+            for occurrence in occurrences:
+                by_property.setdefault(occurrence[1], []).append(occurrence)
+            for property_id in sorted(set(rows) | set(by_property)):
+                property_rows = merge_occurrences(rows.get(property_id, []), by_property.get(property_id, []))
+                if property_rows or property_id in grouped:
+                    grouped[property_id] = [dict(zip(AVAILABILITY_COLUMNS, row)) for row in property_rows]
+            return grouped
+        except Exception as e:
+            logger.error(f"Error getting availability batch: {e}")
+            return None
+
+    def _matching_rules(self, window_start: datetime, window_end: datetime,
+                        property_ids: Optional[Iterable[str]] = None,
+                        seller_id: Optional[str] = None) -> List[dict]:
+        # Called with the lock held
+        property_ids = set(property_ids) if property_ids else None
+        first_date, last_date = rule_date_range(window_start, window_end)
+        return [
+            rule for rule in self._rules.values()
+            if rule['start_date'] <= last_date
+            and (rule['end_date'] is None or rule['end_date'] >= first_date)
+            and (property_ids is None or rule['property_id'] in property_ids)
+            and (seller_id is None or rule['seller_id'] == seller_id)
+        ]
+
+    def _rule_occurrences(self, start_time: Optional[datetime], end_time: Optional[datetime],
+                          property_ids: Optional[Iterable[str]] = None,
+                          seller_id: Optional[str] = None) -> List[tuple]:
+        """
+        Occurrences of the matching rules inside a read window, as tuples
+        """
+        window_start, window_end = rule_window(start_time, end_time, self.rule_horizon)
+        rules = self._matching_rules(window_start, window_end, property_ids, seller_id)
+        return expand_rules(rules, window_start, window_end) if rules else []
+
+    def match_viewings(self, buyer_availability: Sequence[Tuple[datetime, datetime]],
+                       property_ids: List[str],
+                       min_duration: timedelta = timedelta(minutes=30)) -> Optional[List[dict]]:
+        """
+        Slots when a buyer and each property's sellers are both free
+        Returns the matching properties ranked by earliest common start
+        """
+        windows = buyer_windows(buyer_availability)
+        if not windows or not property_ids:
+            return []
+        window_start, window_end = windows[0][0], windows[-1][1]
+        try:
+            property_ids = sorted({_uuid(property_id) for property_id in property_ids})
+            rows = []
+            with self._lock:
+                for property_id in property_ids:
+                    index = self._properties.get(property_id)
+                    if index is not None:
+                        rows.extend(row[1:5] for row in index.window(window_start, window_end))
+                occurrences = self._rule_occurrences(window_start, window_end, property_ids)
+            rows.extend(occurrence[1:5] for occurrence in occurrences)
+            return match_availability(windows, sorted(rows), min_duration)
+        except Exception as e:
+            logger.error(f"Error matching viewings: {e}")
+            return None
+
+    def iter_availability(self, property_id: Optional[str] = None,
+                          seller_id: Optional[str] = None,
+                          start_time: Optional[datetime] = None,
+                          end_time: Optional[datetime] = None,
+                          chunk_size: int = 2000) -> Iterator[dict]:
+        """
+        Stored slots as dicts, by property ID and start time
+        Matching rows are copied under the lock when iteration starts, so
+        later writes don't show up in the iteration
+        """
+        property_id = _uuid(property_id) if property_id else None
+        seller_id = _uuid(seller_id) if seller_id else None
+        start_time = naive_utc(start_time)
+        end_time = naive_utc(end_time)
+        with self._lock:
+            if property_id:
+                property_ids = [property_id]
+            elif seller_id:
+                property_ids = sorted(self._seller_properties.get(seller_id, ()))
+            else:
+                property_ids = sorted(self._properties)
+            rows = [row for candidate in property_ids if candidate in self._properties
+                    for row in self._properties[candidate].window(start_time, end_time, seller_id)]
+        for row in rows:
+            yield dict(zip(AVAILABILITY_COLUMNS, row))
+
+    def copy_availability_from(self, slots: Iterable[Tuple[str, str, datetime, datetime]],
+                               chunk_size: int = 50000,
+                               progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        Bulk-load (property_id, seller_id, start_time, end_time) slots
+        Same contract as AvailabilityManager.copy_availability_from: slots
+        are stored as given, duplicates skipped, a chunk at a time
+        """
+        slots = iter(slots)
+        totals = {"rows": 0, "inserted": 0, "duplicates": 0, "chunks": 0}
+        while True:
+            first = next(slots, None)
+            if first is None:
+                return totals
+            chunk = list(chain([first], islice(slots, chunk_size - 1)))
+            # Checked up front, so a bad slot fails its chunk as a whole, as in COPY
+            ids = [(_uuid(property_id), _uuid(seller_id)) for property_id, seller_id, _, _ in chunk]
+            times = self._check_slots((start_time, end_time) for _, _, start_time, end_time in chunk)
+            inserted = 0
+            with self._lock:
+                now = _now()
+                for (property_id, seller_id), (start_time, end_time) in zip(ids, times):
+                    if self._insert(property_id, seller_id, start_time, end_time, now) is not None:
+                        inserted += 1
+                for property_id in {property_id for property_id, _ in ids}:
+                    self._properties[property_id].revision += 1
+
+            totals["rows"] += len(chunk)
+            totals["inserted"] += inserted
+            totals["duplicates"] += len(chunk) - inserted
+            totals["chunks"] += 1
+            if progress is not None:
+                progress(dict(totals))
+
+    def get_property_version(self, property_id: str, seller_id: Optional[str] = None) -> Optional[str]:
+        """
+        Cheap version string for a property's availability
+        Changes whenever a slot or recurring rule of the property changes,
+        whichever seller's it is, and daily while the property has rules
+        """
+        try:
+            property_id = _uuid(property_id)
+            seller_id = _uuid(seller_id) if seller_id else None
+            with self._lock:
+                index = self._properties.get(property_id)
+                version = f"{self._instance}:{index.revision if index is not None else 0}"
+                if any(rule['property_id'] == property_id and (seller_id is None or rule['seller_id'] == seller_id)
+                       for rule in self._rules.values()):
+                    version += f":{rule_window(None, None)[0].date()}"
+            return version
+        except Exception as e:
+            logger.error(f"Error getting availability version: {e}")
+            return None
+
+    def get_property_snapshot(self, property_id: str, seller_id: Optional[str] = None,
+                              start_time: Optional[datetime] = None,
+                              end_time: Optional[datetime] = None) -> Optional[Tuple[str, List[tuple]]]:
+        """
+        get_property_version and get_property_availability_rows under one
+        hold of the lock, so no write lands between them; None if the read
+        failed
+        """
+        with self._lock:
+            version = self.get_property_version(property_id, seller_id)
+            if version is None:
+                return None
+            return version, self.get_property_availability_rows(property_id, seller_id, start_time, end_time)
+
+    def search_availability(self, start_time: datetime, end_time: datetime,
+                            min_duration: Optional[timedelta] = None,
+                            seller_id: Optional[str] = None,
+                            property_ids: Optional[List[str]] = None,
+                            limit: int = 50, offset: int = 0) -> Optional[dict]:
+        """
+        Find properties with availability in a time window
+        A slot qualifies when its overlap with the window lasts at least
+        min_duration, or covers the whole window if no min_duration is given.
+        Results are paged by property, ordered by property ID
+        """
+        try:
+            start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+            required = min_duration if min_duration is not None else end_time - start_time
+            seller_id = _uuid(seller_id) if seller_id else None
+            wanted = {_uuid(property_id) for property_id in property_ids} if property_ids else None
+
+            with self._lock:
+                occurrences = self._rule_occurrences(start_time, end_time, wanted, seller_id)
+                if wanted is not None:
+                    candidates = {property_id for property_id in wanted if property_id in self._properties}
+                elif seller_id:
+                    candidates = set(self._seller_properties.get(seller_id, ()))
+                else:
+                    candidates = set(self._properties)
+                candidates.update(occurrence[1] for occurrence in occurrences)
+                by_property = {}
+                for occurrence in occurrences:
+                    by_property.setdefault(occurrence[1], []).append(occurrence)
+
+                properties = []
+                skipped = 0
+                for property_id in sorted(candidates):
+                    index = self._properties.get(property_id)
+                    rows = index.window(start_time, end_time, seller_id) if index is not None else []
+                    rows = merge_occurrences(rows, by_property.get(property_id, []))
+                    intervals = []
+                    for row in rows:
+                        slot_start = max(row[3], start_time)
+                        slot_end = min(row[4], end_time)
+                        if slot_end - slot_start >= required:
+                            intervals.append({"id": row[0], "seller_id": row[2],
+                                              "start_time": slot_start, "end_time": slot_end})
+                    if not intervals:
+                        continue
+                    if skipped < offset:
+                        skipped += 1
+                        continue
+                    properties.append({"property_id": property_id, "intervals": intervals})
+                    # One extra property tells whether more pages exist
+                    if len(properties) > limit:
+                        break
+
+            return {
+                "properties": properties[:limit],
+                "limit": limit,
+                "offset": offset,
+                "has_more": len(properties) > limit
+            }
+        except Exception as e:
+            logger.error(f"Error searching availability: {e}")
+            return None
+
+    def delete_property_availability(self, property_id: str, seller_id: Optional[str] = None) -> dict:
+        """
+        Delete availability slots for a property
+        """
+        try:
+            property_id = _uuid(property_id)
+            seller_id = _uuid(seller_id) if seller_id else None
+            with self._lock:
+                index = self._properties.get(property_id)
+                deleted_count = 0
+                if index is not None:
+                    keep = [(key, row) for key, row in zip(index.keys, index.rows)
+                            if seller_id is not None and row[2] != seller_id]
+                    deleted_count = len(index.rows) - len(keep)
+                    index.keys = [key for key, _ in keep]
+                    index.rows = [row for _, row in keep]
+                    index.revision += 1
+            return {
+                "message": f"Deleted {deleted_count} availability slots",
+                "deleted_count": deleted_count
+            }
+        except Exception as e:
+            logger.error(f"Error deleting availability: {e}")
+            return {"error": str(e), "deleted_count": 0}
+
+    def replace_availability(self, property_id: str, seller_id: str,
+                             slots: Sequence[Tuple[datetime, datetime]]) -> dict:
+        """
+        Replace a seller's availability for a property with the given slots
+        Slots no longer submitted are deleted and new ones inserted;
+        unchanged ones keep their records
+        """
+        try:
+            property_id, seller_id = _uuid(property_id), _uuid(seller_id)
+            if self.merge_tolerance is not None:
+                slots = split_intervals(normalize_intervals(naive_utc_intervals(slots), self.merge_tolerance),
+                                        MAX_SLOT_LENGTH)
+            wanted = set(self._check_slots(slots))
+            with self._lock:
+                index = self._index(property_id)
+                stored = [row for row in index.rows if row[2] == seller_id]
+                deleted = [row for row in stored if (row[3], row[4]) not in wanted]
+                for row in deleted:
+                    index.remove(row)
+                now = _now()
+                inserted_count = sum(1 for start_time, end_time in sorted(wanted)
+                                     if self._insert(property_id, seller_id, start_time, end_time, now) is not None)
+                index.revision += 1
+
+            return {
+                "message": f"Added {inserted_count} and removed {len(deleted)} availability slots",
+                "inserted_count": inserted_count,
+                "deleted_count": len(deleted),
+                "unchanged_count": len(wanted) - inserted_count
+            }
+        except Exception as e:
+            logger.error(f"Error replacing availability: {e}")
+            return {"error": str(e), "inserted_count": 0, "deleted_count": 0, "unchanged_count": 0}
+
+    def _rule(self, property_id: str, seller_id: str, weekdays: List[int],
+              start_time: time, end_time: time, start_date: date,
+              end_date: Optional[date], exceptions: Sequence[date], timezone: str) -> dict:
+        # The availability_rules CHECK constraints, and a known time zone
+        if end_time <= start_time:
+            raise ValueError("end_time must be after start_time")
+        if end_date is not None and end_date < start_date:
+            raise ValueError("end_date must not be before start_date")
+        rule_timezone(timezone)
+        return {"property_id": property_id, "seller_id": seller_id, "weekdays": list(weekdays),
+                "start_time": start_time, "end_time": end_time, "timezone": timezone, "start_date": start_date,
+                "end_date": end_date, "exceptions": list(exceptions)}
+
+    def create_availability_rule(self, property_id: str, seller_id: str, weekdays: List[int],
+                                 start_time: time, end_time: time, start_date: date,
+                                 end_date: Optional[date] = None,
+                                 exceptions: Sequence[date] = (),
+                                 timezone: str = DEFAULT_RULE_TIMEZONE) -> Optional[dict]:
+        """
+        Create a weekly recurring availability rule for a property
+        Occurrences are never stored; reads expand them for the window asked for
+        """
+        try:
+            property_id, seller_id = _uuid(property_id), _uuid(seller_id)
+            rule = self._rule(property_id, seller_id, weekdays, start_time, end_time,
+                              start_date, end_date, exceptions, timezone)
+            now = _now()
+            rule.update(id=str(uuid.uuid4()), created_at=now, updated_at=now)
+            with self._lock:
+                self._rules[rule['id']] = rule
+                self._index(property_id).revision += 1
+            return rule_record({column: rule[column] for column in RULE_COLUMNS})
+        except Exception as e:
+            logger.error(f"Error creating availability rule: {e}")
+            return None
+
+    def get_availability_rules(self, property_id: Optional[str] = None,
+                               seller_id: Optional[str] = None) -> Optional[List[dict]]:
+        """
+        List the recurring rules of a property and/or a seller
+        """
+        try:
+            property_id = _uuid(property_id) if property_id else None
+            seller_id = _uuid(seller_id) if seller_id else None
+            with self._lock:
+                rules = [rule for rule in self._rules.values()
+                         if (property_id is None or rule['property_id'] == property_id)
+                         and (seller_id is None or rule['seller_id'] == seller_id)]
+            rules.sort(key=lambda rule: (rule['property_id'], rule['start_date'], rule['start_time']))
+            return [rule_record({column: rule[column] for column in RULE_COLUMNS}) for rule in rules]
+        except Exception as e:
+            logger.error(f"Error getting availability rules: {e}")
+            return None
+
+    def update_availability_rule(self, rule_id: str, weekdays: List[int],
+                                 start_time: time, end_time: time, start_date: date,
+                                 end_date: Optional[date] = None,
+                                 exceptions: Sequence[date] = (),
+                                 timezone: str = DEFAULT_RULE_TIMEZONE) -> Optional[dict]:
+        """
+        Replace the pattern, dates and exceptions of a rule
+        Returns None if the rule doesn't exist or the update failed
+        """
+        try:
+            rule_id = _uuid(rule_id)
+            with self._lock:
+                rule = self._rules.get(rule_id)
+                if rule is None:
+                    return None
+                rule.update(self._rule(rule['property_id'], rule['seller_id'], weekdays, start_time, end_time,
+                                       start_date, end_date, exceptions, timezone), updated_at=_now())
+                self._index(rule['property_id']).revision += 1
+                return rule_record({column: rule[column] for column in RULE_COLUMNS})
+        except Exception as e:
+            logger.error(f"Error updating availability rule: {e}")
+            return None
+
+    def delete_availability_rule(self, rule_id: str) -> dict:
+        """
+        Delete a recurring rule, and with it every occurrence it produced
+        """
+        try:
+            rule_id = _uuid(rule_id)
+            with self._lock:
+                deleted = self._rules.pop(rule_id, None)
+                if deleted is not None:
+                    self._index(deleted['property_id']).revision += 1
+            return {
+                "message": f"Deleted {1 if deleted else 0} availability rules",
+                "deleted_count": 1 if deleted else 0
+            }
+        except Exception as e:
+            logger.error(f"Error deleting availability rule: {e}")
+            return {"error": str(e), "deleted_count": 0}
+
+    def get_bitmap_grid(self, property_ids: List[str], start_date: date, days: int,
+                        seller_id: Optional[str] = None) -> Optional[BitmapGrid]:
+        """
+        Slot bitmaps of properties over days starting at start_date
+        Built from the slots on every call, so nothing has to be kept in step
+        """
+        try:
+            window_start = datetime.combine(start_date, time())
+            window_end = window_start + timedelta(days=days)
+            seller_id = _uuid(seller_id) if seller_id else None
+            grid = BitmapGrid(property_ids, start_date, days)
+            with self._lock:
+                rows = {}
+                for property_id in property_ids:
+                    index = self._properties.get(_uuid(property_id))
+                    if index is not None:
+                        rows[property_id] = [row[2:5] for row in index.window(window_start, window_end, seller_id)]
+                occurrences = self._rule_occurrences(window_start, window_end,
+                                                     [_uuid(property_id) for property_id in property_ids], seller_id)
+
+            # Per seller, as the stored bitmaps are
+            for property_id, property_rows in rows.items():
+                for _, day, mask in seller_bitmaps(property_rows):
+                    grid.add(property_id, day, mask)
+            by_property = {}
+            for occurrence in occurrences:
+                by_property.setdefault(occurrence[1], []).append((occurrence[3], occurrence[4]))
+            for property_id, intervals in by_property.items():
+                grid.add_intervals(property_id, intervals)
+            return grid
+        except Exception as e:
+            logger.error(f"Error loading availability bitmaps: {e}")
+            return None
+
+    def create_test_data(self) -> dict:
+        """
+        Create test property and seller IDs
+        Nothing is stored until slots are saved for them
+        """
+        seller_id = str(uuid.uuid4())
+        property_id = str(uuid.uuid4())
+        return {
+            "message": "Test data created successfully",
+            "property": {"id": property_id, "name": f"Test Property {property_id[:8]}"},
+            "seller": {"id": seller_id, "name": f"Test Seller {seller_id[:8]}"}
+        }
@@ -0,0 +1,231 @@
+import json
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from psycopg2 import extensions
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+
+
+def start_db_tracking():
+    """
+    Reset the per-thread database time and query counters
+    """
+    _local.db_time = 0.0
+    _local.db_queries = 0
+
+
+def db_stats() -> Tuple[float, int]:
+    """
+    Database time in seconds and query count since start_db_tracking()
+    """
+    return getattr(_local, 'db_time', 0.0), getattr(_local, 'db_queries', 0)
+
+
+def record_query(duration: float):
+    _local.db_time = getattr(_local, 'db_time', 0.0) + duration
+    _local.db_queries = getattr(_local, 'db_queries', 0) + 1
+
+
+@lru_cache(maxsize=None)
+def timed_cursor_class(base):
+    """
+    Subclass of a psycopg2 cursor class that reports every statement it runs
+    """
+    class TimedCursor(base):
+        def execute(self, query, vars=None):
+            started = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                record_query(time.perf_counter() - started)
+
+        def executemany(self, query, vars_list):
+            started = time.perf_counter()
+            try:
+                return super().executemany(query, vars_list)
+            finally:
+                record_query(time.perf_counter() - started)
+
+        def copy_expert(self, sql, file, size=8192):
+            started = time.perf_counter()
+            try:
+                return super().copy_expert(sql, file, size)
+            finally:
+                record_query(time.perf_counter() - started)
+
+    TimedCursor.__name__ = f"Timed{base.__name__}"
+    TimedCursor.__qualname__ = TimedCursor.__name__
+    return TimedCursor
+
+
+class InstrumentedConnection(extensions.connection):
+    """
+    psycopg2 connection whose cursors time their statements
+
+    Pass as connection_factory to psycopg2.connect (or the pool); whatever
+    cursor_factory a caller asks for is wrapped with timed_cursor_class.
+    """
+
+    def cursor(self, *args, **kwargs):
+        if len(args) < 2:
+            factory = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+            kwargs['cursor_factory'] = timed_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class RequestMetrics:
+    """
+    Per-request instrumentation for a Flask app
+
+    Each request produces at most one structured log line (route, status,
+    latency, database time and query count), sampled at sample_rate; server
+    errors are always logged. Latency histograms are aggregated per route
+    and rendered in Prometheus text format by render().
+    """
+
+    def __init__(self, sample_rate: float = 1.0, logger: Optional[logging.Logger] = None):
+        self.sample_rate = sample_rate
+        self.logger = logger or logging.getLogger('requests')
+        self._lock = threading.Lock()
+        self._latency: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._db_time: Dict[Tuple[str, str], List[float]] = {}
+        self._responses: Dict[Tuple[str, str, int], int] = {}
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        from flask import g
+        g.request_started = time.perf_counter()
+        start_db_tracking()
+
+    def _after_request(self, response):
+        from flask import g, request
+        started = getattr(g, 'request_started', None)
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        db_time, db_queries = db_stats()
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        self.observe(request.method, route, response.status_code, duration, db_time, db_queries)
+
+        if response.status_code >= 500 or random.random() < self.sample_rate:
+            self.logger.info(json.dumps({
+                "event": "request",
+                "method": request.method,
+                "route": route,
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 2),
+                "db_time_ms": round(db_time * 1000, 2),
+                "db_queries": db_queries
+            }))
+        return response
+
+    def observe(self, method: str, route: str, status: int, duration: float,
+                db_time: float = 0.0, db_queries: int = 0):
+        key = (method, route)
+        with self._lock:
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = LatencyHistogram()
+            histogram.observe(duration)
+            db = self._db_time.setdefault(key, [0.0, 0])
+            db[0] += db_time
+            db[1] += db_queries
+            self._responses[(method, route, status)] = self._responses.get((method, route, status), 0) + 1
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition of the aggregated request metrics
+        """
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            latency = {key: (list(h.counts), h.total, h.count) for key, h in self._latency.items()}
+            db_time = {key: tuple(value) for key, value in self._db_time.items()}
+            responses = dict(self._responses)
+
+        for (method, route), (counts, total, count) in sorted(latency.items()):
+            labels = f'method="{method}",route="{_escape(route)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {total}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {count}')
+
+        lines += [
+            "# HELP http_requests_total Responses by route and status",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(responses.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP http_request_db_seconds_total Database time spent serving requests",
+            "# TYPE http_request_db_seconds_total counter",
+        ]
+        for (method, route), (seconds, _) in sorted(db_time.items()):
+            lines.append(f'http_request_db_seconds_total{{method="{method}",route="{_escape(route)}"}} {seconds}')
+        lines += [
+            "# HELP http_request_db_queries_total Database statements run while serving requests",
+            "# TYPE http_request_db_queries_total counter",
+        ]
+        for (method, route), (_, queries) in sorted(db_time.items()):
+            lines.append(f'http_request_db_queries_total{{method="{method}",route="{_escape(route)}"}} {queries}')
+
+        return "\n".join(lines) + "\n"
+
+
+def render_gauges(name: str, help_text: str, values: Dict[str, float], labels: str = "") -> str:
+    """
+    Prometheus lines for a family of gauges, one per key in values
+    """
+    return render_gauge_family(name, help_text, [(labels, values)])
+
+
+def render_gauge_family(name: str, help_text: str, samples: Iterable[Tuple[str, Dict[str, float]]]) -> str:
+    """
+    Prometheus lines for a family of gauges reported per label set, e.g. per
+    pool: the HELP and TYPE lines once, then one gauge per key of each
+    (labels, values) pair, since the format allows a family's header once
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, values in samples:
+        for key, value in sorted(values.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            label_set = f'{labels},stat="{key}"' if labels else f'stat="{key}"'
+            lines.append(f"{name}{{{label_set}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,226 @@
+"""
+Monthly partition maintenance for the availability table
+
+availability is range-partitioned on start_time, one partition per calendar
+month (availability_YYYY_MM) plus availability_default for anything no
+monthly partition covers. Run this from cron, e.g. daily:
+
+    python -m models.partitions ensure --months-ahead 3
+    python -m models.partitions expire --retention-months 12 --mode archive
+
+ensure creates the coming months' partitions before rows arrive for them;
+expire takes months older than the retention period out of the table:
+detach leaves each as a standalone table, archive moves it to the
+availability_archive schema and drop deletes it. See
+migrations/partition_availability.sql for the one-off conversion.
+"""
+
+import argparse
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional
+
+from psycopg2 import sql
+
+from models.pool import ConnectionPool, get_pool
+
+logger = logging.getLogger(__name__)
+
+# Longest slot the availability_slot_length CHECK allows. A slot overlapping a
+# window therefore starts less than this long before it, which gives window
+# reads a lower bound on start_time to prune partitions with
+MAX_SLOT_LENGTH = timedelta(days=31)
+
+DEFAULT_PARTITION = 'availability_default'
+ARCHIVE_SCHEMA = 'availability_archive'
+EXPIRE_MODES = ('detach', 'archive', 'drop')
+
+_PARTITION_NAME = re.compile(r'^availability_(\d{4})_(\d{2})$')
+_MAINTENANCE_LOCK = 'availability partition maintenance'
+_COLUMNS = ('id', 'property_id', 'seller_id', 'start_time', 'end_time', 'created_at', 'updated_at')
+
+
+def min_slot_start(window_start: datetime) -> datetime:
+    """
+    Earliest start_time of a slot that can overlap a window beginning at
+    window_start; filtering on it lets Postgres skip older partitions
+    """
+    return window_start - MAX_SLOT_LENGTH
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"availability_{month:%Y_%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """First day of the month a partition holds, None for other tables"""
+    match = _PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+class PartitionManager:
+    def __init__(self, db_connection_string, pool: Optional[ConnectionPool] = None,
+                 lock_timeout: str = '5s'):
+        self.conn_string = db_connection_string
+        self.pool = pool or get_pool(db_connection_string)
+        # Attaching and detaching lock the parent table; give up rather than
+        # queue every read behind a long-running query
+        self.lock_timeout = lock_timeout
+
+    def _get_connection(self):
+        return self.pool.connection()
+
+    def _lock(self, cur):
+        # One maintenance run at a time, whichever host or worker starts it
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (_MAINTENANCE_LOCK,))
+        cur.execute("SELECT set_config('lock_timeout', %s, true)", (self.lock_timeout,))
+
+    def list_partitions(self) -> List[dict]:
+        """
+        Partitions attached to availability, oldest first, with the month each
+        holds (None for the default partition) and the planner's row estimate
+        """
+        with self._get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+                    FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = 'availability'::regclass
+                """)
+                partitions = [
+                    {"name": name, "month": partition_month(name), "bound": bound, "rows": max(rows, 0)}
+                    for name, bound, rows in cur.fetchall()
+                ]
+        return sorted(partitions, key=lambda partition: (partition["month"] is None, partition["month"] or date.min))
+
+    def ensure_partitions(self, months_ahead: int = 3, today: Optional[date] = None) -> List[str]:
+        """
+        Create the partitions for this month and the next months_ahead
+        Rows already sitting in the default partition for a new month are moved
+        into it. Returns the names of the partitions created
+        """
+        today = today or datetime.now(timezone.utc).date()
+        existing = {partition["month"] for partition in self.list_partitions()}
+        created = []
+        for offset in range(months_ahead + 1):
+            month = add_months(month_start(today), offset)
+            if month not in existing:
+                self._create_partition(month)
+                created.append(partition_name(month))
+        return created
+
+    def _create_partition(self, month: date):
+        """
+        Build a month's partition as a standalone table and attach it, which
+        only needs a SHARE UPDATE EXCLUSIVE lock on availability where
+        CREATE TABLE ... PARTITION OF would block reads
+        """
+        name = partition_name(month)
+        lower = datetime.combine(month, datetime.min.time())
+        upper = datetime.combine(add_months(month, 1), datetime.min.time())
+        columns = sql.SQL(', ').join(map(sql.Identifier, _COLUMNS))
+        with self._get_connection() as conn:
+            with conn.cursor() as cur:
+                self._lock(cur)
+                cur.execute(sql.SQL("""
+                    CREATE TABLE {name}
+                    (LIKE availability INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+                """).format(name=sql.Identifier(name)))
+                # Attaching fails while the default partition holds rows for
+                # the month, so take them over first
+                cur.execute(sql.SQL("""
+                    WITH moved AS (
+                        DELETE FROM {default}
+                        WHERE start_time >= %s AND start_time < %s
+                        RETURNING {columns}
+                    )
+                    INSERT INTO {name} ({columns})
+                    SELECT {columns} FROM moved
+                """).format(default=sql.Identifier(DEFAULT_PARTITION), name=sql.Identifier(name),
+                            columns=columns), (lower, upper))
+                moved = cur.rowcount
+                cur.execute(sql.SQL("ALTER TABLE availability ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)")
+                            .format(name=sql.Identifier(name)), (lower, upper))
+        logger.info(f"Created partition {name}" + (f", moving {moved} rows from {DEFAULT_PARTITION}" if moved else ""))
+
+    def expire_partitions(self, retention_months: int, mode: str = 'detach',
+                          today: Optional[date] = None) -> List[str]:
+        """
+        Take partitions for months ending more than retention_months ago out
+        of availability. mode is one of EXPIRE_MODES; the stored bitmaps of
+        their days are deleted with them. Returns the names of the expired
+        partitions
+        """
+        if mode not in EXPIRE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(EXPIRE_MODES)}")
+        if retention_months < 0:
+            raise ValueError("retention_months must not be negative")
+        today = today or datetime.now(timezone.utc).date()
+        cutoff = add_months(month_start(today), -retention_months)
+
+        expired = []
+        for partition in self.list_partitions():
+            month = partition["month"]
+            if month is None or add_months(month, 1) > cutoff:
+                continue
+            name = sql.Identifier(partition["name"])
+            # One transaction per partition keeps each lock on availability short
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    self._lock(cur)
+                    cur.execute(sql.SQL("ALTER TABLE availability DETACH PARTITION {name}").format(name=name))
+                    if mode == 'drop':
+                        cur.execute(sql.SQL("DROP TABLE {name}").format(name=name))
+                    elif mode == 'archive':
+                        cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {schema}")
+                                    .format(schema=sql.Identifier(ARCHIVE_SCHEMA)))
+                        cur.execute(sql.SQL("ALTER TABLE {name} SET SCHEMA {schema}")
+                                    .format(name=name, schema=sql.Identifier(ARCHIVE_SCHEMA)))
+                    cur.execute("DELETE FROM availability_bitmaps WHERE day < %s", (add_months(month, 1),))
+            logger.info(f"Expired partition {partition['name']} ({mode})")
+            expired.append(partition["name"])
+        return expired
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_URL', ''),
+                        help='database to maintain (default: $DATABASE_URL, else the libpq PG* variables)')
+    parser.add_argument('--lock-timeout', default='5s')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='show the attached partitions')
+    ensure = commands.add_parser('ensure', help='create partitions for the coming months')
+    ensure.add_argument('--months-ahead', type=int, default=3)
+    expire = commands.add_parser('expire', help='detach, archive or drop old partitions')
+    expire.add_argument('--retention-months', type=int, required=True)
+    expire.add_argument('--mode', choices=EXPIRE_MODES, default='detach')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    manager = PartitionManager(args.dsn, pool=ConnectionPool(args.dsn, min_size=0, max_size=1),
+                               lock_timeout=args.lock_timeout)
+    if args.command == 'list':
+        for partition in manager.list_partitions():
+            print(f"{partition['name']:<28} {partition['rows']:>12}  {partition['bound']}")
+    elif args.command == 'ensure':
+        created = manager.ensure_partitions(args.months_ahead)
+        print(f"Created {len(created)} partitions" + (f": {', '.join(created)}" if created else ""))
+    else:
+        expired = manager.expire_partitions(args.retention_months, args.mode)
+        print(f"Expired {len(expired)} partitions" + (f": {', '.join(expired)}" if expired else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out before the timeout"""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections
+
+    Connections are handed out LIFO so the hottest ones get reused, checked
+    for health before they are returned to a caller, and recycled once they
+    are older than max_age seconds.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10,
+                 max_age: float = 1800.0, max_idle: float = 300.0,
+                 checkout_timeout: float = 30.0, health_check_interval: float = 30.0,
+                 **connect_kwargs):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition(threading.Lock())
+        # Idle entries are [connection, created_at, last_used_at]
+        self._idle = []
+        self._created = {}
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+
+        self._stats = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        with self._cond:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception as e:
+            logger.warning(f"Error closing pooled connection: {e}")
+        with self._cond:
+            self._stats["connections_closed"] += 1
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        # Only ping connections that have been sitting idle for a while, so
+        # hot connections don't pay an extra round-trip on every checkout
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def warm(self):
+        """
+        Open connections until the pool holds at least min_size
+        """
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            now = time.monotonic()
+            with self._cond:
+                self._created[id(conn)] = now
+                self._idle.append([conn, now, now])
+                self._cond.notify()
+
+    def getconn(self, timeout: Optional[float] = None):
+        """
+        Check out a healthy connection, waiting up to timeout seconds
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        entry = None
+
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"Timed out after {timeout}s waiting for a connection "
+                        f"({self._in_use} in use, max_size={self.max_size})"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            wait_time = time.monotonic() - started
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+            self._stats["wait_time_total"] += wait_time
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+
+        try:
+            if entry is not None:
+                conn, created_at, last_used = entry
+                if time.monotonic() - created_at > self.max_age:
+                    self._close(conn)
+                    with self._cond:
+                        self._stats["recycled"] += 1
+                        self._created.pop(id(conn), None)
+                    entry = None
+                elif not self._is_healthy(conn, last_used):
+                    logger.warning("Discarding unhealthy pooled connection")
+                    self._close(conn)
+                    with self._cond:
+                        self._stats["health_check_failures"] += 1
+                        self._created.pop(id(conn), None)
+                    entry = None
+                else:
+                    return conn
+
+            conn = self._connect()
+            with self._cond:
+                self._created[id(conn)] = time.monotonic()
+            return conn
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, discard: bool = False):
+        """
+        Return a connection to the pool, closing it if it can't be reused
+        """
+        now = time.monotonic()
+        with self._cond:
+            created_at = self._created.get(id(conn), now)
+
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        expired = now - created_at > self.max_age
+        with self._cond:
+            self._in_use -= 1
+            keep = not (discard or conn.closed or expired or self._closed)
+            if keep:
+                self._idle.append([conn, created_at, now])
+                self._trim_idle(now)
+            else:
+                self._size -= 1
+                self._created.pop(id(conn), None)
+                if expired:
+                    self._stats["recycled"] += 1
+            self._cond.notify()
+
+        if not keep and not conn.closed:
+            self._close(conn)
+
+    def _trim_idle(self, now: float):
+        # Called with the lock held: close idle connections above min_size
+        # that have not been used for max_idle seconds
+        stale = []
+        while self._size > self.min_size and self._idle and now - self._idle[0][2] > self.max_idle:
+            conn = self._idle.pop(0)[0]
+            self._size -= 1
+            self._created.pop(id(conn), None)
+            stale.append(conn)
+        for conn in stale:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._stats["connections_closed"] += 1
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Borrow a connection for the duration of a with block
+
+        Like psycopg2's own connection context manager, the transaction is
+        committed on success and rolled back on error.
+        """
+        conn = self.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+            if not conn.closed:
+                conn.commit()
+        except Exception:
+            try:
+                if not conn.closed:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def clear(self):
+        """
+        Close every idle connection, e.g. after the server went away, so the
+        next checkouts connect afresh
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            for conn, _, _ in idle:
+                self._created.pop(id(conn), None)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def closeall(self):
+        """
+        Close every idle connection and refuse further checkouts
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of pool usage counters
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            })
+        checkouts = stats["checkouts"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / checkouts if checkouts else 0.0
+        return stats
+
+
+# One registry per process: gunicorn forks workers after import, and a
+# connection must never be shared across processes, so the registry is
+# reset whenever the pid changes.
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+def get_pool(dsn: str, **pool_kwargs) -> ConnectionPool:
+    """
+    Return the process-wide pool for dsn, creating it on first use
+    """
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(dsn)
+        if pool is None:
+            pool = ConnectionPool(dsn, **pool_kwargs)
+            _pools[dsn] = pool
+            logger.info(f"Created connection pool (min_size={pool.min_size}, max_size={pool.max_size})")
+        return pool
+
+
+def describe_dsn(dsn: str) -> str:
+    """
+    Render a DSN as user@host:port/dbname, leaving out any password
+    """
+    try:
+        params = extensions.parse_dsn(dsn)
+    except psycopg2.ProgrammingError:
+        return "<invalid dsn>"
+    return (f"{params.get('user', '')}@{params.get('host', '')}:"
+            f"{params.get('port', '5432')}/{params.get('dbname', '')}")
+
+
+def all_pool_stats() -> Dict[str, dict]:
+    """
+    Stats for every pool in this process, keyed by password-free DSN
+    """
+    with _pools_lock:
+        pools = dict(_pools) if _pools_pid == os.getpid() else {}
+    return {describe_dsn(dsn): pool.stats() for dsn, pool in pools.items()}
+
+
+def close_pools():
+    """
+    Close all pools owned by this process
+    """
+    with _pools_lock:
+        pools = list(_pools.values()) if _pools_pid == os.getpid() else []
+        _pools.clear()
+    for pool in pools:
+        pool.closeall()
@@ -0,0 +1,226 @@
+import hashlib
+import heapq
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from operator import itemgetter
+from typing import Any, Iterable, List, Mapping, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from models.intervals import naive_utc
+
+# How far ahead rules are expanded when a read gives no end to its window
+DEFAULT_RULE_HORIZON = timedelta(days=90)
+
+# Columns of availability_rules, in the order rule queries select them
+RULE_COLUMNS = ('id', 'property_id', 'seller_id', 'weekdays', 'start_time', 'end_time', 'timezone',
+                'start_date', 'end_date', 'exceptions', 'created_at', 'updated_at')
+
+# Time zone of rules that don't name one
+DEFAULT_RULE_TIMEZONE = 'UTC'
+
+
+def rule_timezone(name: str) -> ZoneInfo:
+    """
+    The IANA time zone a rule's wall-clock times are in. Raises ValueError
+    """
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        raise ValueError(f"Unknown time zone: {name!r}")
+
+
+def parse_rule(data: Mapping[str, Any]) -> dict:
+    """
+    Validate a rule submitted through the API
+    Weekdays are ISO numbers (1 = Monday ... 7 = Sunday), times "HH:MM" of
+    the wall clock in timezone (an IANA name, UTC if omitted) and dates
+    "YYYY-MM-DD"; endDate and exceptions are optional. Raises ValueError
+    """
+    weekdays = data.get('weekdays')
+    if not isinstance(weekdays, list) or not weekdays:
+        raise ValueError("weekdays must be a non-empty list of ISO weekday numbers (1 = Monday)")
+    if any(not isinstance(day, int) or isinstance(day, bool) or not 1 <= day <= 7 for day in weekdays):
+        raise ValueError("weekdays must be between 1 (Monday) and 7 (Sunday)")
+
+    try:
+        start_time = time.fromisoformat(data['startTime'])
+        end_time = time.fromisoformat(data['endTime'])
+        start_date = date.fromisoformat(data['startDate'])
+        end_date = date.fromisoformat(data['endDate']) if data.get('endDate') else None
+        exceptions = sorted({date.fromisoformat(day) for day in data.get('exceptions') or []})
+    except KeyError as e:
+        raise ValueError(f"Missing required field: {e.args[0]}")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid rule: {e}")
+
+    if start_time.tzinfo is not None or end_time.tzinfo is not None:
+        raise ValueError("startTime and endTime must not carry a UTC offset")
+    if end_time <= start_time:
+        raise ValueError("endTime must be after startTime")
+    if end_date is not None and end_date < start_date:
+        raise ValueError("endDate must not be before startDate")
+    timezone_name = data.get('timezone') or DEFAULT_RULE_TIMEZONE
+    rule_timezone(timezone_name)
+
+    return {
+        "weekdays": sorted(set(weekdays)),
+        "start_time": start_time,
+        "end_time": end_time,
+        "timezone": timezone_name,
+        "start_date": start_date,
+        "end_date": end_date,
+        "exceptions": exceptions,
+    }
+
+
+def rule_record(row: Mapping[str, Any]) -> dict:
+    """
+    JSON-ready dict for an availability_rules row
+    Times and dates are rendered as ISO strings, which jsonify can't do itself
+    """
+    record = dict(row)
+    for key in ('start_time', 'end_time', 'start_date', 'end_date'):
+        if record.get(key) is not None:
+            record[key] = record[key].isoformat()
+    record['exceptions'] = [day.isoformat() for day in record.get('exceptions') or []]
+    record['weekdays'] = list(record['weekdays'])
+    return record
+
+
+def rule_window(start_time: Optional[datetime], end_time: Optional[datetime],
+                horizon: timedelta = DEFAULT_RULE_HORIZON) -> Tuple[datetime, datetime]:
+    """
+    Range to expand rules over for a read window, as naive UTC timestamps
+    An open start expands from today (UTC) and an open end stops horizon after
+    the start, so unbounded reads stay bounded
+    """
+    if start_time is None:
+        today = datetime.now(timezone.utc).replace(tzinfo=None)
+        start_time = datetime.combine(today.date(), time())
+    else:
+        start_time = naive_utc(start_time)
+    end_time = start_time + horizon if end_time is None else naive_utc(end_time)
+    return start_time, end_time
+
+
+def rule_date_range(window_start: datetime, window_end: datetime) -> Tuple[date, date]:
+    """
+    Dates a rule must be active on to have an occurrence in a naive UTC
+    window, widened by a day each side since local dates can run a day
+    ahead of or behind UTC
+    """
+    return window_start.date() - timedelta(days=1), window_end.date() + timedelta(days=1)
+
+
+def local_to_utc(day: date, wall_time: time, zone: ZoneInfo) -> datetime:
+    """
+    Naive UTC timestamp of a wall-clock time on a day in zone
+    Times skipped or repeated by a DST change take the smaller UTC offset of
+    the two, as Postgres's AT TIME ZONE does
+    """
+    local = datetime.combine(day, wall_time)
+    offset = min(local.replace(tzinfo=zone, fold=fold).utcoffset() for fold in (0, 1))
+    return local - offset
+
+
+def _local_date(moment: datetime, zone: ZoneInfo) -> date:
+    return moment.replace(tzinfo=timezone.utc).astimezone(zone).date()
+
+
+def occurrence_id(rule_id: str, day: date) -> str:
+    """
+    Stable ID of a rule's occurrence on a day; same as occurrences_query's
+    """
+    return str(uuid.UUID(hashlib.md5(f"{rule_id}{day.isoformat()}".encode()).hexdigest()))
+
+
+def expand_rules(rules: Iterable[Mapping[str, Any]], window_start: datetime,
+                 window_end: datetime) -> List[tuple]:
+    """
+    Occurrences of rules overlapping a naive UTC window, as availability
+    tuples in AVAILABILITY_COLUMNS order, sorted by start time. Each rule's
+    days and times are those of its time zone, so an occurrence keeps its
+    wall-clock time across DST changes; only the local days inside the window
+    are visited
+    """
+    occurrences = []
+    for rule in rules:
+        zone = rule_timezone(rule['timezone'])
+        window_last = _local_date(window_end, zone)
+        first = max(rule['start_date'], _local_date(window_start, zone))
+        last = min(rule['end_date'] or window_last, window_last)
+        weekdays = set(rule['weekdays'])
+        exceptions = set(rule['exceptions'] or ())
+        rule_id = str(rule['id'])
+        day = first
+        while day <= last:
+            if day.isoweekday() in weekdays and day not in exceptions:
+                start_time = local_to_utc(day, rule['start_time'], zone)
+                end_time = local_to_utc(day, rule['end_time'], zone)
+                if end_time > window_start and start_time < window_end:
+                    occurrences.append((occurrence_id(rule_id, day), rule['property_id'], rule['seller_id'],
+                                        start_time, end_time, rule['created_at'], rule['updated_at']))
+            day += timedelta(days=1)
+    occurrences.sort(key=itemgetter(3))
+    return occurrences
+
+
+def merge_occurrences(rows: Sequence[tuple], occurrences: Sequence[tuple]) -> List[tuple]:
+    """
+    Merge rule occurrences into availability tuples, both sorted by start time
+    An occurrence the seller also stored as a one-off slot is dropped
+    """
+    if not occurrences:
+        return list(rows)
+    stored = {(row[2], row[3], row[4]) for row in rows}
+    occurrences = [row for row in occurrences if (row[2], row[3], row[4]) not in stored]
+    return list(heapq.merge(rows, occurrences, key=itemgetter(3)))
+
+
+def occurrences_query(window_start: str = '%s', window_end: str = '%s', filters: str = '') -> str:
+    """
+    SELECT of rule occurrences shaped like availability rows
+    window_start/window_end are the driver's placeholders for the expansion
+    range, filters extra conditions on the rules (alias r) whose parameters
+    follow the window's. Only the rule's local days inside the window are
+    generated, each occurrence is converted from the rule's time zone to
+    naive UTC, and an occurrence already stored as a one-off slot is left to
+    that slot. This is the SQL twin of expand_rules for queries that page or
+    aggregate in SQL.
+    """
+    return f"""
+        SELECT md5(r.id::text || days.day::date::text)::uuid AS id,
+               r.property_id, r.seller_id,
+               o.start_time, o.end_time,
+               r.created_at, r.updated_at
+        FROM (SELECT {window_start}::timestamp AS window_start,
+                     {window_end}::timestamp AS window_end) w
+        JOIN availability_rules r
+          ON r.start_date <= w.window_end::date + 1
+         AND (r.end_date IS NULL OR r.end_date >= w.window_start::date - 1)
+        CROSS JOIN LATERAL (
+            SELECT (w.window_start AT TIME ZONE 'UTC' AT TIME ZONE r.timezone)::date AS first_day,
+                   (w.window_end AT TIME ZONE 'UTC' AT TIME ZONE r.timezone)::date AS last_day
+        ) l
+        CROSS JOIN LATERAL generate_series(
+            GREATEST(r.start_date, l.first_day)::timestamp,
+            LEAST(COALESCE(r.end_date, l.last_day), l.last_day)::timestamp,
+            interval '1 day'
+        ) AS days (day)
+        CROSS JOIN LATERAL (
+            SELECT (days.day::date + r.start_time) AT TIME ZONE r.timezone AT TIME ZONE 'UTC' AS start_time,
+                   (days.day::date + r.end_time) AT TIME ZONE r.timezone AT TIME ZONE 'UTC' AS end_time
+        ) o
+        WHERE extract(isodow FROM days.day)::smallint = ANY(r.weekdays)
+          AND NOT days.day::date = ANY(r.exceptions)
+          AND o.end_time > w.window_start
+          AND o.start_time < w.window_end
+          AND NOT EXISTS (
+              SELECT 1 FROM availability a
+              WHERE a.property_id = r.property_id
+                AND a.seller_id = r.seller_id
+                AND a.start_time = o.start_time
+                AND a.end_time = o.end_time
+          )
+          {filters}
+    """
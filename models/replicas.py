@@ -0,0 +1,226 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+
+import psycopg2
+
+from models.pool import PoolTimeout, describe_dsn, get_pool
+
+logger = logging.getLogger(__name__)
+
+# Seconds a replica's replay is behind the primary; 0 when it has replayed
+# everything it received, NULL before it has replayed anything at all
+_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+class _Replica:
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        # Unchecked replicas take no reads until the first check passes
+        self.healthy = False
+        self.lag = None
+        self.checked_at = None
+        self.reads = 0
+        self.failures = 0
+
+
+class ReplicaRouter:
+    """
+    Sends reads to read replicas, keeping them off lagging or dead ones
+
+    Reads are spread round-robin over the replicas whose last health check
+    passed. A background thread checks each one every health_check_interval
+    seconds and takes it out of rotation when it can't be reached or its
+    replay is more than max_lag seconds behind; a connection error during a
+    read does the same until the next check. Keys passed to pin() are read
+    from the primary for pin_seconds afterwards, so whoever wrote them reads
+    their own writes, and with no healthy replica every read goes to the
+    primary.
+
+    Pools come from get_pool, and the checker thread and pins are per
+    process, so a router created before a fork works in every worker.
+    """
+
+    def __init__(self, primary_dsn: str, replica_dsns: Iterable[str], pool_kwargs: Optional[dict] = None,
+                 max_lag: float = 2.0, pin_seconds: float = 5.0,
+                 health_check_interval: float = 5.0, max_pins: int = 10000):
+        if max_lag < 0 or pin_seconds <= max_lag:
+            # A pin shorter than the tolerated lag could expire before the
+            # write reaches the replica serving the next read
+            raise ValueError(f"pin_seconds ({pin_seconds}) must exceed max_lag ({max_lag})")
+        self.primary_dsn = primary_dsn
+        self.replica_dsns = [dsn for dsn in replica_dsns if dsn]
+        self.pool_kwargs = dict(pool_kwargs or {})
+        self.max_lag = max_lag
+        self.pin_seconds = pin_seconds
+        self.health_check_interval = health_check_interval
+        self.max_pins = max_pins
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pid = None
+        self._replicas: List[_Replica] = []
+        # Key -> monotonic time its pin expires, oldest first
+        self._pins = OrderedDict()
+        self._next = 0
+        self._primary_reads = 0
+        self._pinned_reads = 0
+
+    def _pool(self, dsn: str):
+        return get_pool(dsn, **self.pool_kwargs)
+
+    def _start(self):
+        # Called with the lock held; like the pools, replica state and the
+        # checker thread don't survive a fork
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._replicas = [_Replica(dsn) for dsn in self.replica_dsns]
+            self._pins = OrderedDict()
+            self._next = 0
+            if self._replicas:
+                threading.Thread(target=self._run, name='replica-health-check', daemon=True).start()
+
+    def _run(self):
+        while True:
+            for replica in list(self._replicas):
+                self._check(replica)
+            if self._stop.wait(self.health_check_interval):
+                return
+
+    def _check(self, replica: _Replica):
+        try:
+            with self._pool(replica.dsn).connection(timeout=self.health_check_interval) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(_LAG_QUERY)
+                    lag = cur.fetchone()[0]
+            lag = float(lag) if lag is not None else None
+            healthy = lag is not None and lag <= self.max_lag
+            reason = f"replay lag {lag if lag is not None else 'unknown'}s over {self.max_lag}s"
+        except (psycopg2.Error, PoolTimeout) as e:
+            lag, healthy, reason = None, False, str(e).strip()
+            if isinstance(e, psycopg2.OperationalError):
+                self._pool(replica.dsn).clear()
+        with self._lock:
+            was_healthy = replica.healthy
+            replica.healthy, replica.lag, replica.checked_at = healthy, lag, time.monotonic()
+            if not healthy:
+                replica.failures += 1
+        if healthy != was_healthy:
+            if healthy:
+                logger.info(f"Replica {describe_dsn(replica.dsn)} back in rotation")
+            else:
+                logger.warning(f"Replica {describe_dsn(replica.dsn)} out of rotation: {reason}")
+
+    def _mark_down(self, replica: _Replica, error: Exception):
+        with self._lock:
+            was_healthy = replica.healthy
+            replica.healthy = False
+            replica.failures += 1
+        # Its other idle connections most likely died with this one
+        self._pool(replica.dsn).clear()
+        if was_healthy:
+            logger.warning(f"Replica {describe_dsn(replica.dsn)} out of rotation: {str(error).strip()}")
+
+    def pin(self, *keys: str):
+        """Read keys from the primary for the next pin_seconds"""
+        expires = time.monotonic() + self.pin_seconds
+        with self._lock:
+            self._start()
+            for key in keys:
+                if key is None:
+                    continue
+                self._pins.pop(key, None)
+                self._pins[key] = expires
+            while len(self._pins) > self.max_pins:
+                self._pins.popitem(last=False)
+
+    def is_pinned(self, *keys: Optional[str]) -> bool:
+        """Whether any of keys was written through this process within pin_seconds"""
+        with self._lock:
+            self._start()
+            return self._is_pinned(keys)
+
+    def _is_pinned(self, keys) -> bool:
+        # Called with the lock held
+        now = time.monotonic()
+        while self._pins and next(iter(self._pins.values())) <= now:
+            self._pins.popitem(last=False)
+        return any(key in self._pins for key in keys if key is not None)
+
+    def _choose(self, keys) -> Optional[_Replica]:
+        with self._lock:
+            self._start()
+            if self._is_pinned(keys):
+                self._pinned_reads += 1
+                return None
+            for offset in range(len(self._replicas)):
+                replica = self._replicas[(self._next + offset) % len(self._replicas)]
+                if replica.healthy:
+                    self._next = (self._next + offset + 1) % len(self._replicas)
+                    replica.reads += 1
+                    return replica
+            self._primary_reads += 1
+            return None
+
+    @contextmanager
+    def connection(self, keys: Iterable[Optional[str]] = ()):
+        """
+        Borrow a connection for a read about keys: from a healthy replica
+        unless one of keys is pinned, else from the primary
+        """
+        replica = self._choose(list(keys))
+        if replica is not None:
+            pool = self._pool(replica.dsn)
+            try:
+                conn = pool.getconn()
+            except (psycopg2.OperationalError, PoolTimeout) as e:
+                self._mark_down(replica, e)
+                with self._lock:
+                    self._primary_reads += 1
+                replica = None
+        if replica is None:
+            with self._pool(self.primary_dsn).connection() as conn:
+                yield conn
+            return
+
+        discard = False
+        try:
+            yield conn
+        except psycopg2.OperationalError as e:
+            # The replica went away mid-read; the caller's error handling
+            # covers this read, the next ones go elsewhere
+            self._mark_down(replica, e)
+            discard = True
+            raise
+        finally:
+            pool.putconn(conn, discard=discard)
+
+    def close(self):
+        """Stop the health checks"""
+        self._stop.set()
+
+    def stats(self) -> dict:
+        """Read counters for the primary, and health and reads per replica"""
+        with self._lock:
+            stats = {"primary_reads": self._primary_reads, "pinned_reads": self._pinned_reads,
+                     "pins": len(self._pins)}
+            replicas = {
+                describe_dsn(replica.dsn): {
+                    "healthy": int(replica.healthy),
+                    "lag_seconds": replica.lag if replica.lag is not None else -1,
+                    "reads": replica.reads,
+                    "failures": replica.failures,
+                }
+                for replica in self._replicas
+            }
+        return dict(stats, replicas=replicas)
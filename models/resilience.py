@@ -0,0 +1,276 @@
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Dict, Optional
+
+import psycopg2
+from psycopg2 import errors
+
+from models.pool import PoolTimeout
+
+logger = logging.getLogger(__name__)
+
+# Errors that say the database is down, unreachable or too slow, as opposed
+# to rejecting one statement. All of them count as failures; all but
+# STATEMENT_TIMEOUT count against the circuit breaker, since a cancelled
+# statement means the database was up and enforced that operation's budget.
+# Otherwise one slow search could open the breaker for every other operation.
+STATEMENT_TIMEOUT = errors.QueryCanceled
+FAILURE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout)
+
+CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN = 0, 1, 2
+
+
+class DatabaseUnavailable(Exception):
+    """
+    Raised instead of running a query the database can't take right now
+    retry_after is a hint in seconds for the client, as in Retry-After
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class Overloaded(DatabaseUnavailable):
+    """Raised when the concurrency limiter sheds an operation"""
+
+
+class CircuitOpen(DatabaseUnavailable):
+    """Raised while the circuit breaker is failing fast"""
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the database operations in flight in this process
+
+    Up to max_concurrent run at once and up to max_queue more wait, each for
+    at most max_wait seconds; anything beyond that is shed with Overloaded
+    straight away rather than left to pile up on the connection pool.
+    """
+
+    def __init__(self, max_concurrent: int = 10, max_queue: int = 20, max_wait: float = 1.0):
+        if max_concurrent < 1 or max_queue < 0 or max_wait < 0:
+            raise ValueError(f"Invalid limiter settings: max_concurrent={max_concurrent}, "
+                             f"max_queue={max_queue}, max_wait={max_wait}")
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition(threading.Lock())
+        self._in_flight = 0
+        self._waiting = 0
+        self._stats = {"admitted": 0, "queued": 0, "shed": 0, "max_in_flight": 0}
+
+    def acquire(self):
+        with self._cond:
+            if self._in_flight >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    self._stats["shed"] += 1
+                    raise Overloaded(f"Too many database operations in flight ({self._in_flight} running, "
+                                     f"{self._waiting} waiting)", self.max_wait or 1.0)
+                self._stats["queued"] += 1
+                self._waiting += 1
+                deadline = time.monotonic() + self.max_wait
+                try:
+                    while self._in_flight >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["shed"] += 1
+                            raise Overloaded(f"Waited {self.max_wait}s for a database slot "
+                                             f"({self._in_flight} running)", self.max_wait or 1.0)
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_flight += 1
+            self._stats["admitted"] += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._in_flight)
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, in_flight=self._in_flight, waiting=self._waiting,
+                        max_concurrent=self.max_concurrent)
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the database keeps failing
+
+    After failure_threshold failures in a row the circuit opens and every
+    operation is refused with CircuitOpen for reset_timeout seconds. Then one
+    trial operation is let through (half-open): if it succeeds the circuit
+    closes, if it fails it opens again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        if failure_threshold < 1 or reset_timeout <= 0:
+            raise ValueError(f"Invalid circuit breaker settings: failure_threshold={failure_threshold}, "
+                             f"reset_timeout={reset_timeout}")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CIRCUIT_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._stats = {"failures": 0, "opened": 0, "rejected": 0}
+
+    def before(self):
+        """Admit an operation or raise CircuitOpen"""
+        with self._lock:
+            if self._state == CIRCUIT_CLOSED:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self._state == CIRCUIT_OPEN and remaining <= 0:
+                self._state = CIRCUIT_HALF_OPEN
+            if self._state == CIRCUIT_HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            self._stats["rejected"] += 1
+            raise CircuitOpen("Database circuit breaker is open", max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CIRCUIT_CLOSED:
+                logger.info("Database circuit breaker closed")
+            self._state = CIRCUIT_CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_neutral(self):
+        """End an operation that says nothing about the database's health"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            self._trial_running = False
+            if self._state == CIRCUIT_HALF_OPEN or \
+                    (self._state == CIRCUIT_CLOSED and self._failures >= self.failure_threshold):
+                self._state = CIRCUIT_OPEN
+                self._opened_at = time.monotonic()
+                self._stats["opened"] += 1
+                opened = True
+            else:
+                opened = False
+            failures = self._failures
+        if opened:
+            logger.warning(f"Database circuit breaker open for {self.reset_timeout}s after "
+                           f"{failures} failures, last: {str(error).strip()}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, state=self._state, consecutive_failures=self._failures)
+
+
+def parse_timeouts(spec: str) -> Dict[str, int]:
+    """
+    Parse 'default=5000,search_availability=10000' into operation -> ms
+    0 means no timeout, as in Postgres
+    """
+    timeouts = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        operation, _, value = item.partition('=')
+        try:
+            timeouts[operation.strip()] = int(value)
+        except ValueError:
+            raise ValueError(f"Invalid statement timeout {item.strip()!r}, expected operation=milliseconds")
+    return timeouts
+
+
+class DatabaseGuard:
+    """
+    Resilience layer around an AvailabilityManager's database access
+
+    Every operation is admitted by the circuit breaker and the concurrency
+    limiter, either of which raises a DatabaseUnavailable to turn into a 503,
+    and runs under the statement_timeout budget of its operation name
+    (statement_timeouts['default'] for unlisted ones). Connection errors and
+    pool timeouts count as failures towards the breaker; cancelled statements
+    are only counted in stats, and anything else the database answers counts
+    as a success.
+    """
+
+    def __init__(self, limiter: Optional[ConcurrencyLimiter] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 statement_timeouts: Optional[Dict[str, int]] = None):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.statement_timeouts = dict(statement_timeouts or {})
+        self._lock = threading.Lock()
+        self._stats = {"operations": 0, "failures": 0, "statement_timeouts": 0}
+
+    def statement_timeout(self, operation: Optional[str]) -> Optional[int]:
+        return self.statement_timeouts.get(operation, self.statement_timeouts.get('default'))
+
+    @contextmanager
+    def connection(self, connect: Callable[[], ContextManager], operation: Optional[str] = None):
+        """
+        Run connect(), a connection context manager, for one operation
+        """
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            if self.breaker is not None:
+                self.breaker.before()
+            failure = None
+            try:
+                with connect() as conn:
+                    timeout = self.statement_timeout(operation)
+                    if timeout is not None:
+                        # SET takes no snapshot, so the operation can still
+                        # choose its transaction's isolation level
+                        with conn.cursor() as cur:
+                            cur.execute("SET LOCAL statement_timeout = %s", (f"{timeout}ms",))
+                    yield conn
+            except FAILURE_ERRORS as e:
+                failure = e
+                raise
+            finally:
+                self._record(operation, failure)
+        finally:
+            if self.limiter is not None:
+                self.limiter.release()
+
+    def _record(self, operation: Optional[str], failure: Optional[Exception]):
+        with self._lock:
+            self._stats["operations"] += 1
+            if failure is not None:
+                self._stats["failures"] += 1
+                if isinstance(failure, STATEMENT_TIMEOUT):
+                    self._stats["statement_timeouts"] += 1
+        if failure is None:
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return
+        if isinstance(failure, STATEMENT_TIMEOUT):
+            logger.warning(f"{operation or 'Database operation'} exceeded its statement timeout "
+                           f"of {self.statement_timeout(operation)}ms")
+            if self.breaker is not None:
+                self.breaker.record_neutral()
+            return
+        if self.breaker is not None:
+            self.breaker.record_failure(failure)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        if self.limiter is not None:
+            stats.update({f"limiter_{key}": value for key, value in self.limiter.stats().items()})
+        if self.breaker is not None:
+            stats.update({f"circuit_{key}": value for key, value in self.breaker.stats().items()})
+        return stats
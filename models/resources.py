@@ -0,0 +1,166 @@
+"""
+Per-worker resources of the availability service
+
+AvailabilityResources builds, from load_settings()-style settings, what
+every request of one app shares: the connection pool settings, the replica
+router, the database guard, the caches, the in-memory backend and the group
+commit queue. create_app() builds one per app. Pools, the replica checker and
+the write queue's flusher start on first use in each process, so resources
+built before gunicorn forks work in every worker.
+"""
+
+import atexit
+import logging
+from typing import Any, Mapping, Optional
+
+from models.availability import AvailabilityManager
+from models.backend import BACKENDS
+from models.cache import IntervalCache, KnownEntityCache
+from models.memory import MemoryAvailabilityManager
+from models.metrics import InstrumentedConnection
+from models.pool import ConnectionPool, get_pool
+from models.replicas import ReplicaRouter
+from models.resilience import CircuitBreaker, ConcurrencyLimiter, DatabaseGuard
+from models.write_queue import WriteQueue
+
+logger = logging.getLogger(__name__)
+
+
+def build_availability_cache(settings: Mapping[str, Any]) -> Optional[IntervalCache]:
+    """
+    Per-worker cache of whole-calendar reads, or None if disabled
+    Writes through this worker invalidate it, writes elsewhere become visible
+    within AVAILABILITY_CACHE_TTL
+    """
+    if settings['AVAILABILITY_CACHE_MAX_ENTRIES'] <= 0:
+        return None
+    return IntervalCache(
+        max_entries=settings['AVAILABILITY_CACHE_MAX_ENTRIES'],
+        ttl=settings['AVAILABILITY_CACHE_TTL'],
+        max_bytes=settings['AVAILABILITY_CACHE_MAX_BYTES']
+    )
+
+
+def build_known_entities(settings: Mapping[str, Any]) -> Optional[KnownEntityCache]:
+    """
+    Per-worker set of seller and property IDs already known to exist, letting
+    repeat writes skip the entity upsert, or None if disabled
+    """
+    if settings['KNOWN_ENTITY_CACHE_SIZE'] <= 0:
+        return None
+    return KnownEntityCache(settings['KNOWN_ENTITY_CACHE_SIZE'])
+
+
+class AvailabilityResources:
+    """
+    What one app's availability routes share in a worker
+
+    manager() hands out an AvailabilityManager over them, or the in-memory
+    store with AVAILABILITY_BACKEND=memory. The memory store belongs to one
+    worker and is lost on restart, so run a single worker with it.
+    """
+
+    def __init__(self, settings: Mapping[str, Any]):
+        backend = settings['AVAILABILITY_BACKEND']
+        if backend not in BACKENDS:
+            raise ValueError(f"AVAILABILITY_BACKEND must be one of {', '.join(BACKENDS)}, got {backend!r}")
+
+        self.connection_string = settings['DATABASE_URL']
+        self.pool_settings = dict(settings['DB_POOL'], connection_factory=InstrumentedConnection)
+        self.merge_tolerance = settings['AVAILABILITY_MERGE_TOLERANCE']
+        # Maintain per-day 30-minute slot bitmaps alongside the rows on every
+        # write, for /api/availability/free; run rebuild_bitmaps() once after
+        # turning it on
+        self.bitmaps = settings['AVAILABILITY_BITMAPS']
+
+        # Reads go to the replicas round-robin while they are healthy and
+        # within REPLICA_MAX_LAG_SECONDS; for READ_YOUR_WRITES_SECONDS after
+        # a write, that client and the properties written read the primary
+        self.read_your_writes_seconds = settings['READ_YOUR_WRITES_SECONDS']
+        self.replica_router = ReplicaRouter(
+            self.connection_string,
+            settings['DB_REPLICA_URLS'],
+            pool_kwargs=self.pool_settings,
+            max_lag=settings['REPLICA_MAX_LAG_SECONDS'],
+            pin_seconds=self.read_your_writes_seconds,
+            health_check_interval=settings['REPLICA_HEALTH_CHECK_INTERVAL']
+        ) if settings['DB_REPLICA_URLS'] else None
+
+        # At most DB_MAX_CONCURRENT operations run at once and DB_MAX_QUEUE
+        # more wait up to DB_QUEUE_TIMEOUT_MS for a slot; the rest get a 503
+        # with Retry-After. DB_STATEMENT_TIMEOUTS budgets each manager
+        # operation (e.g. 'default=5000,search_availability=10000', 0 for
+        # none), and after CIRCUIT_BREAKER_FAILURES connection errors or pool
+        # timeouts in a row requests fail fast for
+        # CIRCUIT_BREAKER_RESET_SECONDS. Statement timeouts don't count
+        # towards the breaker
+        self.guard = DatabaseGuard(
+            limiter=ConcurrencyLimiter(
+                max_concurrent=settings['DB_MAX_CONCURRENT'],
+                max_queue=settings['DB_MAX_QUEUE'],
+                max_wait=settings['DB_QUEUE_TIMEOUT_MS'] / 1000
+            ),
+            breaker=CircuitBreaker(
+                failure_threshold=settings['CIRCUIT_BREAKER_FAILURES'],
+                reset_timeout=settings['CIRCUIT_BREAKER_RESET_SECONDS']
+            ),
+            statement_timeouts=settings['DB_STATEMENT_TIMEOUTS']
+        )
+
+        self.cache = build_availability_cache(settings)
+        self.known_entities = build_known_entities(settings)
+        self.memory = MemoryAvailabilityManager(merge_tolerance=self.merge_tolerance) \
+            if backend == 'memory' else None
+
+        # Group commit: slot writes are queued and everything queued within
+        # AVAILABILITY_GROUP_COMMIT_MS (or AVAILABILITY_GROUP_COMMIT_BATCH
+        # slots) is saved in one transaction
+        group_commit_ms = settings['AVAILABILITY_GROUP_COMMIT_MS']
+        self.write_queue = WriteQueue(
+            lambda writes: self.manager().save_availability_groups(writes),
+            max_latency=group_commit_ms / 1000,
+            max_batch=settings['AVAILABILITY_GROUP_COMMIT_BATCH']
+        ) if group_commit_ms is not None else None
+        if self.write_queue is not None:
+            # Commit whatever is still queued before the worker exits
+            atexit.register(self.write_queue.close, 10)
+
+    @property
+    def tracks_own_writes(self) -> bool:
+        """Whether reads can return stale data a client needs pinning around"""
+        return self.replica_router is not None or self.cache is not None
+
+    def pool(self) -> ConnectionPool:
+        """This worker's pool for the primary"""
+        return get_pool(self.connection_string, **self.pool_settings)
+
+    def manager(self, read_from_primary: bool = False):
+        """
+        The configured availability backend: the in-memory store, or an
+        AvailabilityManager backed by this worker's connection pool
+        """
+        if self.memory is not None:
+            return self.memory
+        return AvailabilityManager(
+            self.connection_string,
+            pool=self.pool(),
+            merge_tolerance=self.merge_tolerance,
+            cache=self.cache,
+            known_entities=self.known_entities,
+            bitmaps=self.bitmaps,
+            replicas=self.replica_router,
+            read_from_primary=read_from_primary,
+            guard=self.guard
+        )
+
+    def warm(self):
+        """Open the primary pool's min_size connections"""
+        if self.memory is None:
+            self.pool().warm()
+
+    def close(self):
+        """Commit queued writes and stop the replica checker"""
+        if self.write_queue is not None:
+            self.write_queue.close(10)
+        if self.replica_router is not None:
+            self.replica_router.close()
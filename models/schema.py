@@ -0,0 +1,86 @@
+"""
+schema.sql applied to a schema of its own, or reapplied in place
+
+Tests and benchmarks build their throwaway schemas, and /setup-test-schema
+rebuilds the app's tables, from the same DDL file the app is deployed with,
+so none of them can drift from it.
+"""
+
+import os
+import re
+from typing import List
+
+from psycopg2 import sql
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schema.sql')
+
+_COMMENT = re.compile(r'--[^\n]*')
+_CREATE_TABLE = re.compile(r'CREATE TABLE (?:IF NOT EXISTS )?(\w+)', re.IGNORECASE)
+
+
+def schema_statements(path: str = SCHEMA_FILE) -> List[str]:
+    """
+    The statements of a DDL file, without comments
+    """
+    with open(path) as f:
+        text = _COMMENT.sub('', f.read())
+    return [statement.strip() for statement in text.split(';') if statement.strip()]
+
+
+def schema_tables(path: str = SCHEMA_FILE) -> List[str]:
+    """
+    The tables a DDL file creates, in creation order
+    """
+    return [match.group(1) for match in map(_CREATE_TABLE.match, schema_statements(path)) if match]
+
+
+def _is_index(statement: str) -> bool:
+    return statement.upper().startswith('CREATE INDEX')
+
+
+def _use_schema(cur, schema: str):
+    cur.execute(sql.SQL("SET search_path TO {}").format(sql.Identifier(schema)))
+
+
+def create_schema(conn, schema: str, indexes: bool = True):
+    """
+    Drop and recreate schema with the tables of schema.sql
+    With indexes=False its indexes are left for create_indexes(), to build
+    after a bulk load the way a restore would
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(schema)))
+        cur.execute(sql.SQL("CREATE SCHEMA {}").format(sql.Identifier(schema)))
+        _use_schema(cur, schema)
+        _create_tables(cur, indexes)
+    conn.commit()
+
+
+def reset_tables(conn):
+    """
+    Drop schema.sql's tables from the connection's current schema and create
+    them again, leaving anything else in the schema alone
+    """
+    with conn.cursor() as cur:
+        for table in reversed(schema_tables()):
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(sql.Identifier(table)))
+        _create_tables(cur, indexes=True)
+    conn.commit()
+
+
+def _create_tables(cur, indexes: bool):
+    for statement in schema_statements():
+        if indexes or not _is_index(statement):
+            cur.execute(statement)
+
+
+def create_indexes(conn, schema: str):
+    """
+    Build schema.sql's indexes in a schema made with create_schema(indexes=False)
+    """
+    with conn.cursor() as cur:
+        _use_schema(cur, schema)
+        for statement in schema_statements():
+            if _is_index(statement):
+                cur.execute(statement)
+    conn.commit()
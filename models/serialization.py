@@ -0,0 +1,115 @@
+import json
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+from operator import itemgetter
+from typing import Iterable, Mapping, Sequence
+from uuid import UUID
+
+# Same spelling as werkzeug's http_date, which Flask uses for datetimes
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+           'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+@lru_cache(maxsize=16384)
+def encode_datetime(value: datetime) -> str:
+    """
+    JSON string for a datetime, formatted like Flask's default provider
+    Cached because slot boundaries on the 30-minute grid repeat constantly
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return '"%s, %02d %s %04d %02d:%02d:%02d GMT"' % (
+        _DAYS[value.weekday()], value.day, _MONTHS[value.month - 1],
+        value.year, value.hour, value.minute, value.second
+    )
+
+
+@lru_cache(maxsize=16384)
+def encode_string(value: str) -> str:
+    """
+    JSON string literal for a str, ASCII-escaped like Flask's default provider
+    Cached because property and seller IDs repeat on every row of a calendar
+    """
+    return encode_basestring_ascii(value)
+
+
+def encode_value(value) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, str):
+        return encode_string(value)
+    if isinstance(value, datetime):
+        return encode_datetime(value)
+    if isinstance(value, UUID):
+        return encode_string(str(value))
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, int):
+        return int.__repr__(value)
+    raise TypeError(f"Cannot fast-encode value of type {type(value).__name__}")
+
+
+def json_default(value):
+    """
+    json.dumps default hook mirroring Flask's provider for the types we emit
+    """
+    if isinstance(value, datetime):
+        return encode_datetime(value)[1:-1]
+    if isinstance(value, date):
+        return encode_datetime(datetime(value.year, value.month, value.day))[1:-1]
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value, compact: bool = True) -> str:
+    """
+    Serialise like Flask: jsonify bodies when compact, flask.json.dumps otherwise
+    """
+    return json.dumps(value, default=json_default, ensure_ascii=True, sort_keys=True,
+                      separators=(',', ':') if compact else None)
+
+
+class RowEncoder:
+    """
+    Compact JSON encoder for rows with a fixed column layout
+
+    The object template, with keys sorted and separators fixed, is compiled
+    once, so encoding a row is one tuple of cached value encodings and one
+    string format. Output is byte-for-byte what Flask's jsonify produces for
+    the same rows as dicts with JSON_SORT_KEYS on and compact separators.
+    """
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = tuple(columns)
+        order = sorted(range(len(self.columns)), key=lambda index: self.columns[index])
+        self._order = tuple(order)
+        self._template = '{' + ','.join(
+            encode_basestring_ascii(self.columns[index]).replace('%', '%%') + ':%s' for index in order
+        ) + '}'
+        self._getter = itemgetter(*self.columns)
+
+    def encode_row(self, row: Sequence) -> str:
+        """
+        Encode one row given as a tuple in column order
+        """
+        return self._template % tuple(encode_value(row[index]) for index in self._order)
+
+    def encode_rows(self, rows: Iterable[Sequence]) -> str:
+        """
+        Encode rows given as tuples in column order as a JSON array
+        """
+        encode_row = self.encode_row
+        return '[' + ','.join([encode_row(row) for row in rows]) + ']'
+
+    def encode_dict_rows(self, rows: Iterable[Mapping]) -> str:
+        """
+        Encode rows given as dicts keyed by column as a JSON array
+        """
+        getter = self._getter
+        encode_row = self.encode_row
+        return '[' + ','.join([encode_row(getter(row)) for row in rows]) + ']'
@@ -0,0 +1,97 @@
+"""
+Settings of the availability service, read from the environment
+
+load_settings() returns them as a dict of Flask-style upper-case keys, so
+create_app() can take it as config and tests or benchmarks can override any
+of them. The keys mirror the environment variables they come from, except
+for the few the variables are combined into (DATABASE, DATABASE_URL,
+DB_POOL and DB_REPLICA_URLS).
+"""
+
+import os
+from datetime import timedelta
+from typing import Any, Dict, Mapping, Optional
+
+from models.resilience import parse_timeouts
+
+DEFAULT_STATEMENT_TIMEOUTS = 'default=5000,search_availability=10000,iter_availability=0'
+
+
+def get_connection_string(db_params: Mapping[str, str], ssl_mode: str = 'require') -> str:
+    """Create database connection string with appropriate SSL settings"""
+    # Format the connection string exactly like the working psql command
+    return f"postgresql://{db_params['user']}@{db_params['host']}:{db_params['port']}/{db_params['dbname']}?sslmode={ssl_mode}"
+
+
+def _flag(value: str) -> bool:
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def load_settings(environ: Optional[Mapping[str, str]] = None) -> Dict[str, Any]:
+    """
+    Settings from environ (os.environ by default), with the defaults for
+    anything unset
+    """
+    env = os.environ if environ is None else environ
+
+    db_params = {
+        "dbname": env.get('DB_NAME', 'postgres'),
+        "user": env.get('DB_USER', 'postgres'),
+        "password": env.get('DB_PASSWORD', 'postgres'),
+        "host": env.get('DB_HOST', 'localhost'),
+        "port": env.get('DB_PORT', '5432')
+    }
+    ssl_mode = env.get('PGSSLMODE', 'require')
+
+    # Read replicas, as a comma-separated host[:port] list sharing the
+    # primary's database, user and SSL mode
+    replica_hosts = [host.strip() for host in env.get('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+    replica_urls = [
+        get_connection_string(dict(db_params, host=host.rsplit(':', 1)[0],
+                                   port=host.rsplit(':', 1)[1] if ':' in host else db_params['port']), ssl_mode)
+        for host in replica_hosts
+    ]
+
+    # Connection pool configuration, one pool per worker process
+    pool_settings = {
+        "min_size": int(env.get('DB_POOL_MIN_SIZE', '1')),
+        "max_size": int(env.get('DB_POOL_MAX_SIZE', '10')),
+        "max_age": float(env.get('DB_POOL_MAX_AGE', '1800')),
+        "max_idle": float(env.get('DB_POOL_MAX_IDLE', '300')),
+        "checkout_timeout": float(env.get('DB_POOL_CHECKOUT_TIMEOUT', '30')),
+        "health_check_interval": float(env.get('DB_POOL_HEALTH_CHECK_INTERVAL', '30')),
+        "connect_timeout": 10
+    }
+
+    merge_tolerance_minutes = env.get('AVAILABILITY_MERGE_TOLERANCE_MINUTES', '0')
+    group_commit_ms = env.get('AVAILABILITY_GROUP_COMMIT_MS', '')
+
+    return {
+        "DATABASE": db_params,
+        "PGSSLMODE": ssl_mode,
+        "DATABASE_URL": get_connection_string(db_params, ssl_mode),
+        "DB_POOL": pool_settings,
+        "DB_REPLICA_URLS": replica_urls,
+        "READ_YOUR_WRITES_SECONDS": float(env.get('READ_YOUR_WRITES_SECONDS', '5')),
+        "REPLICA_MAX_LAG_SECONDS": float(env.get('REPLICA_MAX_LAG_SECONDS', '2')),
+        "REPLICA_HEALTH_CHECK_INTERVAL": float(env.get('REPLICA_HEALTH_CHECK_INTERVAL', '5')),
+        "DB_MAX_CONCURRENT": int(env.get('DB_MAX_CONCURRENT', str(pool_settings['max_size']))),
+        "DB_MAX_QUEUE": int(env.get('DB_MAX_QUEUE', str(pool_settings['max_size'] * 2))),
+        "DB_QUEUE_TIMEOUT_MS": float(env.get('DB_QUEUE_TIMEOUT_MS', '1000')),
+        "CIRCUIT_BREAKER_FAILURES": int(env.get('CIRCUIT_BREAKER_FAILURES', '5')),
+        "CIRCUIT_BREAKER_RESET_SECONDS": float(env.get('CIRCUIT_BREAKER_RESET_SECONDS', '30')),
+        "DB_STATEMENT_TIMEOUTS": parse_timeouts(env.get('DB_STATEMENT_TIMEOUTS', DEFAULT_STATEMENT_TIMEOUTS)),
+        # An empty string stores slots exactly as submitted
+        "AVAILABILITY_MERGE_TOLERANCE": timedelta(minutes=int(merge_tolerance_minutes))
+        if merge_tolerance_minutes else None,
+        "AVAILABILITY_CACHE_MAX_ENTRIES": int(env.get('AVAILABILITY_CACHE_MAX_ENTRIES', '1024')),
+        "AVAILABILITY_CACHE_TTL": float(env.get('AVAILABILITY_CACHE_TTL', '30')),
+        "AVAILABILITY_CACHE_MAX_BYTES": int(env.get('AVAILABILITY_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+        "KNOWN_ENTITY_CACHE_SIZE": int(env.get('KNOWN_ENTITY_CACHE_SIZE', '10000')),
+        "AVAILABILITY_BITMAPS": _flag(env.get('AVAILABILITY_BITMAPS', 'false')),
+        "AVAILABILITY_BACKEND": env.get('AVAILABILITY_BACKEND', 'postgres'),
+        # Unset, every request commits on its own
+        "AVAILABILITY_GROUP_COMMIT_MS": float(group_commit_ms) if group_commit_ms else None,
+        "AVAILABILITY_GROUP_COMMIT_BATCH": int(env.get('AVAILABILITY_GROUP_COMMIT_BATCH', '500')),
+        "REQUEST_LOG_SAMPLE_RATE": float(env.get('REQUEST_LOG_SAMPLE_RATE', '1.0')),
+    }
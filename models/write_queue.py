@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# One queued write: (property_id, seller_id, slots)
+Write = Tuple[str, str, Sequence[Tuple[datetime, datetime]]]
+
+
+def _take_batch(pending: list, max_batch: int) -> Tuple[list, int]:
+    """
+    Whole writes from the front of pending holding up to max_batch slots,
+    and at least one write however many slots it has
+    """
+    count = slots = 0
+    while count < len(pending):
+        size = len(pending[count][0][2])
+        if count and slots + size > max_batch:
+            break
+        count += 1
+        slots += size
+    batch = pending[:count]
+    del pending[:count]
+    return batch, slots
+
+
+class _QueueStats:
+    def __init__(self):
+        self._stats = {
+            "writes": 0,
+            "slots": 0,
+            "flushes": 0,
+            "flush_failures": 0,
+            "flush_time_total": 0.0,
+            "flush_time_max": 0.0,
+            "largest_flush": 0,
+        }
+
+    def _record_flush(self, writes: int, slots: int, elapsed: float, failed: bool):
+        stats = self._stats
+        stats["writes"] += writes
+        stats["slots"] += slots
+        stats["flushes"] += 1
+        stats["flush_failures"] += failed
+        stats["flush_time_total"] += elapsed
+        stats["flush_time_max"] = max(stats["flush_time_max"], elapsed)
+        stats["largest_flush"] = max(stats["largest_flush"], slots)
+
+
+class WriteQueue(_QueueStats):
+    """
+    Group commit for availability writes from many threads
+
+    submit() queues a (property_id, seller_id, slots) write and returns a
+    Future. A background flusher hands everything queued to flush, e.g.
+    AvailabilityManager.save_availability_groups, as one transaction once
+    max_batch slots are waiting or the oldest write has waited max_latency
+    seconds, so a burst of small writes costs one commit instead of one
+    each. Each future resolves to that write's own per-slot results, or
+    None if it failed; if flush raises, every future in the batch raises
+    the same exception.
+
+    The flusher thread starts on first use in each process, so a queue
+    created before a fork works in every worker. close() flushes what is
+    queued and stops it.
+    """
+
+    def __init__(self, flush: Callable[[List[Write]], List[Optional[list]]],
+                 max_latency: float = 0.005, max_batch: int = 500):
+        super().__init__()
+        if max_latency < 0 or max_batch < 1:
+            raise ValueError(f"Invalid write queue settings: max_latency={max_latency}, max_batch={max_batch}")
+        self.flush = flush
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+
+        self._cond = threading.Condition(threading.Lock())
+        # Entries are ((property_id, seller_id, slots), future, queued_at)
+        self._pending = []
+        self._pending_slots = 0
+        self._closed = False
+        self._thread = None
+        self._pid = None
+
+    def _start(self):
+        # Called with the lock held. A thread started before a fork doesn't
+        # exist in the child, and neither do the parent's waiting callers
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = []
+            self._pending_slots = 0
+            self._thread = threading.Thread(target=self._run, name='availability-write-queue', daemon=True)
+            self._thread.start()
+
+    def submit(self, property_id: str, seller_id: str,
+               slots: Sequence[Tuple[datetime, datetime]]) -> "Future[Optional[list]]":
+        future = Future()
+        if not slots:
+            future.set_result([])
+            return future
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write queue is closed")
+            self._start()
+            self._pending.append(((property_id, seller_id, list(slots)), future, time.monotonic()))
+            self._pending_slots += len(slots)
+            # Wake the flusher for the first write of a batch, when it starts
+            # its latency timer, and once the batch is full
+            if len(self._pending) == 1 or self._pending_slots >= self.max_batch:
+                self._cond.notify()
+        return future
+
+    def save(self, property_id: str, seller_id: str,
+             slots: Sequence[Tuple[datetime, datetime]]) -> Optional[list]:
+        """Queue a write and wait for it, like save_availability_batch"""
+        return self.submit(property_id, seller_id, slots).result()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = self._pending[0][2] + self.max_latency
+                while not self._closed and self._pending_slots < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, slots = _take_batch(self._pending, self.max_batch)
+                self._pending_slots -= slots
+            self._flush(batch, slots)
+
+    def _flush(self, batch: list, slots: int):
+        started = time.perf_counter()
+        try:
+            results = self.flush([write for write, _, _ in batch])
+        except Exception as e:
+            # Raised to every caller in the batch, e.g. DatabaseUnavailable
+            logger.error(f"Error flushing {len(batch)} queued availability writes: {e}")
+            with self._cond:
+                self._record_flush(len(batch), slots, time.perf_counter() - started, failed=True)
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        with self._cond:
+            self._record_flush(len(batch), slots, time.perf_counter() - started,
+                               failed=any(result is None for result in results))
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def close(self, timeout: Optional[float] = None):
+        """
+        Stop accepting writes, flush the queued ones and wait for the flusher
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None:
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning("Availability write queue did not drain before the timeout")
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, pending_writes=len(self._pending), pending_slots=self._pending_slots)
+
+
+class AsyncWriteQueue(_QueueStats):
+    """
+    asyncio counterpart of WriteQueue
+
+    Same batching, with flush a coroutine function such as
+    AsyncAvailabilityManager.save_availability_groups and the flusher a task
+    on the running loop. Call close() on shutdown to drain it.
+    """
+
+    def __init__(self, flush: Callable[[List[Write]], Awaitable[List[Optional[list]]]],
+                 max_latency: float = 0.005, max_batch: int = 500):
+        super().__init__()
+        if max_latency < 0 or max_batch < 1:
+            raise ValueError(f"Invalid write queue settings: max_latency={max_latency}, max_batch={max_batch}")
+        self.flush = flush
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+
+        self._pending = []
+        self._pending_slots = 0
+        self._closed = False
+        self._task = None
+        self._wakeup = None
+
+    def _start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def save(self, property_id: str, seller_id: str,
+                   slots: Sequence[Tuple[datetime, datetime]]) -> Optional[list]:
+        """Queue a write and wait for it, like save_availability_batch"""
+        if not slots:
+            return []
+        if self._closed:
+            raise RuntimeError("Write queue is closed")
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((property_id, seller_id, list(slots)), future, time.monotonic()))
+        self._pending_slots += len(slots)
+        if len(self._pending) == 1 or self._pending_slots >= self.max_batch:
+            self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            while not self._pending and not self._closed:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if not self._pending:
+                return
+            deadline = self._pending[0][2] + self.max_latency
+            while not self._closed and self._pending_slots < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch, slots = _take_batch(self._pending, self.max_batch)
+            self._pending_slots -= slots
+            await self._flush(batch, slots)
+
+    async def _flush(self, batch: list, slots: int):
+        started = time.perf_counter()
+        try:
+            results = await self.flush([write for write, _, _ in batch])
+        except Exception as e:
+            logger.error(f"Error flushing {len(batch)} queued availability writes: {e}")
+            self._record_flush(len(batch), slots, time.perf_counter() - started, failed=True)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self._record_flush(len(batch), slots, time.perf_counter() - started,
+                           failed=any(result is None for result in results))
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """
+        Stop accepting writes, flush the queued ones and wait for the flusher
+        """
+        self._closed = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+
+    def stats(self) -> dict:
+        return dict(self._stats, pending_writes=len(self._pending), pending_slots=self._pending_slots)
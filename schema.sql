@@ -1,15 +1,64 @@
-CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE TABLE IF NOT EXISTS sellers (
+    id UUID PRIMARY KEY,
+    name VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS properties (
+    id UUID PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    seller_id UUID REFERENCES sellers(id)
+);
 
+-- Range-partitioned by month on start_time; models/partitions.py creates
+-- the monthly partitions ahead of time and expires old ones
 CREATE TABLE IF NOT EXISTS availability (
-    id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
+    id UUID DEFAULT gen_random_uuid(),
     property_id UUID NOT NULL,
     seller_id UUID NOT NULL,
     start_time TIMESTAMP NOT NULL,
     end_time TIMESTAMP NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(property_id, seller_id, start_time, end_time)
-);
+    PRIMARY KEY (id, start_time),
+    UNIQUE(property_id, seller_id, start_time, end_time),
+    CONSTRAINT availability_slot_length CHECK (end_time - start_time <= interval '31 days')
+) PARTITION BY RANGE (start_time);
+
+CREATE TABLE IF NOT EXISTS availability_default PARTITION OF availability DEFAULT;
 
 CREATE INDEX IF NOT EXISTS idx_availability_property ON availability(property_id);
-CREATE INDEX IF NOT EXISTS idx_availability_seller ON availability(seller_id); 
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_availability_seller ON availability(seller_id);
+CREATE INDEX IF NOT EXISTS idx_availability_property_window
+    ON availability(property_id, end_time, start_time);
+CREATE INDEX IF NOT EXISTS idx_availability_range
+    ON availability USING gist (tsrange(start_time, end_time));
+CREATE INDEX IF NOT EXISTS idx_availability_property_version
+    ON availability(property_id, seller_id) INCLUDE (id, updated_at);
+
+CREATE TABLE IF NOT EXISTS availability_rules (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    property_id UUID NOT NULL,
+    seller_id UUID NOT NULL,
+    weekdays SMALLINT[] NOT NULL,
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL,
+    timezone TEXT NOT NULL DEFAULT 'UTC',
+    start_date DATE NOT NULL,
+    end_date DATE,
+    exceptions DATE[] NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CHECK (end_time > start_time),
+    CHECK (end_date IS NULL OR end_date >= start_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_availability_rules_property ON availability_rules(property_id, seller_id);
+CREATE INDEX IF NOT EXISTS idx_availability_rules_seller ON availability_rules(seller_id);
+
+CREATE TABLE IF NOT EXISTS availability_bitmaps (
+    property_id UUID NOT NULL,
+    seller_id UUID NOT NULL,
+    day DATE NOT NULL,
+    slots BIGINT NOT NULL,
+    PRIMARY KEY (property_id, seller_id, day)
+);
@@ -61,4 +61,24 @@ export async function DELETE(request, { params }) {
   } finally {
     client.release();
   }
-}
\ No newline at end of file
+}
+// PUT replaces all availability for a property; the Python backend applies only the diff
+export async function PUT(request, { params }) {
+    const { propertyID } = await params;
+
+    try {
+        const data = await request.json();
+        const response = await fetch(`http://localhost:5000/api/availability/property/${propertyID}`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(data)
+        });
+        const result = await response.json();
+        return NextResponse.json(result, { status: response.status });
+    } catch (error) {
+        console.error('Error replacing property availability:', error);
+        return NextResponse.json({ error: 'Failed to replace availability' }, { status: 500 });
+    }
+}
@@ -111,37 +111,29 @@ const SellerAvailabilityCalendar = ({ sellerId, propertyId }: SellerAvailability
         
         // Convert to DB format
         const dbSlots = groupedSlots.map(group => ({
-          startTime: createISOString(group.date, group.startTime),
-          endTime: createISOString(group.date, group.endTime, true)
+          start_time: createISOString(group.date, group.startTime),
+          end_time: createISOString(group.date, group.endTime, true)
         }));
         
-        // Delete all existing slots for this property/seller
-        await fetch(`/api/availability/property/${propertyId}?sellerId=${sellerId}`, {
-          method: 'DELETE'
+        // Replace the stored slots; the server only writes what changed
+        const response = await fetch(`/api/availability/property/${propertyId}`, {
+          method: 'PUT',
+          headers: {
+            'Content-Type': 'application/json'
+          },
+          body: JSON.stringify({
+            sellerId,
+            availabilitySlots: dbSlots
+          })
         });
         
-        if (dbSlots.length > 0) {
-          // Create new slots
-          const response = await fetch('/api/availability', {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-              sellerId,
-              propertyId,
-              availabilitySlots: dbSlots
-            })
-          });
-          
-          if (!response.ok) {
-            throw new Error(`HTTP error! Status: ${response.status}`);
-          }
-          
-          // Show saved indicator
-          setShowSavedIndicator(true);
-          setTimeout(() => setShowSavedIndicator(false), 2000);
+        if (!response.ok) {
+          throw new Error(`HTTP error! Status: ${response.status}`);
         }
+        
+        // Show saved indicator
+        setShowSavedIndicator(true);
+        setTimeout(() => setShowSavedIndicator(false), 2000);
       } catch (err) {
         console.error('Error saving availability:', err);
         setError('Failed to save availability. Please try again.');
@@ -8,5 +8,5 @@ echo "Gunicorn version: $(gunicorn --version)"
 # Make sure the script is executable
 chmod +x /app/startup.sh
 
-# Start Gunicorn
-gunicorn --bind 0.0.0.0:8000 app:app
\ No newline at end of file
+# Start Gunicorn with the production profile (see gunicorn.conf.py)
+exec gunicorn -c gunicorn.conf.py app:app
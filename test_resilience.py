@@ -0,0 +1,128 @@
+import threading
+import time
+from contextlib import nullcontext
+
+import psycopg2
+import pytest
+from psycopg2 import errors
+
+from models.resilience import (
+    CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN,
+    CircuitBreaker, CircuitOpen, ConcurrencyLimiter, DatabaseGuard, Overloaded
+)
+
+
+def open_breaker(reset_timeout=0.01):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=reset_timeout)
+    breaker.record_failure(psycopg2.OperationalError("connection refused"))
+    assert breaker.stats()["state"] == CIRCUIT_OPEN
+    return breaker
+
+
+def run_guarded(guard, error=None):
+    def operation():
+        with guard.connection(lambda: nullcontext(object()), 'get_property_availability'):
+            if error is not None:
+                raise error
+
+    if error is None:
+        operation()
+    else:
+        with pytest.raises(type(error)):
+            operation()
+
+
+def test_limiter_sheds_when_queue_is_full():
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=0, max_wait=1.0)
+    limiter.acquire()
+    started = time.monotonic()
+    with pytest.raises(Overloaded):
+        limiter.acquire()
+    assert time.monotonic() - started < 0.5
+    limiter.release()
+    limiter.acquire()
+    stats = limiter.stats()
+    assert stats["shed"] == 1
+    assert stats["admitted"] == 2
+    assert stats["in_flight"] == 1
+
+
+def test_limiter_queue_times_out():
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=1, max_wait=0.05)
+    limiter.acquire()
+    started = time.monotonic()
+    with pytest.raises(Overloaded):
+        limiter.acquire()
+    assert time.monotonic() - started >= 0.05
+    stats = limiter.stats()
+    assert (stats["queued"], stats["shed"], stats["waiting"], stats["in_flight"]) == (1, 1, 0, 1)
+
+
+def test_limiter_admits_queued_operation_on_release():
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=1, max_wait=5.0)
+    limiter.acquire()
+    admitted = threading.Event()
+
+    def waiter():
+        limiter.acquire()
+        admitted.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    while limiter.stats()["waiting"] == 0:
+        time.sleep(0.001)
+    assert not admitted.is_set()
+    limiter.release()
+    thread.join(timeout=5)
+    assert admitted.is_set()
+    assert limiter.stats()["in_flight"] == 1
+
+
+def test_breaker_half_open_lets_one_trial_through():
+    breaker = open_breaker()
+    with pytest.raises(CircuitOpen):
+        breaker.before()
+    time.sleep(0.02)
+    breaker.before()
+    assert breaker.stats()["state"] == CIRCUIT_HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before()
+    breaker.record_success()
+    assert breaker.stats()["state"] == CIRCUIT_CLOSED
+    breaker.before()
+
+
+def test_breaker_reopens_when_trial_fails():
+    breaker = open_breaker()
+    time.sleep(0.02)
+    breaker.before()
+    breaker.record_failure(psycopg2.OperationalError("connection refused"))
+    assert breaker.stats()["state"] == CIRCUIT_OPEN
+    assert breaker.stats()["opened"] == 2
+    with pytest.raises(CircuitOpen):
+        breaker.before()
+
+
+def test_statement_timeouts_do_not_open_breaker():
+    guard = DatabaseGuard(breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30))
+    for _ in range(3):
+        run_guarded(guard, errors.QueryCanceled("canceling statement due to statement timeout"))
+    stats = guard.stats()
+    assert stats["statement_timeouts"] == 3
+    assert stats["failures"] == 3
+    assert stats["circuit_state"] == CIRCUIT_CLOSED
+    assert stats["circuit_consecutive_failures"] == 0
+
+    run_guarded(guard, psycopg2.OperationalError("connection refused"))
+    run_guarded(guard, errors.QueryCanceled("canceling statement due to statement timeout"))
+    run_guarded(guard, psycopg2.OperationalError("connection refused"))
+    assert guard.stats()["circuit_state"] == CIRCUIT_OPEN
+
+
+def test_statement_timeout_ends_half_open_trial():
+    guard = DatabaseGuard(breaker=open_breaker())
+    time.sleep(0.02)
+    run_guarded(guard, errors.QueryCanceled("canceling statement due to statement timeout"))
+    assert guard.stats()["circuit_state"] == CIRCUIT_HALF_OPEN
+    run_guarded(guard)
+    assert guard.stats()["circuit_state"] == CIRCUIT_CLOSED
@@ -0,0 +1,56 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask, jsonify
+
+from models.availability import AVAILABILITY_COLUMNS
+from models.serialization import RowEncoder
+
+
+def make_rows(count):
+    property_id = str(uuid.uuid4())
+    seller_id = str(uuid.uuid4())
+    start = datetime(2025, 1, 6, 8, 0)
+    rows = []
+    for i in range(count):
+        slot_start = start + timedelta(minutes=30 * i)
+        rows.append((
+            str(uuid.uuid4()), property_id, seller_id,
+            slot_start, slot_start + timedelta(minutes=30),
+            datetime(2024, 12, 31, 23, 59, 59, 123456), datetime(2024, 12, 31, 23, 59, 59, 123456)
+        ))
+    return rows
+
+
+def jsonify_bytes(rows):
+    app = Flask(__name__)
+    with app.app_context():
+        return jsonify([dict(zip(AVAILABILITY_COLUMNS, row)) for row in rows]).get_data()
+
+
+def test_encoded_rows_match_jsonify():
+    rows = make_rows(200)
+    encoder = RowEncoder(AVAILABILITY_COLUMNS)
+    assert (encoder.encode_rows(rows) + '\n').encode() == jsonify_bytes(rows)
+
+
+def test_empty_rows_match_jsonify():
+    encoder = RowEncoder(AVAILABILITY_COLUMNS)
+    assert (encoder.encode_rows([]) + '\n').encode() == jsonify_bytes([])
+
+
+def test_edge_values_match_jsonify():
+    aware = datetime(2025, 3, 30, 1, 30, tzinfo=timezone(timedelta(hours=2)))
+    rows = [
+        (uuid.uuid4(), str(uuid.uuid4()), None, aware, aware + timedelta(hours=1), None, None),
+        ('café "quoted" \\ ☃', 'p', 's', datetime(1999, 12, 31), datetime(2000, 2, 29), None, None),
+    ]
+    encoder = RowEncoder(AVAILABILITY_COLUMNS)
+    assert (encoder.encode_rows(rows) + '\n').encode() == jsonify_bytes(rows)
+
+
+def test_dict_rows_match_tuple_rows():
+    rows = make_rows(10)
+    encoder = RowEncoder(AVAILABILITY_COLUMNS)
+    dict_rows = [dict(zip(AVAILABILITY_COLUMNS, row)) for row in rows]
+    assert encoder.encode_dict_rows(dict_rows) == encoder.encode_rows(rows)